@@ -1,10 +1,9 @@
-# python 
-import uuid
-
 # django 
 from django.db import models
 from django.utils.translation import gettext_lazy as _
-from django.db import IntegrityError
+
+# public ids
+from seeran_backend.ids import generate_id
 
 # models
 from users.models import CustomUser
@@ -38,25 +37,6 @@ class Activity(models.Model):
     # class account id creation handler
     def save(self, *args, **kwargs):
         if not self.activity_id:
-            self.activity_id = self.generate_unique_account_id('AI')
-
-        attempts = 0
-        while attempts < 5:
-            try:
-                super().save(*args, **kwargs)
-                break
-            except IntegrityError:
-                self.activity_id = self.generate_unique_account_id('AI') # Activity ID
-                attempts += 1
-        if attempts >= 5:
-            raise ValueError('Could not create activity with unique account ID after 5 attempts. Please try again later.')
-
-    @staticmethod
-    def generate_unique_account_id(prefix=''):
-        while True:
-            unique_part = uuid.uuid4().hex
-            account_id = prefix + unique_part
-            account_id = account_id[:15].ljust(15, '0')
-
-            if not Activity.objects.filter(activity_id=account_id).exists():
-                return account_id
+            self.activity_id = generate_id('AI')
+
+        super().save(*args, **kwargs)
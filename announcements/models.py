@@ -1,9 +1,9 @@
-# python 
-import uuid
-
 # django
 from django.db import models
 
+# public ids
+from seeran_backend.ids import generate_id
+
 # models
 from schools.models import School
 from users.models import CustomUser
@@ -29,19 +29,6 @@ class Announcement(models.Model):
     # annoumcement id creation handler
     def save(self, *args, **kwargs):
         if not self.announcement_id:
-            self.announcement_id = self.generate_unique_id('AN')
+            self.announcement_id = generate_id('AN')
 
         super(Announcement, self).save(*args, **kwargs)
-
-    @staticmethod
-    def generate_unique_id(prefix=''):
-     
-        max_attempts = 10
-      
-        for _ in range(max_attempts):
-            unique_part = uuid.uuid4().hex[:13]  # Take only the first 13 characters
-            id = f"{prefix}{unique_part}"
-            if not Announcement.objects.filter(announcement_id=id).exists():
-                return id
-        raise ValueError('failed to generate a unique announcement ID after 10 attempts, please try again later.')
-
@@ -1,10 +1,10 @@
-# python 
-import uuid
-
 # django 
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 
+# public ids
+from seeran_backend.ids import generate_id
+
 # models
 from users.models import CustomUser
 from classes.models import Classroom
@@ -52,22 +52,10 @@ class Assessment(models.Model):
     # assessment id creation handler
     def save(self, *args, **kwargs):
         if not self.assessment_id:
-            self.assessment_id = self.generate_unique_id('AS')
+            self.assessment_id = generate_id('AS')
 
         super(Assessment, self).save(*args, **kwargs)
 
-    @staticmethod
-    def generate_unique_id(prefix=''):
-        max_attempts = 10
-    
-        for _ in range(max_attempts):
-            unique_part = uuid.uuid4().hex[:13]  # Take only the first 13 characters
-            id = f"{prefix}{unique_part}"
-            if not Assessment.objects.filter(assessment_id=id).exists():
-                return id
-   
-        raise ValueError('failed to generate a unique account ID after 10 attempts, please try again later.')
-
 
 class Transcript(models.Model):
 
@@ -88,19 +76,6 @@ class Transcript(models.Model):
     # transcript id creation handler
     def save(self, *args, **kwargs):
         if not self.transcript_id:
-            self.transcript_id = self.generate_unique_id('TR')
+            self.transcript_id = generate_id('TR')
 
         super(Transcript, self).save(*args, **kwargs)
-
-    @staticmethod
-    def generate_unique_id(prefix=''):
-        max_attempts = 10
-      
-        for _ in range(max_attempts):
-            unique_part = uuid.uuid4().hex[:13]  # Take only the first 13 characters
-            id = f"{prefix}{unique_part}"
-            if not Transcript.objects.filter(transcript_id=id).exists():
-                return id
-     
-        raise ValueError('failed to generate a unique account ID after 10 attempts, please try again later.')
-
@@ -0,0 +1,34 @@
+from collections import defaultdict
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from auth_tokens.models import RefreshToken
+from auth_tokens.registry import decode_refresh_token, rebuild
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the redis session registry from the RefreshToken table ( e.g after a cache flush )'
+
+    def handle(self, *args, **kwargs):
+        now = timezone.now()
+        sessions = defaultdict(list)
+
+        # rows written before the registry existed have no jti/expiry, their tokens are decoded instead
+        tokens = RefreshToken.objects.filter(expires_at__gt=now) | RefreshToken.objects.filter(expires_at__isnull=True, created_at__gt=now - timedelta(hours=24))
+
+        for user_id, token, jti, expires_at in tokens.values_list('user_id', 'token', 'jti', 'expires_at').iterator():
+            if jti is None:
+                decoded = decode_refresh_token(token)
+
+                if decoded is None:
+                    continue
+
+                jti, expires = decoded['jti'], decoded['exp']
+
+            else:
+                expires = expires_at.timestamp()
+
+            sessions[user_id].append((jti, expires))
+
+        rebuild(sessions)
+        self.stdout.write(f'Session registry rebuilt for {len(sessions)} users.')
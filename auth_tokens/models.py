@@ -8,5 +8,15 @@ class RefreshToken(models.Model):
     token = models.CharField(max_length=255, unique=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # written by the session registry, used to rebuild it after a cache flush
+    jti = models.CharField(max_length=255, unique=True, null=True)
+    expires_at = models.DateTimeField(null=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            # a users sessions oldest first
+            models.Index(fields=['user', 'created_at'], name='refreshtoken_user_created_idx'),
+        ]
+
     def __str__(self):
         return f"{self.user.email} Refresh Token"
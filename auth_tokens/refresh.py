@@ -0,0 +1,124 @@
+# python
+import threading
+
+# django
+from django.conf import settings
+
+# redis
+from django_redis import get_redis_connection
+
+# simple jwt
+from rest_framework_simplejwt.settings import api_settings
+
+# metrics
+from seeran_backend import metrics
+
+
+"""
+    single-flight access token refresh
+
+    when the access cookie expires the frontend fires its queued requests all at once, each of them would mint
+    ( and sign ) its own access token and send back a different cookie. instead the first request for a refresh token
+    mints the access token and keeps it in redis for ACCESS_TOKEN_COALESCE_TIMEOUT seconds ( access:<refresh jti> ),
+    every other request in that window reuses it. requests racing inside one process wait on the first one
+    instead of going to redis at all.
+
+    callers must have checked the refresh token for revocation first, the cached token is handed out as is.
+"""
+
+
+class _Call:
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class _SingleFlight:
+
+    """
+        runs func once per key for concurrent callers in this process, the others wait for and share its result
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, func):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+
+            if call.error is not None:
+                raise call.error
+
+            return call.result, True
+
+        try:
+            call.result = func()
+
+        except Exception as e:
+            call.error = e
+            raise
+
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+            call.done.set()
+
+        return call.result, False
+
+
+_flights = _SingleFlight()
+
+
+def _key(jti):
+    return f'access:{jti}'
+
+
+def _mint_or_reuse(refresh):
+
+    """
+        returns ( access token string, coalesced ) using the access token cached for the refresh token if there is one
+    """
+
+    connection = get_redis_connection('default')
+    key = _key(refresh[api_settings.JTI_CLAIM])
+
+    cached = connection.get(key)
+    if cached is not None:
+        return cached.decode(), True
+
+    access_token = str(refresh.access_token)
+
+    # another process may have minted one in the meantime, only the first one is kept and everyone uses it
+    if connection.set(key, access_token, nx=True, ex=settings.ACCESS_TOKEN_COALESCE_TIMEOUT):
+        return access_token, False
+
+    cached = connection.get(key)
+    return (cached.decode(), True) if cached is not None else (access_token, False)
+
+
+def get_access_token(refresh):
+
+    """
+        returns a signed access token for the decoded refresh token, minting one only if no other request
+        for the same refresh token did in the last few seconds
+    """
+
+    (access_token, coalesced), waited = _flights.do(refresh[api_settings.JTI_CLAIM], lambda: _mint_or_reuse(refresh))
+
+    if coalesced or waited:
+        metrics.incr('auth.refresh.coalesced')
+    else:
+        metrics.incr('auth.refresh.minted')
+
+    return access_token
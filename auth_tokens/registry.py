@@ -0,0 +1,264 @@
+# python
+import logging
+import queue
+import threading
+from datetime import datetime, timezone as dt_timezone
+from itertools import groupby
+
+# django
+from django.conf import settings
+from django.db import close_old_connections
+
+# redis
+from django_redis import get_redis_connection
+
+# simple jwt
+from rest_framework_simplejwt.tokens import RefreshToken as RefreshJWT
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+
+# models
+from auth_tokens.models import RefreshToken
+
+# metrics
+from seeran_backend import metrics
+
+
+logger = logging.getLogger(__name__)
+
+
+"""
+    device session registry
+
+    every user's active sessions live in a redis sorted set ( sessions:<user_id> ), one member per refresh token jti
+    scored by the tokens expiry timestamp. pruning expired sessions, counting them against the device limit and
+    adding the new session happen in one lua script, so logging in costs one round trip instead of three queries.
+
+    the RefreshToken table is no longer read on the login path, it's kept up to date through write-behind
+    ( a background thread batches the inserts and deletes ) for auditing and so the registry can be rebuilt
+    with the rebuild_session_registry command after a cache flush.
+"""
+
+
+# KEYS[1] users session set
+# ARGV[1] now ( unix timestamp )
+# ARGV[2] device limit
+# ARGV[3] new session jti
+# ARGV[4] new session expiry ( unix timestamp )
+REGISTER_SCRIPT = """
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])
+
+if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[2]) then
+    return 0
+end
+
+redis.call('ZADD', KEYS[1], ARGV[4], ARGV[3])
+
+-- the set lives as long as its longest session
+local latest = redis.call('ZRANGE', KEYS[1], -1, -1, 'WITHSCORES')
+redis.call('EXPIREAT', KEYS[1], math.ceil(tonumber(latest[2])))
+
+return 1
+"""
+
+_script = None
+
+
+def _get_script():
+    global _script
+
+    if _script is None:
+        _script = get_redis_connection('default').register_script(REGISTER_SCRIPT)
+
+    return _script
+
+
+def session_key(user_id):
+    return f'sessions:{user_id}'
+
+
+def decode_refresh_token(refresh_token):
+
+    """
+        returns the verified refresh token object, or None if it's invalid or expired
+    """
+
+    try:
+        return RefreshJWT(refresh_token)
+    except TokenError:
+        return None
+
+
+def register(user, refresh_token):
+
+    """
+        adds the session for the refresh token ( string ) to the users registry.
+        returns False if the user already has the maximum number of active sessions.
+    """
+
+    token = RefreshJWT(refresh_token)
+    jti, expires = token[api_settings.JTI_CLAIM], token['exp']
+
+    now = datetime.now(tz=dt_timezone.utc).timestamp()
+
+    if not _get_script()(keys=[session_key(user.pk)], args=[now, settings.SESSION_REGISTRY_MAX_DEVICES, jti, expires]):
+        metrics.incr('sessions.refused')
+        return False
+
+    metrics.incr('sessions.registered')
+
+    write_behind.put(('create', user.pk, refresh_token, jti, datetime.fromtimestamp(expires, tz=dt_timezone.utc)))
+    return True
+
+
+def unregister(user_id, jti, refresh_token):
+
+    """
+        removes the session from the users registry
+    """
+
+    get_redis_connection('default').zrem(session_key(user_id), jti)
+    metrics.incr('sessions.unregistered')
+
+    write_behind.put(('delete', user_id, refresh_token, jti, None))
+
+
+def clear(user_id):
+
+    """
+        removes every session from the users registry
+    """
+
+    get_redis_connection('default').delete(session_key(user_id))
+    metrics.incr('sessions.cleared')
+
+    write_behind.put(('clear', user_id, None, None, None))
+
+
+def active_sessions(user_id):
+
+    """
+        returns the jtis of the users unexpired sessions
+    """
+
+    now = datetime.now(tz=dt_timezone.utc).timestamp()
+    return [jti.decode() for jti in get_redis_connection('default').zrangebyscore(session_key(user_id), now, '+inf')]
+
+
+def rebuild(sessions):
+
+    """
+        replaces the registry of every user in sessions ( { user_id: [( jti, expiry timestamp ), ...] } )
+    """
+
+    pipeline = get_redis_connection('default').pipeline(transaction=False)
+
+    for user_id, members in sessions.items():
+        key = session_key(user_id)
+
+        pipeline.delete(key)
+        if members:
+            pipeline.zadd(key, {jti: expires for jti, expires in members})
+            pipeline.expireat(key, int(max(expires for jti, expires in members)) + 1)
+
+    pipeline.execute()
+
+
+######################################################### write-behind ###########################################################
+
+
+class WriteBehind:
+
+    """
+        applies session changes to the RefreshToken table from a background thread, in batches.
+        changes still queued when the process stops are lost, the table only ever lags behind redis.
+        redis stays the source of truth for the device limit.
+    """
+
+    def __init__(self):
+        self._queue = None
+        self._worker = None
+        self._lock = threading.Lock()
+
+    def _start(self):
+        if self._worker:
+            return
+
+        with self._lock:
+            if self._worker:
+                return
+
+            self._queue = queue.Queue(maxsize=settings.SESSION_REGISTRY_MAX_QUEUE_SIZE)
+            self._worker = threading.Thread(target=self._work, name='session-write-behind', daemon=True)
+            self._worker.start()
+
+    def put(self, change):
+        self._start()
+
+        try:
+            self._queue.put_nowait(change)
+
+        except queue.Full:
+            metrics.incr('sessions.write_behind.dropped')
+            logger.error('session write-behind queue full, dropped %s for user %s', change[0], change[1])
+
+    def join(self):
+
+        """
+            blocks until every queued change has been written, used by tests and benchmarks
+        """
+
+        self._start()
+        self._queue.join()
+
+    def _work(self):
+        while True:
+            # block for the first change then take whatever else is already waiting
+            batch = [self._queue.get()]
+
+            while len(batch) < settings.SESSION_REGISTRY_BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            try:
+                with metrics.timed('sessions.write_behind.flush'):
+                    self._flush(batch)
+
+                metrics.incr('sessions.write_behind.written', len(batch))
+
+            except Exception:
+                metrics.incr('sessions.write_behind.failed', len(batch))
+                logger.exception('failed to write %s session changes', len(batch))
+
+            finally:
+                close_old_connections()
+
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _flush(self, batch):
+        # consecutive changes of the same kind are written together, runs are applied in order
+        # so a clear never removes a session registered after it
+        for action, run in groupby(batch, key=lambda change: change[0]):
+            run = list(run)
+
+            if action == 'create':
+                RefreshToken.objects.bulk_create(
+                    [RefreshToken(user_id=user_id, token=token, jti=jti, expires_at=expires_at) for _, user_id, token, jti, expires_at in run],
+                    ignore_conflicts=True
+                )
+
+                # expired rows are pruned here instead of on the login path
+                RefreshToken.objects.filter(user_id__in={change[1] for change in run}, expires_at__lte=datetime.now(tz=dt_timezone.utc)).delete()
+
+            elif action == 'delete':
+                RefreshToken.objects.filter(token__in=[change[2] for change in run]).delete()
+
+            elif action == 'clear':
+                RefreshToken.objects.filter(user_id__in=[change[1] for change in run]).delete()
+
+
+# the process wide write-behind queue
+write_behind = WriteBehind()
@@ -0,0 +1,109 @@
+# python
+import time
+
+# redis
+from django_redis import get_redis_connection
+
+# simple jwt
+from rest_framework_simplejwt.settings import api_settings
+
+# session registry
+from auth_tokens.registry import session_key
+
+# metrics
+from seeran_backend import metrics
+
+
+"""
+    refresh token revocation index
+
+    revoked refresh tokens are remembered by their jti, not the whole jwt string, in one redis set per hour
+    of expiry ( revoked:<exp // 3600> ) holding the raw 16 byte jtis. a set is only kept until the tokens in it
+    would have expired anyway, so the index never holds more than a days worth of revocations.
+
+    each user also has a watermark ( revoked_before:<user_id> ), every refresh token issued before it is revoked.
+    setting it revokes all of a users devices in one write, which is what password changes need. token issue times
+    are whole seconds, so a token issued in the same second as the watermark is told apart by the session registry
+    ( auth_tokens.registry ): revoke_user() clears the users sessions along with setting the watermark, a same second
+    token whose session is registered was logged in after the revocation and is kept.
+
+    checking a token reads its jti's bucket, the users watermark and its session in one pipelined round trip.
+"""
+
+BUCKET_SECONDS = 3600
+
+
+def _bucket_key(expires):
+    return f'revoked:{int(expires) // BUCKET_SECONDS}'
+
+
+def _watermark_key(user_id):
+    return f'revoked_before:{user_id}'
+
+
+def _member(jti):
+    # simplejwt jtis are uuid4 hex strings, stored as raw bytes they take half the space
+    try:
+        return bytes.fromhex(jti)
+    except ValueError:
+        return jti
+
+
+def revoke(token):
+
+    """
+        revokes a single refresh token ( a decoded token object )
+    """
+
+    expires = token['exp']
+    key = _bucket_key(expires)
+
+    pipeline = get_redis_connection('default').pipeline(transaction=False)
+    pipeline.sadd(key, _member(token[api_settings.JTI_CLAIM]))
+    # the bucket outlives the last token that can land in it by a minute
+    pipeline.expireat(key, (int(expires) // BUCKET_SECONDS + 1) * BUCKET_SECONDS + 60)
+    pipeline.execute()
+
+    metrics.incr('revocation.revoked')
+
+
+def revoke_user(user_id):
+
+    """
+        revokes every refresh token issued to the user so far
+    """
+
+    lifetime = int(api_settings.REFRESH_TOKEN_LIFETIME.total_seconds())
+
+    # tokens issued before the watermark expire within a refresh token lifetime, so can the watermark.
+    # the sessions go in the same transaction, only sessions registered after it can vouch for same second tokens
+    pipeline = get_redis_connection('default').pipeline(transaction=True)
+    pipeline.set(_watermark_key(user_id), int(time.time()), ex=lifetime)
+    pipeline.delete(session_key(user_id))
+    pipeline.execute()
+
+    metrics.incr('revocation.revoked_user')
+
+
+def is_revoked(token):
+
+    """
+        checks a decoded refresh token against the revocation index and the users watermark
+    """
+
+    user_id = token[api_settings.USER_ID_CLAIM]
+
+    pipeline = get_redis_connection('default').pipeline(transaction=False)
+    pipeline.sismember(_bucket_key(token['exp']), _member(token[api_settings.JTI_CLAIM]))
+    pipeline.get(_watermark_key(user_id))
+    pipeline.zscore(session_key(user_id), token[api_settings.JTI_CLAIM])
+    revoked, watermark, session = pipeline.execute()
+
+    if revoked:
+        return True
+
+    if watermark is None:
+        return False
+
+    # issued in the same second as the revocation, revoked unless its session was registered after it
+    return token['iat'] < int(watermark) or (token['iat'] == int(watermark) and session is None)
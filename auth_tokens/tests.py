@@ -1,3 +1,75 @@
+# python
+import time
+from unittest import mock
+
+# django
+from django.core.cache import cache
 from django.test import TestCase
 
-# Create your tests here.
+# in-process caches
+from seeran_backend.caching import clear_local_caches
+
+# simple jwt
+from rest_framework_simplejwt.tokens import RefreshToken as RefreshJWT
+
+# models
+from users.models import CustomUser
+from auth_tokens.models import RefreshToken
+
+# query plans
+from seeran_backend.db.plans import QueryPlanMixin
+
+# revocation and sessions
+from auth_tokens import registry, revocation
+
+
+class RevokeUserTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        clear_local_caches()
+
+        # the RefreshToken table isn't under test, keep the write-behind thread out of the test database
+        patcher = mock.patch.object(registry.write_behind, 'put')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.user = CustomUser.objects.create(email='founder@example.com', name='ann', surname='founder', role='FOUNDER')
+
+    def login(self, issued_at):
+        # a registered session whose refresh token was issued at issued_at ( whole seconds, like every token )
+        token = RefreshJWT.for_user(self.user)
+        token['iat'] = issued_at
+        registry.register(self.user, str(token))
+
+        return RefreshJWT(str(token))
+
+    def test_watermark_revokes_earlier_tokens_only(self):
+        now = int(time.time()) - 10
+
+        before, same_second = self.login(now - 1), self.login(now)
+
+        with mock.patch('auth_tokens.revocation.time.time', return_value=now + 0.5):
+            revocation.revoke_user(self.user.pk)
+
+        # the session the user logs in with right after, in the same second
+        after = self.login(now)
+
+        self.assertTrue(revocation.is_revoked(before))
+        self.assertTrue(revocation.is_revoked(same_second))
+        self.assertFalse(revocation.is_revoked(after))
+        self.assertFalse(revocation.is_revoked(self.login(now + 1)))
+
+    def test_single_token_revocation(self):
+        token = self.login(int(time.time()))
+        self.assertFalse(revocation.is_revoked(token))
+
+        revocation.revoke(token)
+        self.assertTrue(revocation.is_revoked(token))
+
+
+class SessionQueryPlanTests(QueryPlanMixin, TestCase):
+
+    def test_user_sessions_use_an_index(self):
+        user = CustomUser.objects.create(email='admin@example.com', name='ann', surname='admin', role='ADMIN')
+        self.assertUsesIndex(RefreshToken.objects.filter(user=user).order_by('created_at'), 'refreshtoken_user_created_idx')
@@ -0,0 +1,225 @@
+# python
+import json
+
+# django
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from asgiref.sync import sync_to_async
+
+# rest framework
+from rest_framework import status
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+# models
+from users.models import CustomUser
+
+# otp store
+from . import otp_store
+
+# school status cache
+from schools import status as school_status
+
+# session registry
+from auth_tokens import registry as session_registry
+
+# email outbox
+from .outbox import send_otp_email
+
+# password hashing pool
+from .hashing import acheck_password
+
+# rate limiting
+from . import throttling
+
+# custom decorators
+from .decorators import async_token_required
+
+
+"""
+    async authentication views
+
+    async counterparts of the login, multi-factor authentication and authentication views, selected over the sync ones
+    with the ASYNC_AUTH_VIEWS setting. they run natively under the asgi application:
+        - the users table is read and written through the async orm
+        - password checks run on the bounded hashing pool ( authentication.hashing )
+        - redis calls ( otp store, session registry ) run off the event loop without holding the thread sensitive executor
+        - otp emails are queued on the outbox, which never blocks, delivery happens in the background
+
+    responses match the sync views so the frontend can't tell the stacks apart.
+"""
+
+
+def _offload(func):
+    # redis calls don't touch the database, so they can run on any thread
+    return sync_to_async(func, thread_sensitive=False)
+
+
+def _read_body(request):
+    try:
+        return json.loads(request.body or b'{}')
+    except json.JSONDecodeError:
+        return None
+
+
+def _set_token_cookies(response, access_token, refresh_token):
+    # set refresh token cookie with custom expiration (86400 seconds = 24 hours)
+    response.set_cookie('refresh_token', refresh_token, domain='.seeran-grades.cloud', samesite='None', secure=True, httponly=True, max_age=86400)
+
+    # set access token cookie with custom expiration (5 mins)
+    response.set_cookie('access_token', access_token, domain='.seeran-grades.cloud', samesite='None', secure=True, httponly=True, max_age=300)
+
+
+async def _start_session(user, data):
+
+    """
+        creates the users tokens and registers the session, returns the response with the token cookies set
+        or a 403 if the user has reached the device limit
+    """
+
+    refresh = RefreshToken.for_user(user)
+    refresh_token = str(refresh)
+
+    # prune expired sessions, check the device limit and register the new session in one call
+    if not await _offload(session_registry.register)(user, refresh_token):
+        return JsonResponse({"error": "maximum number of connected devices reached"}, status=status.HTTP_403_FORBIDDEN)
+
+    response = JsonResponse(data, status=status.HTTP_200_OK)
+    _set_token_cookies(response, str(refresh.access_token), refresh_token)
+
+    return response
+
+
+@csrf_exempt
+@require_POST
+async def login(request):
+
+    """
+        async login, see views.login
+    """
+
+    data = _read_body(request)
+
+    if data is None:
+        return JsonResponse({"error": "invalid request body"}, status=status.HTTP_400_BAD_REQUEST)
+
+    email = data.get('email')
+    password = data.get('password')
+
+    if not email or not password:
+        return JsonResponse({"error": "missing credentials"}, status=status.HTTP_400_BAD_REQUEST)
+
+    # rate limited before the password check, bursts never reach the hashing pool
+    allowed, retry_after = await _offload(throttling.check)('login', ip=throttling.get_client_ip(request), email=email)
+
+    if not allowed:
+        response = JsonResponse({"error": f"too many requests, please try again in {retry_after} seconds"}, status=status.HTTP_429_TOO_MANY_REQUESTS)
+        response['Retry-After'] = str(retry_after)
+
+        return response
+
+    try:
+        user = await CustomUser.objects.aget(email=email)
+
+        if not await acheck_password(user, password) or not api_settings.USER_AUTHENTICATION_RULE(user):
+            return JsonResponse({"error": "invalid credentials"}, status=status.HTTP_401_UNAUTHORIZED)
+
+        if not user.role == "FOUNDER":
+            if await school_status.ais_none_compliant(user.school_id):
+                return JsonResponse({"denied": "access denied"}, status=status.HTTP_403_FORBIDDEN)
+
+        # if users multi-factor authentication is enabled do this..
+        if user.multifactor_authentication:
+
+            # mfa requires we send an otp to the users email, if it's been banned disable mfa and log them in without it
+            if user.email_banned:
+                user.multifactor_authentication = False
+                await user.asave()
+
+                # the alert key is used on the frontend to alert the user of their email being banned and what they can do to appeal(if they can)
+                return await _start_session(user, {"message": "login successful", "alert" : "your email address has been blacklisted", "role" : user.role.title()})
+
+            otp = otp_store.generate_code()
+            authorization_otp = otp_store.generate_code()
+
+            # store both against the users email address for 5 mins( 300 seconds) as one challenge
+            await _offload(otp_store.issue)(user.email, otp=otp, authorization=authorization_otp)
+
+            if not send_otp_email(user, otp, "Your account has mutil-factor authentication toggled on, this OTP was generated in response to your login request.."):
+                return JsonResponse({"error": "failed to send OTP to your  email address"}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+            response = JsonResponse({"multifactor_authentication": "a new OTP has been sent to your email address"}, status=status.HTTP_200_OK)
+            response.set_cookie('authorization_otp', authorization_otp, domain='.seeran-grades.cloud', samesite='None', secure=True, httponly=True, max_age=300)  # 300 seconds = 5 mins
+
+            return response
+
+        # if users multi-factor authentication is disabled do this..
+        return await _start_session(user, {"message": "login successful", "role" : user.role.title()})
+
+    except CustomUser.DoesNotExist:
+        return JsonResponse({"error": "invalid credentials"}, status=status.HTTP_401_UNAUTHORIZED)
+
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@csrf_exempt
+@require_POST
+async def multi_factor_authentication_login(request):
+
+    """
+        async multi-factor authentication login, see views.multi_factor_authentication_login
+    """
+
+    data = _read_body(request)
+
+    if data is None:
+        return JsonResponse({"error": "invalid request body"}, status=status.HTTP_400_BAD_REQUEST)
+
+    email = data.get('email')
+    otp = data.get('otp')
+    authorization_cookie_otp = request.COOKIES.get('authorization_otp')
+
+    if not email or not otp or not authorization_cookie_otp:
+        return JsonResponse({"error": "missing credentials"}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        user = await CustomUser.objects.aget(email=email)
+
+        # verify the provided otp and authorization otp against the stored challenge in one call
+        result, attempts = await _offload(otp_store.verify)(user.email, otp=otp, authorization=authorization_cookie_otp)
+
+        if result == otp_store.EXPIRED:
+            return JsonResponse({"denied": "OTP expired"}, status=status.HTTP_400_BAD_REQUEST)
+
+        if result == otp_store.UNAUTHORIZED:
+            response = JsonResponse({"denied": "incorrect authorization OTP, action forrbiden"}, status=status.HTTP_400_BAD_REQUEST)
+            response.delete_cookie('authorization_otp', domain='.seeran-grades.cloud')
+
+            return response
+
+        if result == otp_store.LOCKED:
+            return JsonResponse({"denied": "maximum OTP verification attempts exceeded.."}, status=status.HTTP_400_BAD_REQUEST)
+
+        if result == otp_store.INCORRECT:
+            return JsonResponse({"error": f"incorrect OTP.. {attempts} remaining"}, status=status.HTTP_400_BAD_REQUEST)
+
+        return await _start_session(user, {"message": "login successful", "role" : user.role.title()})
+
+    except CustomUser.DoesNotExist:
+        return JsonResponse({"error": "invalid credentials"}, status=status.HTTP_404_NOT_FOUND)
+
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@require_GET
+@async_token_required
+async def authenticate(request):
+
+    """
+        async authentication, see views.authenticate. async_token_required refreshes the access token when it has expired
+    """
+
+    return JsonResponse({"role" : request.user.role.title()}, status=status.HTTP_200_OK)
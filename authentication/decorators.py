@@ -1,62 +1,116 @@
 # django
 from django.http import JsonResponse
 
-# models
-from users.models import CustomUser
-
 # restframework
-from rest_framework_simplejwt.tokens import AccessToken
+from rest_framework_simplejwt.settings import api_settings
 
-# django
-from django.core.exceptions import ObjectDoesNotExist
-from django.core.cache import cache
+# utility functions
+from .utils import decode_access_token
+from .principals import load_principal, aload_principal
+
+# auth tokens
+from auth_tokens.registry import decode_refresh_token
+from auth_tokens.revocation import is_revoked
+from auth_tokens.refresh import get_access_token
 
-# utility functions 
-from .utils import validate_access_token, refresh_access_token
+# school status cache
+from schools import status as school_status
 
 # rest framework
 from rest_framework import status
 
+# asgiref
+from asgiref.sync import sync_to_async
+
 
 def token_required(view_func):
     def _wrapped_view_func(request, *args, **kwargs):
-   
+
         access_token = request.COOKIES.get('access_token')
         refresh_token = request.COOKIES.get('refresh_token')
 
         if not refresh_token:
             return JsonResponse({'error': 'request not authenticated.. access denied'}, status=status.HTTP_401_UNAUTHORIZED)
-   
-        if cache.get(refresh_token):
+
+        # decode the refresh token once, it's checked for revocation and reused to mint access tokens
+        refresh = decode_refresh_token(refresh_token)
+
+        if refresh is None:
+            return JsonResponse({'error': 'invalid security credentials.. request revoked'}, status=status.HTTP_400_BAD_REQUEST)
+
+        # checks the revocation index and the users revoked before watermark in one round trip
+        if is_revoked(refresh):
             return JsonResponse({'error': 'invalid security credentials.. request revoked'}, status=status.HTTP_401_UNAUTHORIZED)
-    
-        if not access_token:
-            new_access_token = refresh_access_token(refresh_token)
-   
-        else:
-            new_access_token = validate_access_token(access_token)
-     
-            if new_access_token == None:
-                new_access_token = refresh_access_token(refresh_token)
-
-        if new_access_token:
-      
-            decoded_token = AccessToken(new_access_token)
-            try:
-                request.user = CustomUser.objects.get(pk=decoded_token['user_id'])
-     
-            except ObjectDoesNotExist:
-                return JsonResponse({"error": "invalid credentials.. no such user exists"}, status=status.HTTP_400_BAD_REQUEST)
-     
+
+        # decode the access token once, fall back to a new one from the refresh token
+        # ( concurrent requests for the same refresh token share one freshly minted access token )
+        if access_token and decode_access_token(access_token) is not None:
+            new_access_token = access_token
+
         else:
-            return JsonResponse({'error': 'invalid security credentials.. request revoked'}, status=status.HTTP_400_BAD_REQUEST)
+            new_access_token = get_access_token(refresh)
+
+        # resolve the user from the cached principal snapshot instead of querying the users table
+        principal = load_principal(refresh[api_settings.USER_ID_CLAIM])
+
+        if principal is None:
+            return JsonResponse({"error": "invalid credentials.. no such user exists"}, status=status.HTTP_400_BAD_REQUEST)
+
+        # users of schools flagged non compliant are locked out, read from the school status cache
+        if principal.role != 'FOUNDER' and school_status.is_none_compliant(principal.school_id):
+            return JsonResponse({"denied": "access denied"}, status=status.HTTP_403_FORBIDDEN)
+
+        request.user = principal
 
         response = view_func(request, *args, **kwargs)
 
         # Set the new access token in the response cookie
-        if new_access_token:
-            response.set_cookie('access_token', new_access_token, domain='.seeran-grades.com', samesite='None', secure=True, httponly=True, max_age=300)
-        
+        response.set_cookie('access_token', new_access_token, domain='.seeran-grades.com', samesite='None', secure=True, httponly=True, max_age=300)
+
         return response
     return _wrapped_view_func
 
+
+# token_required for the async views
+# the refresh and access tokens are decoded on the event loop ( cheap hmac checks ), redis and the users table are
+# read without holding the thread sensitive executor
+def async_token_required(view_func):
+    async def _wrapped_view_func(request, *args, **kwargs):
+
+        access_token = request.COOKIES.get('access_token')
+        refresh_token = request.COOKIES.get('refresh_token')
+
+        if not refresh_token:
+            return JsonResponse({'error': 'request not authenticated.. access denied'}, status=status.HTTP_401_UNAUTHORIZED)
+
+        refresh = decode_refresh_token(refresh_token)
+
+        if refresh is None:
+            return JsonResponse({'error': 'invalid security credentials.. request revoked'}, status=status.HTTP_400_BAD_REQUEST)
+
+        if await sync_to_async(is_revoked, thread_sensitive=False)(refresh):
+            return JsonResponse({'error': 'invalid security credentials.. request revoked'}, status=status.HTTP_401_UNAUTHORIZED)
+
+        if access_token and decode_access_token(access_token) is not None:
+            new_access_token = access_token
+
+        else:
+            new_access_token = await sync_to_async(get_access_token, thread_sensitive=False)(refresh)
+
+        principal = await aload_principal(refresh[api_settings.USER_ID_CLAIM])
+
+        if principal is None:
+            return JsonResponse({"error": "invalid credentials.. no such user exists"}, status=status.HTTP_400_BAD_REQUEST)
+
+        if principal.role != 'FOUNDER' and await school_status.ais_none_compliant(principal.school_id):
+            return JsonResponse({"denied": "access denied"}, status=status.HTTP_403_FORBIDDEN)
+
+        request.user = principal
+
+        response = await view_func(request, *args, **kwargs)
+
+        # Set the new access token in the response cookie
+        response.set_cookie('access_token', new_access_token, domain='.seeran-grades.com', samesite='None', secure=True, httponly=True, max_age=300)
+
+        return response
+    return _wrapped_view_func
@@ -0,0 +1,44 @@
+# python
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# django
+from django.conf import settings
+
+# metrics
+from seeran_backend import metrics
+
+
+"""
+    password hashing pool
+
+    pbkdf2 checks are pure cpu work, the async views run them on this bounded pool instead of the event loop or the
+    executors used for i/o. it's sized separately ( PASSWORD_HASHING_WORKERS ) so a burst of logins queues up here
+    rather than starving redis and database calls of threads.
+"""
+
+
+_executor = None
+_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=settings.PASSWORD_HASHING_WORKERS, thread_name_prefix='password-hashing')
+
+    return _executor
+
+
+async def acheck_password(user, password):
+
+    """
+        user.check_password on the hashing pool
+    """
+
+    with metrics.timed('auth.password_check'):
+        return await asyncio.get_running_loop().run_in_executor(get_executor(), user.check_password, password)
@@ -0,0 +1,166 @@
+# python
+import hashlib
+import hmac
+import secrets
+
+# django
+from django.conf import settings
+
+# redis
+from django_redis import get_redis_connection
+
+
+"""
+    otp store
+
+    every otp challenge for an email address lives in one redis hash ( otp:<email> ) holding
+        otp            - digest of the one time passcode emailed to the user
+        authorization  - digest of the authorization otp kept in the users cookies
+        attempts       - wrong otp guesses left before the challenge is thrown away
+
+    codes are stored as hmac digests keyed with the SECRET_KEY, so the digest of a guess can be computed
+    without reading anything from redis first. verifying a guess, decrementing the attempts, consuming the challenge and
+    issuing the next authorization otp then all happen inside one lua script, one round trip, and concurrent guesses
+    can't race past the attempt limit.
+"""
+
+OTP_TIMEOUT = 300  # 300 seconds = 5 mins
+MAX_ATTEMPTS = 3
+
+# verification results
+VERIFIED = 'verified'
+EXPIRED = 'expired'
+INCORRECT = 'incorrect'  # wrong otp, attempts remaining
+LOCKED = 'locked'  # wrong otp, no attempts remaining, challenge deleted
+UNAUTHORIZED = 'unauthorized'  # wrong authorization otp, challenge deleted
+
+_RESULTS = {0: EXPIRED, 1: VERIFIED, 2: INCORRECT, 3: LOCKED, 4: UNAUTHORIZED}
+
+
+# KEYS[1] challenge hash
+# ARGV[1] otp digest to check ( empty to skip )
+# ARGV[2] authorization digest to check ( empty to skip )
+# ARGV[3] authorization digest to issue once verified ( empty to consume the challenge instead )
+# ARGV[4] timeout for the issued authorization otp
+# ARGV[5] attempts granted with the issued authorization otp
+VERIFY_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return {0, 0}
+end
+
+if ARGV[1] ~= '' then
+    local stored = redis.call('HGET', KEYS[1], 'otp')
+    if not stored then
+        return {0, 0}
+    end
+
+    if stored ~= ARGV[1] then
+        local attempts = redis.call('HINCRBY', KEYS[1], 'attempts', -1)
+        if attempts < 0 then
+            redis.call('DEL', KEYS[1])
+            return {3, 0}
+        end
+        return {2, attempts}
+    end
+end
+
+if ARGV[2] ~= '' then
+    local stored = redis.call('HGET', KEYS[1], 'authorization')
+    if not stored then
+        return {0, 0}
+    end
+
+    if stored ~= ARGV[2] then
+        redis.call('DEL', KEYS[1])
+        return {4, 0}
+    end
+end
+
+if ARGV[3] ~= '' then
+    redis.call('DEL', KEYS[1])
+    redis.call('HSET', KEYS[1], 'authorization', ARGV[3], 'attempts', ARGV[5])
+    redis.call('EXPIRE', KEYS[1], ARGV[4])
+else
+    redis.call('DEL', KEYS[1])
+end
+
+return {1, 0}
+"""
+
+_script = None
+
+
+def _get_script():
+    global _script
+
+    if _script is None:
+        # Script objects call EVALSHA and only fall back to sending the whole script when redis doesn't know it yet
+        _script = get_redis_connection('default').register_script(VERIFY_SCRIPT)
+
+    return _script
+
+
+def _key(email):
+    return f'otp:{email}'
+
+
+def _digest(email, purpose, code):
+    return hmac.new(settings.SECRET_KEY.encode(), f'{purpose}:{email}:{code}'.encode(), hashlib.sha256).hexdigest()
+
+
+def generate_code():
+    return str(secrets.randbelow(900000) + 100000)
+
+
+def issue(email, otp=None, authorization=None, timeout=OTP_TIMEOUT):
+
+    """
+        starts a new challenge for the email address, replacing any previous one
+        otp is the code emailed to the user, authorization the code kept in their cookies
+    """
+
+    challenge = {'attempts': MAX_ATTEMPTS}
+
+    if otp:
+        challenge['otp'] = _digest(email, 'otp', otp)
+
+    if authorization:
+        challenge['authorization'] = _digest(email, 'authorization', authorization)
+
+    key = _key(email)
+
+    # one round trip, the replace happens atomically
+    pipeline = get_redis_connection('default').pipeline(transaction=True)
+    pipeline.delete(key)
+    pipeline.hset(key, mapping=challenge)
+    pipeline.expire(key, timeout)
+    pipeline.execute()
+
+
+def verify(email, otp=None, authorization=None, issue_authorization=None, timeout=OTP_TIMEOUT):
+
+    """
+        checks the provided otp and/or authorization otp against the challenge in one script call.
+
+        on success the challenge is consumed, or if issue_authorization is given it's replaced
+        by a new challenge holding only that authorization otp.
+
+        returns ( result, attempts remaining )
+    """
+
+    result, attempts = _get_script()(
+        keys=[_key(email)],
+        args=[
+            _digest(email, 'otp', otp) if otp else '',
+            _digest(email, 'authorization', authorization) if authorization else '',
+            _digest(email, 'authorization', issue_authorization) if issue_authorization else '',
+            timeout,
+            MAX_ATTEMPTS,
+        ]
+    )
+
+    return _RESULTS[int(result)], int(attempts)
+
+
+def discard(email):
+    get_redis_connection('default').delete(_key(email))
@@ -0,0 +1,262 @@
+# python
+import json
+import logging
+import queue
+import threading
+import time
+from decouple import config
+import requests
+from requests.adapters import HTTPAdapter
+
+# django
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+# metrics
+from seeran_backend import metrics
+
+
+logger = logging.getLogger(__name__)
+
+
+"""
+    email outbox
+
+    views never talk to the email provider directly, they build a message and enqueue it.
+    a small pool of worker threads drains the queue through the configured transport, retrying failed deliveries
+    with exponential backoff, so a slow provider response never holds up a request.
+
+    a message is a plain dict:
+        {
+            "to": "Surname Name<email@address>",
+            "subject": "One Time Passcode",
+            "template": "one-time passcode",
+            "variables": { "onetimecode": "123456", ... },
+        }
+
+    the queue lives in memory, messages still queued when the process stops are lost.
+    that's acceptable for what we send ( otps expire after 5 minutes anyway ).
+"""
+
+
+class DeliveryError(Exception):
+
+    """
+        raised by transports when a message could not be delivered, retryable is False for errors
+        that will fail the same way every time ( e.g a 4xx from the provider )
+    """
+
+    def __init__(self, message, retryable=True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+######################################################### transports ##############################################################
+
+
+class MailgunTransport:
+
+    """
+        delivers messages through the mailgun http api using a pooled, keep-alive session
+    """
+
+    name = 'mailgun'
+
+    def __init__(self):
+        self.url = "https://api.eu.mailgun.net/v3/" + config('MAILGUN_DOMAIN') + "/messages"
+        self.sender = "seeran grades <authorization@" + config('MAILGUN_DOMAIN') + ">"
+        self.timeout = (settings.EMAIL_OUTBOX_CONNECT_TIMEOUT, settings.EMAIL_OUTBOX_READ_TIMEOUT)
+
+        # one pooled session shared by all the workers, connections ( and their tls handshakes ) are reused
+        self.session = requests.Session()
+        self.session.auth = ('api', config('MAILGUN_API_KEY'))
+        self.session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=settings.EMAIL_OUTBOX_WORKERS))
+
+    def build_data(self, message):
+        data = {
+            "from": self.sender,
+            "to": message['to'],
+            "subject": message['subject'],
+            "template": message['template'],
+        }
+
+        for key, value in message.get('variables', {}).items():
+            data['v:' + key] = value
+
+        return data
+
+    def send(self, message):
+        try:
+            response = self.session.post(self.url, data=self.build_data(message), timeout=self.timeout)
+
+        except requests.RequestException as e:
+            raise DeliveryError(str(e))
+
+        if response.status_code != 200:
+            # 429s and 5xx are worth retrying, anything else will fail the same way again
+            retryable = response.status_code == 429 or response.status_code >= 500
+            raise DeliveryError(f'mailgun responded with {response.status_code}', retryable=retryable)
+
+
+class LocmemTransport:
+
+    """
+        keeps delivered messages in memory, used by tests and benchmarks in place of mailgun
+    """
+
+    name = 'locmem'
+
+    # every message delivered by any LocmemTransport in this process
+    sent = []
+
+    def send(self, message):
+        LocmemTransport.sent.append(message)
+
+
+class FileTransport:
+
+    """
+        appends delivered messages as json lines to EMAIL_OUTBOX_FILE_PATH, handy for local development
+    """
+
+    name = 'file'
+
+    def __init__(self):
+        self.path = settings.EMAIL_OUTBOX_FILE_PATH
+        self._lock = threading.Lock()
+
+    def send(self, message):
+        with self._lock:
+            with open(self.path, 'a') as file:
+                file.write(json.dumps(message) + '\n')
+
+
+########################################################### outbox ################################################################
+
+
+class Outbox:
+
+    def __init__(self):
+        self._queue = None
+        self._transport = None
+        self._workers = []
+        self._lock = threading.Lock()
+
+    @property
+    def transport(self):
+        self._start()
+        return self._transport
+
+    def _start(self):
+        # workers are started lazily on first use so importing this module ( e.g from management commands ) is free
+        if self._workers:
+            return
+
+        with self._lock:
+            if self._workers:
+                return
+
+            self._queue = queue.Queue(maxsize=settings.EMAIL_OUTBOX_MAX_QUEUE_SIZE)
+            self._transport = import_string(settings.EMAIL_OUTBOX_TRANSPORT)()
+
+            for number in range(settings.EMAIL_OUTBOX_WORKERS):
+                worker = threading.Thread(target=self._work, name=f'email-outbox-{number}', daemon=True)
+                worker.start()
+                self._workers.append(worker)
+
+    def enqueue(self, message):
+
+        """
+            queues the message for delivery, returns False if the outbox is full
+        """
+
+        self._start()
+
+        try:
+            self._queue.put_nowait((message, 0))
+
+        except queue.Full:
+            metrics.incr(f'outbox.{self._transport.name}.dropped')
+            return False
+
+        metrics.gauge('outbox.queue_depth', self._queue.qsize())
+        return True
+
+    def join(self):
+
+        """
+            blocks until every queued message has been delivered or given up on, used by tests and benchmarks
+        """
+
+        self._start()
+        self._queue.join()
+
+    def stats(self):
+        self._start()
+
+        return {
+            'transport': self._transport.name,
+            'queue_depth': self._queue.qsize(),
+            'workers': len(self._workers),
+        }
+
+    def _work(self):
+        name = self._transport.name
+
+        while True:
+            message, attempt = self._queue.get()
+
+            try:
+                with metrics.timed(f'outbox.{name}.send'):
+                    self._transport.send(message)
+
+                metrics.incr(f'outbox.{name}.sent')
+
+            except DeliveryError as e:
+                if e.retryable and attempt < settings.EMAIL_OUTBOX_MAX_RETRIES:
+                    metrics.incr(f'outbox.{name}.retried')
+
+                    # exponential backoff, this worker sleeps while the others keep draining the queue
+                    time.sleep(min(settings.EMAIL_OUTBOX_BACKOFF * 2 ** attempt, settings.EMAIL_OUTBOX_MAX_BACKOFF))
+                    self._requeue(message, attempt + 1)
+
+                else:
+                    metrics.incr(f'outbox.{name}.failed')
+                    logger.error('failed to deliver email to %s: %s', message.get('to'), e)
+
+            except Exception:
+                metrics.incr(f'outbox.{name}.failed')
+                logger.exception('unexpected error delivering email to %s', message.get('to'))
+
+            finally:
+                metrics.gauge('outbox.queue_depth', self._queue.qsize())
+                self._queue.task_done()
+
+    def _requeue(self, message, attempt):
+        try:
+            self._queue.put_nowait((message, attempt))
+
+        except queue.Full:
+            metrics.incr(f'outbox.{self._transport.name}.dropped')
+            logger.error('email outbox full, dropped retry for %s', message.get('to'))
+
+
+# the process wide outbox
+outbox = Outbox()
+
+
+def send_otp_email(user, otp, reason):
+
+    """
+        queues the one time passcode email for the user, returns False if it couldn't be queued
+    """
+
+    return outbox.enqueue({
+        "to": user.surname.title() + " " + user.name.title() + "<" + user.email + ">",
+        "subject": "One Time Passcode",
+        "template": "one-time passcode",
+        "variables": {
+            "onetimecode": otp,
+            "otpcodereason": reason,
+        },
+    })
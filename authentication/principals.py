@@ -0,0 +1,195 @@
+# django
+from django.conf import settings
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils.functional import LazyObject, empty
+
+# caching
+from seeran_backend.caching import LocalLRU
+
+
+"""
+    principal snapshots
+
+    token_required needs a handful of fields on every request (role, school and account id),
+    loading the whole user row for that costs a postgres round trip on nearly every api call.
+    instead we keep a compact snapshot of those fields in redis, fronted by a small in-process lru so bursts of requests
+    from the same user don't even hit redis. the full CustomUser row is only loaded if a view touches any other attribute.
+
+    the schools compliance flag isn't part of the snapshot, it comes from the school status cache ( schools.status )
+    so a school turning non compliant takes effect for all of its users at once.
+
+    deactivated users ( is_active, set when their deletion is requested, users.deletion ) get no principal, so their
+    sessions stop working on their next request.
+
+    the snapshot version is part of the cache key, bump it whenever the snapshot layout changes
+    so old entries are ignored instead of being unpacked into the wrong fields.
+"""
+
+SNAPSHOT_VERSION = 3
+
+# how long a snapshot lives in redis, and how long the in-process copy is trusted
+SNAPSHOT_TIMEOUT = getattr(settings, 'PRINCIPAL_SNAPSHOT_TIMEOUT', 600)
+LOCAL_TIMEOUT = getattr(settings, 'PRINCIPAL_LOCAL_TIMEOUT', 5)
+LOCAL_MAX_SIZE = getattr(settings, 'PRINCIPAL_LOCAL_MAX_SIZE', 2048)
+
+# the fields the snapshot is built from, CustomUser.save() invalidates the snapshot when any of them change
+SNAPSHOT_FIELDS = ('role', 'school_id', 'account_id', 'is_active')
+
+
+def snapshot_key(user_id):
+    return f'principal:v{SNAPSHOT_VERSION}:{user_id}'
+
+
+_local = LocalLRU(LOCAL_MAX_SIZE, LOCAL_TIMEOUT)
+
+
+def get_snapshot(user_id):
+
+    """
+        returns the snapshot tuple ( role, school_id, account_id, is_active ) for the user,
+        or None if no such user exists
+    """
+
+    key = snapshot_key(user_id)
+
+    snapshot = _local.get(key)
+    if snapshot is not None:
+        return snapshot
+
+    snapshot = cache.get(key)
+
+    if snapshot is None:
+        snapshot = get_user_model().objects.filter(pk=user_id).values_list(*SNAPSHOT_FIELDS).first()
+
+        if snapshot is None:
+            return None
+
+        snapshot = tuple(snapshot)
+        cache.set(key, snapshot, timeout=SNAPSHOT_TIMEOUT)
+
+    _local.set(key, snapshot)
+    return snapshot
+
+
+async def aget_snapshot(user_id):
+
+    """
+        get_snapshot for async views, redis is read off the event loop without holding the
+        thread sensitive executor and the users table is read through the async orm
+    """
+
+    key = snapshot_key(user_id)
+
+    snapshot = _local.get(key)
+    if snapshot is not None:
+        return snapshot
+
+    snapshot = await sync_to_async(cache.get, thread_sensitive=False)(key)
+
+    if snapshot is None:
+        snapshot = await get_user_model().objects.filter(pk=user_id).values_list(*SNAPSHOT_FIELDS).afirst()
+
+        if snapshot is None:
+            return None
+
+        snapshot = tuple(snapshot)
+        await sync_to_async(cache.set, thread_sensitive=False)(key, snapshot, timeout=SNAPSHOT_TIMEOUT)
+
+    _local.set(key, snapshot)
+    return snapshot
+
+
+def invalidate(user_id):
+    key = snapshot_key(user_id)
+
+    _local.delete(key)
+    cache.delete(key)
+
+
+def invalidate_many(user_ids):
+    keys = [snapshot_key(user_id) for user_id in user_ids]
+
+    for key in keys:
+        _local.delete(key)
+
+    if keys:
+        cache.delete_many(keys)
+
+
+class Principal(LazyObject):
+
+    """
+        stands in for request.user.
+
+        the snapshot fields are answered straight from the snapshot, anything else ( including setting attributes
+        and calling save() ) transparently loads and proxies the real CustomUser instance, so existing views keep working.
+    """
+
+    def __init__(self, user_id, snapshot):
+        # LazyObject.__setattr__ forwards everything except _wrapped to the wrapped object, so go through __dict__
+        self.__dict__['_user_id'] = user_id
+        self.__dict__['_snapshot'] = snapshot
+        super().__init__()
+
+    def _setup(self):
+        self._wrapped = get_user_model().objects.get(pk=self._user_id)
+
+    @property
+    def pk(self):
+        return self._user_id
+
+    @property
+    def id(self):
+        return self._user_id
+
+    @property
+    def role(self):
+        return self._wrapped.role if self._wrapped is not empty else self._snapshot[0]
+
+    @property
+    def school_id(self):
+        return self._wrapped.school_id if self._wrapped is not empty else self._snapshot[1]
+
+    @property
+    def account_id(self):
+        return self._wrapped.account_id if self._wrapped is not empty else self._snapshot[2]
+
+    @property
+    def is_active(self):
+        return self._wrapped.is_active if self._wrapped is not empty else self._snapshot[3]
+
+    @property
+    def is_authenticated(self):
+        return True
+
+    @property
+    def is_anonymous(self):
+        return False
+
+
+def load_principal(user_id):
+
+    """
+        returns a Principal for the user id in the token, or None if the user no longer exists ( or is deactivated )
+    """
+
+    snapshot = get_snapshot(user_id)
+    if snapshot is None or not snapshot[3]:
+        return None
+
+    return Principal(user_id, snapshot)
+
+
+async def aload_principal(user_id):
+
+    """
+        load_principal for async views
+    """
+
+    snapshot = await aget_snapshot(user_id)
+    if snapshot is None or not snapshot[3]:
+        return None
+
+    return Principal(user_id, snapshot)
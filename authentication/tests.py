@@ -1,3 +1,93 @@
-from django.test import TestCase
+# django
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase, override_settings
 
-# Create your tests here.
+# in-process caches
+from seeran_backend.caching import clear_local_caches
+
+# models
+from users.models import CustomUser
+
+# principal snapshots
+from authentication import principals
+
+# rate limiting
+from authentication.throttling import get_client_ip
+
+
+class PrincipalSnapshotTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        clear_local_caches()
+        self.user = CustomUser.objects.create(email='admin@example.com', name='ann', surname='admin', role='ADMIN')
+
+    def test_snapshot_is_dropped_once_the_change_commits(self):
+        principals.get_snapshot(self.user.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            # requests keep reading the cached snapshot while the change is uncommitted ..
+            self.user.role = 'TEACHER'
+            self.user.save()
+            self.assertEqual(principals.get_snapshot(self.user.pk)[0], 'ADMIN')
+
+        # .. which is dropped after the commit
+        self.assertEqual(principals.get_snapshot(self.user.pk)[0], 'TEACHER')
+
+    def test_deactivated_users_get_no_principal(self):
+        self.assertIsNotNone(principals.load_principal(self.user.pk))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+
+        self.assertIsNone(principals.load_principal(self.user.pk))
+
+    def test_snapshot_is_dropped_once_the_delete_commits(self):
+        principals.get_snapshot(self.user.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            user_id = self.user.pk
+            self.user.delete()
+
+        self.assertIsNone(principals.get_snapshot(user_id))
+
+
+class ClientIpTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        clear_local_caches()
+        self.factory = RequestFactory()
+
+    def ip(self, forwarded=None, remote='10.0.0.1'):
+        headers = {'HTTP_X_FORWARDED_FOR': forwarded} if forwarded is not None else {}
+        return get_client_ip(self.factory.get('/', REMOTE_ADDR=remote, **headers))
+
+    def test_uses_the_address_the_proxy_appended(self):
+        self.assertEqual(self.ip('203.0.113.7'), '203.0.113.7')
+        self.assertEqual(self.ip('1.2.3.4, 203.0.113.7'), '203.0.113.7')
+
+    @override_settings(TRUSTED_PROXY_COUNT=2)
+    def test_counts_trusted_proxies_from_the_right(self):
+        self.assertEqual(self.ip('1.2.3.4, 203.0.113.7, 10.1.1.1'), '203.0.113.7')
+
+        # the request skipped a proxy, the header can't be trusted
+        self.assertEqual(self.ip('203.0.113.7'), '10.0.0.1')
+
+    def test_falls_back_to_the_remote_address(self):
+        self.assertEqual(self.ip(), '10.0.0.1')
+        self.assertEqual(self.ip(' , '), '10.0.0.1')
+
+        with self.settings(TRUSTED_PROXY_COUNT=0):
+            self.assertEqual(self.ip('203.0.113.7'), '10.0.0.1')
+
+    @override_settings(THROTTLE_RATES={'login': {'email': (1000, 900), 'ip': (2, 900)}})
+    def test_spoofed_leftmost_addresses_share_the_ip_limit(self):
+        statuses = [
+            self.client.post('/api/auth/login/', {'email': f'user{n}@example.com', 'password': 'wrong'}, content_type='application/json', HTTP_X_FORWARDED_FOR=f'198.51.100.{n}, 203.0.113.7').status_code
+            for n in range(3)
+        ]
+
+        self.assertNotEqual(statuses[1], 429)
+        self.assertEqual(statuses[2], 429)
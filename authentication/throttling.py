@@ -0,0 +1,221 @@
+# python
+import functools
+import logging
+import threading
+import time
+
+# django
+from django.conf import settings
+
+# redis
+from django_redis import get_redis_connection
+from django_redis.exceptions import ConnectionInterrupted
+from redis.exceptions import RedisError
+
+# rest framework
+from rest_framework.response import Response
+from rest_framework import status
+
+# metrics
+from seeran_backend import metrics
+
+
+logger = logging.getLogger(__name__)
+
+
+"""
+    rate limiting
+
+    sliding window limits per scope ( 'login', 'otp' ) on several dimensions at once, the email address in the request,
+    the client ip and the account id of authenticated users. a request is let through only if every dimension it carries
+    is under its limit, and only then are all of them counted.
+
+    windows are approximated with two fixed buckets, the current one plus the previous one weighted by how much of it
+    still overlaps the window, so each dimension costs two small counters instead of a log of timestamps.
+    checking and counting every dimension happens in one lua script.
+
+    limits are ( requests, window in seconds ) in settings.THROTTLE_RATES. if redis is unreachable the limits are
+    enforced per process from memory instead, looser across workers but never open.
+"""
+
+# KEYS    current and previous bucket of every dimension, in pairs
+# ARGV[1] now ( unix timestamp )
+# ARGV    limit and window of every dimension, in pairs
+THROTTLE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local retry_after = 0
+local limited = 0
+
+for i = 1, #KEYS, 2 do
+    local limit = tonumber(ARGV[i + 1])
+    local window = tonumber(ARGV[i + 2])
+
+    local current = tonumber(redis.call('GET', KEYS[i]) or '0')
+    local previous = tonumber(redis.call('GET', KEYS[i + 1]) or '0')
+    local elapsed = now % window
+
+    if previous * (1 - elapsed / window) + current + 1 > limit then
+        local wait = math.ceil(window - elapsed)
+        if wait > retry_after then
+            retry_after = wait
+            limited = (i + 1) / 2
+        end
+    end
+end
+
+if limited > 0 then
+    return {0, retry_after, limited}
+end
+
+for i = 1, #KEYS, 2 do
+    redis.call('INCR', KEYS[i])
+    redis.call('EXPIRE', KEYS[i], ARGV[i + 2] * 2)
+end
+
+return {1, 0, 0}
+"""
+
+_script = None
+
+
+def _get_script():
+    global _script
+
+    if _script is None:
+        _script = get_redis_connection('default').register_script(THROTTLE_SCRIPT)
+
+    return _script
+
+
+class _LocalWindows:
+
+    """
+        the same sliding window counters kept in process memory, used while redis is unavailable
+    """
+
+    def __init__(self):
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def check(self, keys, limits, now):
+        with self._lock:
+            self._prune(now)
+
+            retry_after, limited = 0, 0
+
+            for number, ((current, previous), (limit, window)) in enumerate(zip(keys, limits), start=1):
+                elapsed = now % window
+                count = self._counts.get(previous, (0, 0))[0] * (1 - elapsed / window) + self._counts.get(current, (0, 0))[0]
+
+                if count + 1 > limit and window - elapsed > retry_after:
+                    retry_after, limited = int(window - elapsed) + 1, number
+
+            if limited:
+                return False, retry_after, limited
+
+            for (current, previous), (limit, window) in zip(keys, limits):
+                count, expires = self._counts.get(current, (0, now + window * 2))
+                self._counts[current] = (count + 1, expires)
+
+            return True, 0, 0
+
+    def _prune(self, now):
+        if len(self._counts) < 10000:
+            return
+
+        for key in [key for key, (count, expires) in self._counts.items() if expires < now]:
+            del self._counts[key]
+
+
+_local = _LocalWindows()
+
+
+def get_client_ip(request):
+    # the app sits behind TRUSTED_PROXY_COUNT proxies, each appends the address it was connected from to
+    # X-Forwarded-For. the client writes whatever it likes in front of those, so the client is the address the
+    # outermost trusted proxy appended, counted from the right
+    proxies = getattr(settings, 'TRUSTED_PROXY_COUNT', 1)
+    forwarded = [address.strip() for address in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',') if address.strip()]
+
+    if proxies and len(forwarded) >= proxies:
+        return forwarded[-proxies]
+
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def check(scope, ip=None, email=None, account_id=None):
+
+    """
+        counts the request against every dimension provided for the scope.
+        returns ( allowed, retry after seconds )
+    """
+
+    if not settings.THROTTLE_ENABLED:
+        return True, 0
+
+    rates = settings.THROTTLE_RATES[scope]
+    values = {'ip': ip, 'email': str(email).casefold() if email else None, 'account': account_id}
+
+    # dimensions without a value ( e.g no account id before login ) or without a rate are skipped
+    dimensions = [dimension for dimension in rates if values.get(dimension)]
+
+    if not dimensions:
+        return True, 0
+
+    now = time.time()
+    keys, limits = [], []
+
+    for dimension in dimensions:
+        limit, window = rates[dimension]
+        bucket = int(now // window)
+        base = f'throttle:{scope}:{dimension}:{values[dimension]}'
+
+        keys.append((f'{base}:{bucket}', f'{base}:{bucket - 1}'))
+        limits.append((limit, window))
+
+    try:
+        allowed, retry_after, limited = _get_script()(
+            keys=[key for pair in keys for key in pair],
+            args=[now] + [value for pair in limits for value in pair]
+        )
+
+    except (RedisError, ConnectionInterrupted) as e:
+        metrics.incr('throttle.fallback')
+        logger.warning('rate limiting from memory, redis unavailable: %s', e)
+
+        allowed, retry_after, limited = _local.check(keys, limits, now)
+
+    if not allowed:
+        metrics.incr(f'throttle.{scope}.limited')
+        metrics.incr(f'throttle.{scope}.limited.{dimensions[int(limited) - 1]}')
+        return False, int(retry_after)
+
+    metrics.incr(f'throttle.{scope}.allowed')
+    return True, 0
+
+
+def limited_response(retry_after):
+    response = Response({"error": f"too many requests, please try again in {retry_after} seconds"}, status=status.HTTP_429_TOO_MANY_REQUESTS)
+    response['Retry-After'] = str(retry_after)
+
+    return response
+
+
+# rate limit decorator
+# goes under @api_view ( and @token_required ), the email is read from the already parsed request data
+def throttle(scope):
+    def decorator(view_func):
+        @functools.wraps(view_func)
+        def _wrapped_view_func(request, *args, **kwargs):
+
+            email = request.data.get('email') if hasattr(request.data, 'get') else None
+            account_id = request.user.account_id if getattr(request.user, 'is_authenticated', False) else None
+
+            allowed, retry_after = check(scope, ip=get_client_ip(request), email=email, account_id=account_id)
+
+            if not allowed:
+                return limited_response(retry_after)
+
+            return view_func(request, *args, **kwargs)
+        return _wrapped_view_func
+    return decorator
@@ -1,10 +1,14 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import views, async_views
+
+# the async stack serves authentication, login and mfa login when ASYNC_AUTH_VIEWS is on
+auth_views = async_views if settings.ASYNC_AUTH_VIEWS else views
 
 urlpatterns = [
 
     # authentication
-    path('authenticate/', views.authenticate, name='get name and surname'),
+    path('authenticate/', auth_views.authenticate, name='get name and surname'),
     
     # email change
     path('validate-email/', views.validate_email_change, name='validate users email before email change'),
@@ -26,10 +30,10 @@ urlpatterns = [
     path('resend-otp/', views.resend_otp, name='request new otp'),
     
     # login
-    path('login/', views.login, name='token obtain pair'),
+    path('login/', auth_views.login, name='token obtain pair'),
     
     # multi-factor authentication
-    path('mfa-login/', views.multi_factor_authentication_login, name='change users multi-factor authentication prefferance'),
+    path('mfa-login/', auth_views.multi_factor_authentication_login, name='change users multi-factor authentication prefferance'),
     path('mfa-change/', views.mfa_change, name='change users multi-factor authentication prefferance'),
     
     # sign in
@@ -39,4 +43,7 @@ urlpatterns = [
     # logout
     path('log-out/', views.logout, name='user logout'),
     
+    # metrics
+    path('metrics/', views.metrics, name='process metrics'),
+    
 ]
@@ -1,42 +1,53 @@
-# python
-from datetime import timedelta
-from decouple import config
-import requests
-import base64
-
 # rest framework
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework.exceptions import AuthenticationFailed
 from rest_framework import status
 from rest_framework_simplejwt.tokens import AccessToken
+from rest_framework_simplejwt.settings import api_settings
 from .serializers import CustomTokenObtainPairSerializer
 
 # django
 from django.contrib.auth.hashers import check_password
 from django.core.exceptions import ObjectDoesNotExist
-from django.core.cache import cache
 from django.core.validators import validate_email
 from django.core.exceptions import ValidationError
 from django.db import transaction
-from django.utils import timezone
 
 # models
 from email_bans.models import EmailBan
 from users.models import CustomUser
-from auth_tokens.models import RefreshToken
 
 # utility functions 
-from .utils import validate_access_token, generate_access_token, generate_token, generate_otp, verify_user_otp, validate_user_email, validate_names
+from .utils import validate_access_token, generate_access_token, generate_token, validate_user_email, validate_names
+
+# otp store
+from . import otp_store
+
+# school status cache
+from schools import status as school_status
+
+# session registry and token revocation
+from auth_tokens import registry as session_registry
+from auth_tokens import revocation
+
+# email outbox
+from .outbox import send_otp_email, outbox
+
+# metrics
+from seeran_backend import metrics as process_metrics
 
 # custom decorators
 from .decorators import token_required
+from .throttling import throttle
+from users.decorators import founder_only
 
 
 ####################################################### login and authentication views #############################################
 
 
 @api_view(['POST'])
+@throttle('login')
 def login(request):
 
     """
@@ -50,9 +61,9 @@ def login(request):
         5. If the user doesn't exist or if the user is not a "FOUNDER" and their school is non-compliant, it returns an error.
         6. If the user's multi-factor authentication is enabled:
             - If the user's email has recently been banned, it disables multi-factor authentication and logs them in without it.
-            - If the user's email is not banned, it generates an OTP and tries to send it to the user's email address.
-            - If the OTP email is successfully sent, it caches the hashed OTP against the user's email address for 5 minutes.
-            - If there was an error sending the OTP email, it returns a 500 Internal Server Error.
+            - If the user's email is not banned, it generates an OTP and an authorization OTP and stores them as one challenge for 5 minutes.
+            - It then queues the OTP email for delivery and sets the authorization OTP cookie.
+            - If the OTP email couldn't be queued, it returns a 503 Service Unavailable error.
         7. If the user's multi-factor authentication is disabled, it logs the user in and sets the access and refresh token cookies.
 
         Note: All exceptions are handled and appropriate HTTP status codes are returned.
@@ -69,7 +80,7 @@ def login(request):
         user = CustomUser.objects.get(email=request.data.get('email'))
         
         if not user.role == "FOUNDER":
-            if user.school.none_compliant:
+            if school_status.is_none_compliant(user.school_id):
                 return Response({"denied": "access denied"}, status=status.HTTP_403_FORBIDDEN)
      
         # if users multi-factor authentication is enabled do this..
@@ -85,23 +96,13 @@ def login(request):
                 user.save()
             
                 if 'refresh' in token:
-                    # Calculate cutoff time for expired tokens
-                    cutoff_time = timezone.now() - timedelta(hours=24)
+                    # prune expired sessions, check the device limit and register the new session in one call
+                    if not session_registry.register(user, token['refresh']):
+                        return Response({"error": "maximum number of connected devices reached"}, status=status.HTTP_403_FORBIDDEN)
                 
                     # the alert key is used on the frontend to alert the user of their email being banned and what they can do to appeal(if they can)
                     response = Response({"message": "login successful", "alert" : "your email address has been blacklisted", "role" : user.role.title()}, status=status.HTTP_200_OK)
                 
-                    with transaction.atomic():
-                        # Delete expired tokens and count active tokens in one database query
-                        expired_tokens_count = RefreshToken.objects.filter(user=user, is_active=True, created_at__lt=cutoff_time).delete()[0]
-                        refresh_tokens_count = RefreshToken.objects.filter(user=user, is_active=True).count()
-                    
-                    if refresh_tokens_count >= 3:
-                        return Response({"error": "maximum number of connected devices reached"}, status=status.HTTP_403_FORBIDDEN)
-        
-                    refresh_token = token['refresh']
-                    RefreshToken.objects.create(user=user, token=refresh_token)
-                
                     # set access token cookie with custom expiration (5 mins)
                     response.set_cookie('access_token', token['access'], domain='.seeran-grades.cloud', samesite='None', secure=True, httponly=True, max_age=300)
                     
@@ -115,78 +116,33 @@ def login(request):
                 return response
         
             # else if their email address is not banned generate an otp for the user
-            otp, hashed_otp, salt = generate_otp()
+            # and another authorization otp for the request
+            # this is saved in the cookies of the the request( it will be needed when the user verifyies the otp )
+            otp = otp_store.generate_code()
+            authorization_otp = otp_store.generate_code()
+
+            # store both against the users email address for 5 mins( 300 seconds) as one challenge
+            otp_store.issue(user.email, otp=otp, authorization=authorization_otp)
+
+            # then queue the OTP email, the outbox delivers it in the background so the request doesn't wait on mailgun
+            if not send_otp_email(user, otp, "Your account has mutil-factor authentication toggled on, this OTP was generated in response to your login request.."):
+                # if the email couldn't be queued respond accordingly
+                return Response({"error": "failed to send OTP to your  email address"}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+            response = Response({"multifactor_authentication": "a new OTP has been sent to your email address"}, status=status.HTTP_200_OK)
         
-            # then try to send the OTP to their email address
-            # Define your Mailgun API URL
-            mailgun_api_url = "https://api.eu.mailgun.net/v3/" + config('MAILGUN_DOMAIN') + "/messages"
-
-            # Define your email data
-            email_data = {
-                "from": "seeran grades <authorization@" + config('MAILGUN_DOMAIN') + ">",
-                "to": user.surname.title() + " " + user.name.title() + "<" + user.email + ">",
-                "subject": "One Time Passcode",
-                "template": "one-time passcode",
-                "v:onetimecode": otp,
-                "v:otpcodereason": "Your account has mutil-factor authentication toggled on, this OTP was generated in response to your login request.."
-            }
-
-            # Define your headers
-            headers = {
-                "Authorization": "Basic " + base64.b64encode(f"api:{config('MAILGUN_API_KEY')}".encode()).decode(),
-                "Content-Type": "application/x-www-form-urlencoded"
-            }
-
-            # Send the email via Mailgun
-            response = requests.post(
-                mailgun_api_url,
-                headers=headers,
-                data=email_data
-            )
-
-            if response.status_code == 200:
-                    
-                # if the email was successfully delivered cache the hashed otp against the users 'email' address for 5 mins( 300 seconds)
-                # this is cached to our redis database for faster retrieval when we verify the otp
-                cache.set(user.email, (hashed_otp, salt), timeout=300)  # 300 seconds = 5 mins
-                
-                # then generate another authorization otp for the request
-                # this is saved in the cookies of the the request( it will be needed when the user verifyies the otp )
-                authorization_otp, hashed_authorization_otp, authorization_otp_salt = generate_otp()
-                
-                # cache the authorization otp under the users 'email+"authorization_otp"'
-                cache.set(user.email+'authorization_otp', (hashed_authorization_otp, authorization_otp_salt), timeout=300)  # 300 seconds = 5 mins
-                
-                response = Response({"multifactor_authentication": "a new OTP has been sent to your email address"}, status=status.HTTP_200_OK)
+            # set the authorization cookie then return the response
+            response.set_cookie('authorization_otp', authorization_otp, domain='.seeran-grades.cloud', samesite='None', secure=True, httponly=True, max_age=300)  # 300 seconds = 5 mins
             
-                # set the authorization cookie then return the response
-                response.set_cookie('authorization_otp', authorization_otp, domain='.seeran-grades.cloud', samesite='None', secure=True, httponly=True, max_age=300)  # 300 seconds = 5 mins
-                
-                return response
-                
-            else:
-                # if there was an error sending the email respond accordingly
-                # this will kick off our sns service and their email will get banned 
-                # regardless of wether it was a soft of hard bounce
-                return Response({"error": "failed to send OTP to your  email address"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            return response
 
         if 'refresh' in token:
-            # Calculate cutoff time for expired tokens
-            cutoff_time = timezone.now() - timedelta(hours=24)
+            # prune expired sessions, check the device limit and register the new session in one call
+            if not session_registry.register(user, token['refresh']):
+                return Response({"error": "maximum number of connected devices reached"}, status=status.HTTP_403_FORBIDDEN)
             
             # if users multi-factor authentication is disabled do this..
             response = Response({"message": "login successful", "role" : user.role.title()}, status=status.HTTP_200_OK)
-        
-            with transaction.atomic():
-                # Delete expired tokens and count active tokens in one database query
-                RefreshToken.objects.filter(user=user, is_active=True, created_at__lt=cutoff_time).delete()[0]
-                refresh_tokens_count = RefreshToken.objects.filter(user=user, is_active=True).count()
-            
-            if refresh_tokens_count >= 3:
-                return Response({"error": "maximum number of connected devices reached"}, status=status.HTTP_403_FORBIDDEN)
- 
-            refresh_token = token['refresh']
-            RefreshToken.objects.create(user=user, token=refresh_token)
             
             # set refresh token cookie with custom expiration (86400 seconds = 24 hours)
             response.set_cookie('refresh_token', token['refresh'], domain='.seeran-grades.cloud', samesite='None', secure=True, httponly=True, max_age=86400)
@@ -224,14 +180,13 @@ def multi_factor_authentication_login(request):
         2. If any of these are missing, it returns a 400 Bad Request error.
         3. It tries to get the user object using the provided email address.
         4. If no user exists, it returns an error.
-        5. After getting the user object, it retrieves the stored OTP from the cache.
-        6. If there's no OTP in the cache, it returns a 400 Bad Request error.
-        7. If any other exception occurs while retrieving the OTP from the cache, it returns a 500 Internal Server Error.
-        8. If everything checks out, it verifies the provided OTP against the stored OTP.
-        9. If the provided OTP is verified successfully, it verifies the authorization OTP in the request's cookies.
-        10. If the authorization OTP doesn't match the one stored for the user, it returns a 400 Bad Request error.
-        11. If there's no error until here, verification is successful. It deletes all cached OTPs and generates an access and refresh token for the user.
-        12. It then sets the access/refresh token cookies and returns a successful response.
+        5. After getting the user object, it verifies the provided OTP and the authorization OTP against the stored challenge in one call.
+        6. If there's no challenge in the cache, it returns a 400 Bad Request error.
+        7. If the authorization OTP doesn't match the one stored for the user, the challenge is discarded and it returns a 400 Bad Request error.
+        8. If the OTP is incorrect, an attempt is used up and it returns a 400 Bad Request error ( the challenge is discarded once attempts run out ).
+        9. If any other exception occurs, it returns a 500 Internal Server Error.
+        10. If there's no error until here, verification is successful and the challenge is consumed. It generates an access and refresh token for the user.
+        11. It then sets the access/refresh token cookies and returns a successful response.
 
         Note: All exceptions are handled and appropriate HTTP status codes are returned.
     """
@@ -250,80 +205,48 @@ def multi_factor_authentication_login(request):
         
         user = CustomUser.objects.get(email=email)
     
-        # after getting the user object retrieve the stored otp from cache 
-        stored_hashed_otp_and_salt = cache.get(user.email)
+        # after getting the user object verify the provided otp and authorization otp against the stored challenge
+        # this also counts the attempt and consumes the challenge, all in one call
+        result, attempts = otp_store.verify(user.email, otp=otp, authorization=authorization_cookie_otp)
         
-        # try to get the the authorization otp from cache
-        hashed_authorization_otp_and_salt = cache.get(user.email + 'authorization_otp')
-        
-        if not ( hashed_authorization_otp_and_salt and stored_hashed_otp_and_salt ):
-            # if there's no authorization otp in cache( wasn't provided in the first place, or expired since it also has a 5 minute lifespan )
+        if result == otp_store.EXPIRED:
+            # if there's no challenge in cache( wasn't provided in the first place, or expired since it has a 5 minute lifespan )
             return Response({"denied": "OTP expired"}, status=status.HTTP_400_BAD_REQUEST)
     
-        # if everything above checks out verify the provided otp against the stored otp
-        if verify_user_otp(user_otp=otp, stored_hashed_otp_and_salt=stored_hashed_otp_and_salt):
-            # provided otp is verified successfully
-                        
-            if not verify_user_otp(user_otp=authorization_cookie_otp, stored_hashed_otp_and_salt=hashed_authorization_otp_and_salt):
-                # if the authorization otp does'nt match the one stored for the user return an error 
-                response = Response({"denied": "incorrect authorization OTP, action forrbiden"}, status=status.HTTP_400_BAD_REQUEST)
-                            
-                # if there's no error till here verification is successful, delete all cached otps
-                cache.delete(user.email)
-                cache.delete(user.email + 'authorization_otp')
-
-                response.delete_cookie('authorization_otp', domain='.seeran-grades.cloud')
-                return response
-            
-            # if there's no error till here verification is successful, delete all cached otps
-            cache.delete(user.email)
-            cache.delete(user.email + 'authorization_otp')
-            
-            # then generate an access and refresh token for the user 
-            token = generate_token(user)
-            
-            if 'refresh_token' in token:
-                # Calculate cutoff time for expired tokens
-                cutoff_time = timezone.now() - timedelta(hours=24)
-                
-                # if users multi-factor authentication is disabled do this..
-                response = Response({"message": "login successful", "role" : user.role.title()}, status=status.HTTP_200_OK)
-            
-                with transaction.atomic():
-                    # Delete expired tokens and count active tokens in one database query
-                    expired_tokens_count = RefreshToken.objects.filter(user=user, created_at__lt=cutoff_time).delete()[0]
-                    refresh_tokens_count = RefreshToken.objects.filter(user=user).count()
-                
-                if refresh_tokens_count >= 3:
-                    return Response({"error": "maximum number of connected devices reached"}, status=status.HTTP_403_FORBIDDEN)
-    
-                refresh_token = token['refresh_token']
-                RefreshToken.objects.create(user=user, token=refresh_token)
-                
-                # set refresh token cookie with custom expiration (86400 seconds = 24 hours)
-                response.set_cookie('refresh_token', token['refresh_token'], domain='.seeran-grades.cloud', samesite='None', secure=True, httponly=True, max_age=86400)
-            
-                # set access token cookie with custom expiration (5 mins)
-                response.set_cookie('access_token', token['access_token'], domain='.seeran-grades.cloud', samesite='None', secure=True, httponly=True, max_age=300)
-            
-            else:
-                response = Response({"error": "couldn't generating authentication tokens"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        if result == otp_store.UNAUTHORIZED:
+            # if the authorization otp does'nt match the one stored for the user return an error, the challenge is discarded
+            response = Response({"denied": "incorrect authorization OTP, action forrbiden"}, status=status.HTTP_400_BAD_REQUEST)
 
+            response.delete_cookie('authorization_otp', domain='.seeran-grades.cloud')
             return response
         
-        attempts = cache.get(email + 'attempts', 3)
-        
-        if attempts <= 0:
-            cache.delete(email)
-            cache.delete(email + 'attempts')
+        if result == otp_store.LOCKED:
             return Response({"denied": "maximum OTP verification attempts exceeded.."}, status=status.HTTP_400_BAD_REQUEST)
         
-        # Incorrect OTP, decrement attempts and handle expiration
-        attempts -= 1
-        cache.set(email + 'attempts', attempts, timeout=300)  # Update attempts with expiration
+        if result == otp_store.INCORRECT:
+            return Response({"error": f"incorrect OTP.. {attempts} remaining"}, status=status.HTTP_400_BAD_REQUEST)
+        
+        # verification is successful, generate an access and refresh token for the user 
+        token = generate_token(user)
+        
+        if 'refresh_token' in token:
+            # prune expired sessions, check the device limit and register the new session in one call
+            if not session_registry.register(user, token['refresh_token']):
+                return Response({"error": "maximum number of connected devices reached"}, status=status.HTTP_403_FORBIDDEN)
+            
+            response = Response({"message": "login successful", "role" : user.role.title()}, status=status.HTTP_200_OK)
+            
+            # set refresh token cookie with custom expiration (86400 seconds = 24 hours)
+            response.set_cookie('refresh_token', token['refresh_token'], domain='.seeran-grades.cloud', samesite='None', secure=True, httponly=True, max_age=86400)
+        
+            # set access token cookie with custom expiration (5 mins)
+            response.set_cookie('access_token', token['access_token'], domain='.seeran-grades.cloud', samesite='None', secure=True, httponly=True, max_age=300)
+        
+        else:
+            response = Response({"error": "couldn't generating authentication tokens"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        return response
 
-        return Response({"error": f"incorrect OTP.. {attempts} remaining"}, status=status.HTTP_400_BAD_REQUEST)
-    
     except ObjectDoesNotExist:
         # if no user exists return an error 
         return Response({"error": "invalid credentials"}, status=status.HTTP_404_NOT_FOUND)
@@ -334,6 +257,7 @@ def multi_factor_authentication_login(request):
 
 
 @api_view(['POST'])
+@throttle('otp')
 def signin(request):
 
     """
@@ -349,8 +273,8 @@ def signin(request):
         7. If the user's account has already been activated, it returns a 403 Forbidden error.
         8. If the user's email is banned, it returns an alert.
         9. If everything checks out, it creates an OTP for the user and tries to send it to their email address.
-        10. If the OTP email is successfully sent, it caches the OTP and returns a successful response.
-        11. If there was an error sending the OTP email, it returns a 500 Internal Server Error.
+        10. It stores the OTP as a new challenge for 5 minutes and queues the OTP email for delivery, returning a successful response.
+        11. If the OTP email couldn't be queued, it returns a 503 Service Unavailable error.
 
         Note: All exceptions are handled and appropriate HTTP status codes are returned.
     """
@@ -374,7 +298,7 @@ def signin(request):
         user = CustomUser.objects.get(email=email)
 
         if not user.role == "FOUNDER":
-            if user.school.none_compliant:
+            if school_status.is_none_compliant(user.school_id):
                 return Response({"denied": "access denied"}, status=status.HTTP_403_FORBIDDEN)
                 
         # check if the provided name and surname are correct
@@ -394,42 +318,16 @@ def signin(request):
     
         # if everything checks out without an error 
         # create an otp for the user
-        otp, hashed_otp, salt = generate_otp()
-
-        # Define your Mailgun API URL
-        mailgun_api_url = "https://api.eu.mailgun.net/v3/" + config('MAILGUN_DOMAIN') + "/messages"
-
-        # Define your email data
-        email_data = {
-            "from": "seeran grades <authorization@" + config('MAILGUN_DOMAIN') + ">",
-            "to": user.surname.title() + " " + user.name.title() + "<" + user.email + ">",
-            "subject": "One Time Passcode",
-            "template": "one-time passcode",
-            "v:onetimecode": otp,
-            "v:otpcodereason": "We are pleased to have you trying out our service, this OTP was generated in response to your account activation request.."
-        }
-
-        # Define your headers
-        headers = {
-            "Authorization": "Basic " + base64.b64encode(f"api:{config('MAILGUN_API_KEY')}".encode()).decode(),
-            "Content-Type": "application/x-www-form-urlencoded"
-        }
-
-        # Send the email via Mailgun
-        response = requests.post(
-            mailgun_api_url,
-            headers=headers,
-            data=email_data
-        )
-
-        if response.status_code == 200:
-
-            # if the email was successfully sent cache the otp then return the response
-            cache.set(user.email, (hashed_otp, salt), timeout=300)  # 300 seconds = 5 mins
+        otp = otp_store.generate_code()
+
+        # store the otp then queue the OTP email, the outbox delivers it in the background
+        otp_store.issue(user.email, otp=otp)
+
+        if send_otp_email(user, otp, "We are pleased to have you trying out our service, this OTP was generated in response to your account activation request.."):
             return Response({"message": "OTP created and sent to your email",}, status=status.HTTP_200_OK)
         
-        # if there was an error sending the email respond accordingly
-        return Response({"error": "failed to send OTP to your email address"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)    
+        # if the email couldn't be queued respond accordingly
+        return Response({"error": "failed to send OTP to your email address"}, status=status.HTTP_503_SERVICE_UNAVAILABLE)    
     
     except ObjectDoesNotExist:
         # if there's no user with the provided credentials return an error 
@@ -454,10 +352,10 @@ def activate_account(request):
         Steps:
         1. It retrieves the authorization OTP from the cookie, and the provided email and new password.
         2. If any of these are missing or if the new password doesn't match the confirm password, it returns a 400 Bad Request error.
-        3. It retrieves the stored authorization OTP from the cache.
-        4. If there's no OTP in the cache, it returns a 400 Bad Request error.
-        5. If any other exception occurs while retrieving the OTP from the cache, it returns a 500 Internal Server Error.
-        6. It verifies the provided OTP against the stored OTP.
+        3. It verifies the authorization OTP against the stored challenge, which consumes the challenge.
+        4. If there's no challenge in the cache or the OTP doesn't match, it returns a 400 Bad Request error.
+        5. If any other exception occurs while verifying the OTP, it returns a 500 Internal Server Error.
+        6. It checks the user's account still exists.
         7. If the provided OTP is verified successfully, it activates the user's account and sets the new password.
         8. It then generates an access and refresh token for the user, sets the access/refresh token cookies, and returns a successful response.
         9. If the user with the provided email doesn't exist, it returns a 404 Not Found error.
@@ -478,15 +376,12 @@ def activate_account(request):
     
     try:
 
-        # get authorization otp 
+        # get authorization otp and verify it against the stored challenge, this consumes the challenge
         otp = request.COOKIES.get('authorization_otp')
-        hashed_authorization_otp_and_salt = cache.get(email + 'authorization_otp')
 
-        if not (hashed_authorization_otp_and_salt or otp or verify_user_otp(otp, hashed_authorization_otp_and_salt)):
+        if not otp or otp_store.verify(email, authorization=otp)[0] != otp_store.VERIFIED:
             # if the authorization otp does'nt match the one stored for the user return an error 
             response = Response({"denied": "invalid authorization OTP, action forrbiden"}, status=status.HTTP_400_BAD_REQUEST)
-                        
-            cache.delete(user.email + 'authorization_otp')
 
             if otp:
                 response.delete_cookie('authorization_otp', domain='.seeran-grades.cloud')
@@ -557,13 +452,17 @@ def logout(request):
             # Add the refresh token to the blacklist
             response = Response({"message": "logged you out successful"}, status=status.HTTP_200_OK)
         
-            # delete token from database
-            RefreshToken.objects.filter(user=request.user.pk, token=token).delete()
+            # remove the session from the users registry and revoke the token,
+            # the user is read from the token since this view isn't authenticated
+            refresh = session_registry.decode_refresh_token(token)
+
+            if refresh is not None:
+                session_registry.unregister(refresh[api_settings.USER_ID_CLAIM], refresh[api_settings.JTI_CLAIM], token)
+                revocation.revoke(refresh)
             
             # Clear the refresh token cookie
             response.delete_cookie('access_token', domain='.seeran-grades.cloud')
             response.delete_cookie('refresh_token', domain='.seeran-grades.cloud')
-            cache.set(token, 'blacklisted', timeout=86400)
          
             return response
    
@@ -653,37 +552,25 @@ def verify_otp(request):
         return Response({"denied": "email and OTP are required."}, status=status.HTTP_400_BAD_REQUEST)
     
     try:
-        stored_hashed_otp_and_salt = cache.get(email)
+        # verify the otp, on success the otp is swapped for an authorization otp in the same call
+        authorization_otp = otp_store.generate_code()
+        result, attempts = otp_store.verify(email, otp=otp, issue_authorization=authorization_otp)
 
-        if not stored_hashed_otp_and_salt:
+        if result == otp_store.EXPIRED:
             return Response({"denied": "OTP expired.. please generate a new one"}, status=status.HTTP_400_BAD_REQUEST)
     
-        if verify_user_otp(user_otp=otp, stored_hashed_otp_and_salt=stored_hashed_otp_and_salt):
+        if result == otp_store.VERIFIED:
             
             # OTP is verified, prompt the user to set their password
-            cache.delete(email)
-            authorization_otp, hashed_authorization_otp, salt = generate_otp()
-            cache.set(email+'authorization_otp', (hashed_authorization_otp, salt), timeout=300)  # 300 seconds = 5 mins
-            
             response = Response({"message": "OTP verified successfully"}, status=status.HTTP_200_OK)
             response.set_cookie('authorization_otp', authorization_otp, domain='.seeran-grades.cloud', samesite='None', secure=True, httponly=True, max_age=300)  # 300 seconds = 5 mins
             
             return response
         
-        else:
-
-            attempts = cache.get(email + 'attempts', 3)
-            
-            if attempts <= 0:
-                cache.delete(email)
-                cache.delete(email + 'attempts')
-                return Response({"denied": "maximum OTP verification attempts exceeded.."}, status=status.HTTP_400_BAD_REQUEST)
-            
-            # Incorrect OTP, decrement attempts and handle expiration
-            attempts -= 1
-            cache.set(email + 'attempts', attempts, timeout=300)  # Update attempts with expiration
+        if result == otp_store.LOCKED:
+            return Response({"denied": "maximum OTP verification attempts exceeded.."}, status=status.HTTP_400_BAD_REQUEST)
 
-            return Response({"error": f"incorrect OTP.. {attempts} remaining"}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"error": f"incorrect OTP.. {attempts} remaining"}, status=status.HTTP_400_BAD_REQUEST)
     
     except Exception as e:
         return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -701,27 +588,26 @@ def otp_verification(request):
     if not email or not otp:
         return Response({"error": "email and OTP are required."}, status=status.HTTP_400_BAD_REQUEST)
     
+    # verify the otp, on success the otp is swapped for an authorization otp in the same call
     try:
-        hashed_otp = cache.get(email)
-        if not hashed_otp:
+        authorization_otp = otp_store.generate_code()
+        result, attempts = otp_store.verify(email, otp=otp, issue_authorization=authorization_otp)
+
+        if result == otp_store.EXPIRED:
             return Response({"error": "OTP expired"}, status=status.HTTP_400_BAD_REQUEST)
     
     except Exception as e:
         return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     
-    if verify_user_otp(user_otp=otp, stored_hashed_otp_and_salt=hashed_otp):
+    if result == otp_store.VERIFIED:
         
         # OTP is verified, prompt the user to set their password
         try:
             user = CustomUser.objects.get(email=email)
         
         except ObjectDoesNotExist:
+            otp_store.discard(email)
             return Response({"error": "invalid credentials/tokens"})
-        
-        cache.delete(user.email)
-
-        authorization_otp, hashed_authorization_otp = generate_otp()
-        cache.set(user.email+'authorization_otp', hashed_authorization_otp, timeout=300)  # 300 seconds = 5 mins
                 
         access_token = generate_access_token(user)
 
@@ -732,8 +618,10 @@ def otp_verification(request):
         
         return response
     
-    else:
-        return Response({"error": "incorrect OTP. Please try again."}, status=status.HTTP_400_BAD_REQUEST)
+    if result == otp_store.LOCKED:
+        return Response({"error": "maximum OTP verification attempts exceeded.."}, status=status.HTTP_400_BAD_REQUEST)
+
+    return Response({"error": "incorrect OTP. Please try again."}, status=status.HTTP_400_BAD_REQUEST)
 
 
 # validate password before password change
@@ -758,41 +646,16 @@ def validate_password(request):
     try:
                 
         # Create an OTP for the user
-        otp, hashed_otp, salt = generate_otp()
+        otp = otp_store.generate_code()
     
-        cache.set(request.user.email, (hashed_otp, salt), timeout=300)  # 300 seconds = 5 mins
+        otp_store.issue(request.user.email, otp=otp)
         
-        # Define your Mailgun API URL
-        mailgun_api_url = "https://api.eu.mailgun.net/v3/" + config('MAILGUN_DOMAIN') + "/messages"
-
-        # Define your email data
-        email_data = {
-            "from": "seeran grades <authorization@" + config('MAILGUN_DOMAIN') + ">",
-            "to": request.user.surname.title() + " " + request.user.name.title() + "<" + request.user.email + ">",
-            "subject": "One Time Passcode",
-            "template": "one-time passcode",
-            "v:onetimecode": otp,
-            "v:otpcodereason": "This OTP was generated in response to your request to update your password.."
-        }
-
-        # Define your headers
-        headers = {
-            "Authorization": "Basic " + base64.b64encode(f"api:{config('MAILGUN_API_KEY')}".encode()).decode(),
-            "Content-Type": "application/x-www-form-urlencoded"
-        }
-
-        # Send the email via Mailgun
-        response = requests.post(
-            mailgun_api_url,
-            headers=headers,
-            data=email_data
-        )
-
-        if response.status_code == 200:
+        # queue the OTP email, the outbox delivers it in the background
+        if send_otp_email(request.user, otp, "This OTP was generated in response to your request to update your password.."):
             return Response({"message": "password verified, OTP created and sent to your email", "users_email" : request.user.email}, status=status.HTTP_200_OK)
 
         else:
-            return Response({"error": "failed to send OTP via email"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            return Response({"error": "failed to send OTP via email"}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
         
     except Exception as e:
         return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
@@ -824,14 +687,9 @@ def validate_email_change(request):
     if request.user.email_banned:
         return Response({ "error" : "your email address has been banned, request denied"}, status=status.HTTP_403_FORBIDDEN)
     
-    # Create an OTP for the user
-    # otp, hashed_otp, salt = generate_otp()
-    
     # Send the OTP via email
     try:
             
-        # cache hashed otp and return reponse
-        # cache.set(sent_email, (hashed_otp, salt), timeout=300)  # 300 seconds = 5 mins
         return Response({"message": "email verified, OTP created and sent to your email"}, status=status.HTTP_200_OK)
         
         # else:
@@ -843,6 +701,7 @@ def validate_email_change(request):
 
 # validate email before password reset
 @api_view(['POST'])
+@throttle('otp')
 def validate_password_reset(request):
     
     # check for sent email
@@ -854,7 +713,7 @@ def validate_password_reset(request):
     try:
         user = CustomUser.objects.get(email=sent_email)
         if not user.role == "FOUNDER":
-            if user.school.none_compliant:
+            if school_status.is_none_compliant(user.school_id):
                 return Response({"denied": "access denied"})
     
         # check if the account is activated 
@@ -869,14 +728,9 @@ def validate_password_reset(request):
         if not validate_user_email(sent_email):
             return Response({"error": " invalid email address"})
         
-        # Create an OTP for the user
-        # otp, hashed_otp, salt = generate_otp()
-        
         # Send the OTP via email
         try:
                 
-            # cache hashed otp and return reponse
-            # cache.set(sent_email, (hashed_otp, salt), timeout=300)  # 300 seconds = 5 mins
             return Response({"message": "email verified, OTP created and sent to your email"}, status=status.HTTP_200_OK)
             
             # else:
@@ -909,21 +763,22 @@ def change_password(request):
     if not new_password or not confirm_password or not otp:
         return Response({"error": "missing credentials"}, status=status.HTTP_400_BAD_REQUEST)
     
+    # Validate that the new password and confirm password match
+    # ( before verifying the otp, verifying consumes it )
+    if new_password != confirm_password:
+        return Response({"error": "new password and confirm password do not match"}, status=status.HTTP_400_BAD_REQUEST)
+    
     try:
-        hashed_authorization_otp = cache.get(request.user.email + 'authorization_otp')
-        if not hashed_authorization_otp:
+        result, attempts = otp_store.verify(request.user.email, authorization=otp)
+        if result == otp_store.EXPIRED:
             return Response({"error": "OTP expired, please reload the page to request a new OTP"}, status=status.HTTP_400_BAD_REQUEST)
     
     except Exception as e:
         return Response({"error": f"error retrieving OTP from cache: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     
-    if not verify_user_otp(otp, hashed_authorization_otp):
+    if result != otp_store.VERIFIED:
         return Response({"error": "incorrect OTP, action forrbiden"}, status=status.HTTP_400_BAD_REQUEST)
     
-    # Validate that the new password and confirm password match
-    if new_password != confirm_password:
-        return Response({"error": "new password and confirm password do not match"}, status=status.HTTP_400_BAD_REQUEST)
-    
     # Update the user's password
     request.user.set_password(new_password)
     request.user.save()
@@ -936,9 +791,9 @@ def change_password(request):
         response.delete_cookie('access_token', domain='.seeran-grades.com')
         response.delete_cookie('refresh_token', domain='.seeran-grades.com')
      
-        # blacklist refresh token
-        refresh_token = request.COOKIES.get('refresh_token')
-        cache.set(refresh_token, 'blacklisted', timeout=86400)
+        # revoke every refresh token issued to the user and drop their sessions, all their devices are logged out
+        revocation.revoke_user(request.user.pk)
+        session_registry.clear(request.user.pk)
         return response
     
     except:
@@ -981,16 +836,16 @@ def reset_password(request):
     except ObjectDoesNotExist:
         return Response({"error": "invalid credentials/tokens"})
     
-    # get authorization otp from cache and verify provided otp
+    # verify provided otp against the stored authorization otp
     try:
-        hashed_authorization_otp = cache.get(user.email + 'authorization_otp')
-        if not hashed_authorization_otp:
+        result, attempts = otp_store.verify(user.email, authorization=otp)
+        if result == otp_store.EXPIRED:
             return Response({"error": "OTP expired"}, status=status.HTTP_400_BAD_REQUEST)
     
     except Exception as e:
         return Response({"error": f"error retrieving OTP from cache: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     
-    if not verify_user_otp(otp, hashed_authorization_otp):
+    if result != otp_store.VERIFIED:
         return Response({"error": "incorrect OTP, action forrbiden"}, status=status.HTTP_400_BAD_REQUEST)
     
     # update the user's password
@@ -1028,29 +883,34 @@ def change_email(request):
     if new_email == request.user.email:
         return Response({"error": "cannot set current email as new email"}, status=status.HTTP_400_BAD_REQUEST)
   
+    # ( validated before verifying the otp, verifying consumes it )
+    if not validate_user_email(new_email):
+        return Response({'error': 'Invalid email format'}, status=400)
+  
     try:
-        hashed_authorization_otp = cache.get(request.user.email + 'authorization_otp')
-        if not hashed_authorization_otp:
+        result, attempts = otp_store.verify(request.user.email, authorization=otp)
+        if result == otp_store.EXPIRED:
             return Response({"error": "OTP expired, please reload the page to request a new OTP"}, status=status.HTTP_400_BAD_REQUEST)
   
     except Exception as e:
         return Response({"error": f"error retrieving OTP from cache: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
   
-    if not verify_user_otp(otp, hashed_authorization_otp):
+    if result != otp_store.VERIFIED:
         return Response({"error": "incorrect OTP, action forrbiden"}, status=status.HTTP_400_BAD_REQUEST)
  
     try:
-     
-        if not validate_user_email(new_email):
-            return Response({'error': 'Invalid email format'}, status=400)
     
         request.user.email = new_email
         request.user.save()
    
         try:
-            # Add the refresh token to the blacklist
+            # revoke the refresh token and drop its session
             refresh_token = request.COOKIES.get('refresh_token')
-            cache.set(refresh_token, 'blacklisted', timeout=86400)
+            refresh = session_registry.decode_refresh_token(refresh_token)
+
+            if refresh is not None:
+                session_registry.unregister(request.user.pk, refresh[api_settings.JTI_CLAIM], refresh_token)
+                revocation.revoke(refresh)
            
             response = Response({"message": "email changed successfully"})
        
@@ -1069,6 +929,7 @@ def change_email(request):
 
 # Request otp view
 @api_view(['POST'])
+@throttle('otp')
 def resend_otp(request):
  
     email = request.data.get('email')
@@ -1086,11 +947,8 @@ def resend_otp(request):
     if user.email_banned:
         return Response({ "error" : "your email address has been banned, failed to send OTP"})
     
-    # otp, hashed_otp = generate_otp()
-  
     # Send the OTP via email
     try:
-            # cache.set(user.email, hashed_otp, timeout=300)  # 300 seconds = 5 mins
             return Response({"message": "OTP created and sent to your email"}, status=status.HTTP_200_OK)
     
         # else:
@@ -1107,6 +965,21 @@ def resend_otp(request):
 
 
 
+####################################################################################################################################
+
+
+######################################################### metrics views ############################################################
+
+
+# process metrics
+# each worker process reports its own counters and timers
+@api_view(['GET'])
+@token_required
+@founder_only
+def metrics(request):
+    return Response({"metrics": process_metrics.snapshot(), "outbox": outbox.stats()}, status=status.HTTP_200_OK)
+
+
 ####################################################################################################################################
 
 
@@ -0,0 +1,118 @@
+# python
+from dateutil.relativedelta import relativedelta
+
+# django
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, Count, Exists, OuterRef, Value, When
+from django.utils import timezone
+
+# public ids
+from seeran_backend.ids import generate_ids
+
+# models
+from users.models import CustomUser
+from schools.models import School
+from balances.models import Balance, Bill
+
+# school status cache
+from schools import status as school_status
+
+
+"""
+    monthly billing
+
+    bills every principal whose billing date has come, BILLING_RATE_PER_STUDENT for every student in their school,
+    and flags the schools of principals with unpaid bills as in arrears ( they aren't billed again until they pay ).
+
+    a run costs the same handful of queries however many schools there are:
+        - the principals with their school, billing date, arrears and already billed flags, the last two as EXISTS subqueries
+        - the student count of every school, one grouped aggregate
+        - one bulk insert for the bills, one update for the billing dates and one for the schools whose arrears flag changed
+
+    bills carry their billing period ( YYYY-MM ) and a principal can only have one bill per period,
+    running the same period twice never bills anyone twice.
+"""
+
+
+def billing_period(date):
+    return date.strftime('%Y-%m')
+
+
+def next_billing_date(date):
+    # the 7th of the following month, like new balances
+    return (date + relativedelta(months=1)).replace(day=7)
+
+
+def run_billing(date=None, dry_run=False):
+
+    """
+        bills the period of the given date ( today by default ).
+        returns a report of what was ( or with dry_run, would be ) done
+    """
+
+    date = date or timezone.now().date()
+    period = billing_period(date)
+
+    principals = CustomUser.objects.filter(role='PRINCIPAL', school__isnull=False).annotate(
+        has_unpaid_bills=Exists(Bill.objects.filter(user=OuterRef('pk'), is_paid=False)),
+        billed=Exists(Bill.objects.filter(user=OuterRef('pk'), billing_period=period)),
+    ).values_list('pk', 'school_id', 'school__in_arears', 'balance__billing_date', 'has_unpaid_bills', 'billed')
+
+    student_counts = dict(
+        CustomUser.objects.filter(role='STUDENT', school__isnull=False).values('school_id').annotate(students=Count('pk')).values_list('school_id', 'students')
+    )
+
+    bills, in_arears, settled, already_billed = [], [], [], 0
+
+    for user_id, school_id, school_in_arears, billing_date, has_unpaid_bills, billed in principals:
+
+        if has_unpaid_bills:
+            if not school_in_arears:
+                in_arears.append(school_id)
+            continue
+
+        if school_in_arears:
+            settled.append(school_id)
+
+        # principals without a balance have no billing date and are never billed, like before
+        if billing_date is None or billing_date > date:
+            continue
+
+        if billed:
+            already_billed += 1
+            continue
+
+        bills.append(Bill(user_id=user_id, amount=student_counts.get(school_id, 0) * settings.BILLING_RATE_PER_STUDENT, date_billed=date, billing_period=period))
+
+    report = {
+        'period': period,
+        'dry_run': dry_run,
+        'bills': len(bills),
+        'amount': str(sum(bill.amount for bill in bills)),
+        'already_billed': already_billed,
+        'in_arears': len(in_arears),
+        'settled': len(settled),
+    }
+
+    if dry_run:
+        return report
+
+    for bill, bill_id in zip(bills, generate_ids('BI', len(bills))):
+        bill.bill_id = bill_id
+
+    with transaction.atomic():
+        # a concurrent run that got there first already billed the period, its bills are kept
+        Bill.objects.bulk_create(bills, ignore_conflicts=True)
+
+        Balance.objects.filter(user_id__in=[bill.user_id for bill in bills]).update(billing_date=next_billing_date(date))
+
+        # only the schools whose flag changed, in one update
+        if in_arears or settled:
+            School.objects.filter(pk__in=in_arears + settled).update(
+                in_arears=Case(When(pk__in=in_arears, then=Value(True)), default=Value(False))
+            )
+
+    school_status.refresh(in_arears + settled)
+
+    return report
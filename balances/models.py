@@ -1,11 +1,12 @@
 # python 
 from dateutil.relativedelta import relativedelta
-import uuid
 
 # django
 from django.db import models
 from django.utils import timezone
-from django.db import IntegrityError
+
+# public ids
+from seeran_backend.ids import generate_id
 
 # models 
 from users.models import CustomUser
@@ -26,31 +27,9 @@ class Balance(models.Model):
     # overwrite save method
     def save(self, *args, **kwargs):
         if not self.balance_id:
-            self.balance_id = self.generate_unique_account_id('BL')
-
-        attempts = 0
-        while attempts < 5:
-            try:
-                super().save(*args, **kwargs)
-                break
-            except IntegrityError:
-                # If an IntegrityError is raised, it means the balance_id was not unique.
-                # Generate a new balance_id and try again.
-                self.balance_id = self.generate_unique_account_id('BL')
-                attempts += 1
-        if attempts >= 5:
-            raise ValueError('Could not create balance with unique balance ID after 5 attempts. Please try again later.')
-
-
-    @staticmethod
-    def generate_unique_account_id(prefix=''):
-        while True:
-            unique_part = uuid.uuid4().hex
-            account_id = prefix + unique_part
-            account_id = account_id[:15].ljust(15, '0')
+            self.balance_id = generate_id('BL')
 
-            if not Balance.objects.filter(balance_id=account_id).exists():
-                return account_id
+        super().save(*args, **kwargs)
 
 
 class Bill(models.Model):
@@ -61,39 +40,25 @@ class Bill(models.Model):
             
     bill_id = models.CharField(max_length=15, unique=True)
 
-    # overwrite save method
-    def save(self, *args, **kwargs):
-        # This is a new bill, so update the billing date in the Balance model
-        if not self.id:
-            balance = self.user.balance
-            balance.billing_date = timezone.now().date().replace(day=1) + relativedelta(months=1)
-            balance.save()
-        super().save(*args, **kwargs)
+    # the month the bill is for ( YYYY-MM ), the billing engine bills a principal once per period
+    billing_period = models.CharField(max_length=7, blank=True, null=True)
 
-    def save(self, *args, **kwargs):
-        if not self.bill_id:
-            self.bill_id = self.generate_unique_account_id('BI')
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'billing_period'], name='unique_bill_per_billing_period'),
+        ]
 
-        attempts = 0
-        while attempts < 5:
-            try:
-                super().save(*args, **kwargs)
-                break
-            except IntegrityError:
-                # If an IntegrityError is raised, it means the bill_id was not unique.
-                # Generate a new bill_id and try again.
-                self.bill_id = self.generate_unique_account_id('BI')
-                attempts += 1
-        if attempts >= 5:
-            raise ValueError('Could not create user with unique bill ID after 5 attempts. Please try again later.')
+        indexes = [
+            # unpaid bills of a principal ( billing, compliance )
+            models.Index(fields=['user', 'is_paid'], name='bill_user_is_paid_idx'),
 
+            # a principals bills newest first ( bills view )
+            models.Index(fields=['user', 'date_billed'], name='bill_user_date_billed_idx'),
+        ]
 
-    @staticmethod
-    def generate_unique_account_id(prefix=''):
-        while True:
-            unique_part = uuid.uuid4().hex
-            account_id = prefix + unique_part
-            account_id = account_id[:15].ljust(15, '0')
+    # overwrite save method
+    def save(self, *args, **kwargs):
+        if not self.bill_id:
+            self.bill_id = generate_id('BI')
 
-            if not Bill.objects.filter(bill_id=account_id).exists():
-                return account_id
+        super().save(*args, **kwargs)
@@ -4,6 +4,9 @@ from rest_framework import serializers
 # models
 from .models import Balance, Bill
 
+# principal and balance loader
+from schools.loaders import get_principal_loader
+
 
 ### users balance serilizers ###
 
@@ -26,5 +29,8 @@ class BillsSerializer(serializers.ModelSerializer):
         fields = [ 'amount', 'date_billed', 'is_paid', 'bill_id', 'in_arears' ]
         
     def get_in_arears(self, obj):
-        return obj.user.school.in_arears
+        # the billed users and their schools are loaded for every bill being serialized at once
+        user = get_principal_loader(self, user_ids=lambda bills: [bill.user_id for bill in bills]).user(obj.user_id)
+        return bool(user and user.school and user.school.in_arears)
+
         
\ No newline at end of file
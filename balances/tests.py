@@ -1,3 +1,64 @@
+# django
+from django.core.cache import cache
 from django.test import TestCase
+from django.utils import timezone
 
-# Create your tests here.
+# in-process caches
+from seeran_backend.caching import clear_local_caches
+
+# models
+from users.models import CustomUser
+from schools.models import School
+from balances.models import Balance, Bill
+
+# utility functions
+from authentication.utils import generate_token
+
+# query plans
+from seeran_backend.db.plans import QueryPlanMixin
+
+
+class BillQueryPlanTests(QueryPlanMixin, TestCase):
+
+    def setUp(self):
+        cache.clear()
+        clear_local_caches()
+        self.principal = CustomUser.objects.create(email='principal@example.com', name='pat', surname='principal', role='PRINCIPAL')
+
+    def test_unpaid_bills_use_an_index(self):
+        self.assertUsesIndex(Bill.objects.filter(user=self.principal, is_paid=False), 'bill_user_is_paid_idx', 'bill_user_date_billed_idx')
+
+    def test_principal_bills_use_an_index(self):
+        self.assertUsesIndex(Bill.objects.filter(user=self.principal).order_by('-date_billed'), 'bill_user_date_billed_idx')
+
+
+class PrincipalInvoicesQueryTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        clear_local_caches()
+
+        school = School.objects.create(name='school', email='school@example.com', contact_number='0110000000')
+        self.principal = CustomUser.objects.create(email='principal@example.com', name='pat', surname='principal', role='PRINCIPAL', school=school)
+        Balance.objects.create(user=self.principal, amount=100)
+
+        today = timezone.now().date()
+        for month in range(10):
+            Bill.objects.create(user=self.principal, amount=100, date_billed=today - timezone.timedelta(days=30 * month), is_paid=month > 0, billing_period=f'p{month}')
+
+        self.founder = CustomUser.objects.create(email='founder@example.com', name='fred', surname='founder', role='FOUNDER')
+        self.client.cookies['refresh_token'] = generate_token(self.founder)['refresh_token']
+
+    def test_bills_endpoint(self):
+        path = f'/api/blnc/principal-invoices/{self.principal.account_id}/'
+
+        # warms the founders principal snapshot
+        self.client.get(path)
+
+        # the principal, a page of bills and the billed users with their schools, no balances
+        with self.assertNumQueries(3):
+            response = self.client.get(path)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['invoices']), 10)
+        self.assertFalse(any(bill['in_arears'] for bill in response.json()['invoices']))
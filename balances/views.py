@@ -16,6 +16,9 @@ from users.models import CustomUser
 # serializers
 from .serializers import BillsSerializer
 
+# pagination
+from seeran_backend.pagination import paginate
+
 
 # get principal invoices
 @api_view(['GET'])
@@ -25,14 +28,11 @@ from .serializers import BillsSerializer
 def principal_invoices(request, user_id):
     try:
         # Get the principal instance
-        principal = CustomUser.objects.get(user_id=user_id)
+        principal = CustomUser.objects.get(account_id=user_id)
     except CustomUser.DoesNotExist:
         return Response({"error" : "user not found"}, status=404)
     # Get the principal's bills
-    principal_bills = Bill.objects.filter(user=principal).order_by('-date_billed')
-    if not principal_bills:
-        return Response({"invoices" : None}, status=200)
-    # Serialize the bills
-    serializer = BillsSerializer(principal_bills, many=True)
-    return Response({ "invoices" : serializer.data }, status=200)
+    principal_bills = Bill.objects.filter(user=principal)
+    # Serialize a page of the bills
+    return paginate(request, principal_bills, BillsSerializer, 'invoices', ordering=['-date_billed'])
 
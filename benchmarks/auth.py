@@ -0,0 +1,417 @@
+"""
+    authentication benchmark
+
+    seeds users across schools then drives concurrent sessions through the auth endpoints, in-process through the
+    full middleware and url stack:
+
+        login -> mfa login ( for users with mfa on ) -> authenticated GET -> authenticated GET with an expired
+        access token ( token_required refreshes it ) -> logout
+
+    and reports throughput, p50/p95/p99 latency and database queries per request for every step.
+    queries made by background workers ( session write-behind, email outbox ) are off the request path and aren't counted.
+
+    usage ( from the repository root ):
+
+        python -m benchmarks.auth --users 200 --schools 10 --sessions 1000 --concurrency 16 --output results.json
+        python -m benchmarks.auth --stack async ...
+        python -m benchmarks.auth --fast-hashing ...
+
+    see benchmarks/settings.py for pointing it at a local redis or postgres instead of fakeredis and sqlite.
+"""
+
+# python
+import argparse
+import asyncio
+import contextvars
+import json
+import os
+import platform
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+STEPS = ('login', 'mfa_login', 'authenticate', 'refresh', 'logout')
+
+PASSWORD = 'Benchmark-passw0rd'
+
+# the query counter of the request being measured, background threads don't inherit it
+_query_counter = contextvars.ContextVar('benchmark_query_counter', default=None)
+
+
+def _count_queries(execute, sql, params, many, context):
+    counter = _query_counter.get()
+    if counter is not None:
+        counter[0] += 1
+
+    return execute(sql, params, many, context)
+
+
+def _install_query_counter():
+    from django.db import connections
+    from django.db.backends.signals import connection_created
+
+    def _on_connection_created(sender, connection, **kwargs):
+        if _count_queries not in connection.execute_wrappers:
+            connection.execute_wrappers.append(_count_queries)
+
+    connection_created.connect(_on_connection_created, weak=False)
+
+    for connection in connections.all():
+        if _count_queries not in connection.execute_wrappers:
+            connection.execute_wrappers.append(_count_queries)
+
+
+def _percentile(samples, percentile):
+    if not samples:
+        return 0.0
+
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(percentile / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class Recorder:
+
+    """
+        collects latency, query count and status for every request
+    """
+
+    def __init__(self):
+        self.samples = {step: [] for step in STEPS}
+        self.queries = {step: [] for step in STEPS}
+        self.errors = {step: 0 for step in STEPS}
+        self.failed_sessions = 0
+        self._lock = threading.Lock()
+
+    def record(self, step, seconds, queries, status_code):
+        with self._lock:
+            self.samples[step].append(seconds)
+            self.queries[step].append(queries)
+
+            if status_code >= 400:
+                self.errors[step] += 1
+
+    def fail_session(self):
+        with self._lock:
+            self.failed_sessions += 1
+
+    def summary(self, elapsed, sessions):
+        steps = {}
+
+        for step in STEPS:
+            samples = self.samples[step]
+            if not samples:
+                continue
+
+            steps[step] = {
+                'requests': len(samples),
+                'errors': self.errors[step],
+                'throughput_rps': round(len(samples) / elapsed, 2),
+                'mean_ms': round(sum(samples) / len(samples) * 1000, 3),
+                'p50_ms': round(_percentile(samples, 50) * 1000, 3),
+                'p95_ms': round(_percentile(samples, 95) * 1000, 3),
+                'p99_ms': round(_percentile(samples, 99) * 1000, 3),
+                'max_ms': round(max(samples) * 1000, 3),
+                'queries_per_request': round(sum(self.queries[step]) / len(samples), 3),
+            }
+
+        requests = sum(len(samples) for samples in self.samples.values())
+
+        return {
+            'elapsed_s': round(elapsed, 3),
+            'sessions': sessions,
+            'failed_sessions': self.failed_sessions,
+            'sessions_per_second': round(sessions / elapsed, 2),
+            'requests': requests,
+            'requests_per_second': round(requests / elapsed, 2),
+            'steps': steps,
+        }
+
+
+######################################################### setup ##################################################################
+
+
+def setup(stack, fast_hashing):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+    os.environ['ASYNC_AUTH_VIEWS'] = 'True' if stack == 'async' else 'False'
+    os.environ['BENCHMARK_FAST_HASHING'] = 'True' if fast_hashing else 'False'
+
+    import django
+    django.setup()
+
+    from django.core.management import call_command
+    from django.db import connection
+
+    # start from an empty database every run
+    if connection.vendor == 'sqlite' and os.path.exists(connection.settings_dict['NAME']):
+        connection.close()
+        os.remove(connection.settings_dict['NAME'])
+
+    call_command('migrate', run_syncdb=True, verbosity=0)
+    _install_query_counter()
+
+
+def seed(users, schools, mfa_ratio):
+
+    """
+        creates the schools and activated ADMIN users, returns [( email, mfa ), ...]
+    """
+
+    from django.contrib.auth.hashers import make_password
+    from schools.models import School
+    from users.models import CustomUser
+    from seeran_backend.ids import generate_ids
+
+    School.objects.bulk_create([
+        School(name=f'benchmark school {number}', email=f'school{number}@benchmark.local', contact_number='0110000000', school_id=school_id)
+        for number, school_id in enumerate(generate_ids('SA', schools))
+    ])
+    school_list = list(School.objects.all())
+
+    # every user shares one password hash, hashing it per user would make seeding take minutes
+    password = make_password(PASSWORD)
+    mfa_every = round(1 / mfa_ratio) if mfa_ratio else 0
+
+    accounts = [
+        CustomUser(
+            email=f'user{number}@benchmark.local', name='bench', surname=f'user{number}', role='ADMIN',
+            school=school_list[number % schools], activated=True, password=password,
+            multifactor_authentication=bool(mfa_every) and number % mfa_every == 0,
+            account_id=account_id,
+        )
+        for number, account_id in enumerate(generate_ids('UA', users))
+    ]
+    CustomUser.objects.bulk_create(accounts, batch_size=500)
+
+    return [(account.email, account.multifactor_authentication) for account in accounts]
+
+
+def _find_otp(email, start, timeout=5.0):
+    from authentication.outbox import LocmemTransport
+
+    recipient = f'<{email}>'
+    deadline = time.monotonic() + timeout
+
+    while time.monotonic() < deadline:
+        for message in LocmemTransport.sent[start:]:
+            if message['to'].endswith(recipient):
+                return message['variables']['onetimecode']
+
+        time.sleep(0.005)
+
+    return None
+
+
+###################################################### sync stack ################################################################
+
+
+def _sync_session(account, recorder):
+    from django.db import connections
+    from django.test import Client
+    from authentication.outbox import LocmemTransport
+
+    email, mfa = account
+    client = Client()
+
+    def request(step, method, path, data=None):
+        counter = [0]
+        reset = _query_counter.set(counter)
+        started = time.perf_counter()
+
+        try:
+            if method == 'post':
+                response = client.post(path, data or {}, content_type='application/json')
+            else:
+                response = client.get(path)
+
+        finally:
+            elapsed = time.perf_counter() - started
+            _query_counter.reset(reset)
+
+        recorder.record(step, elapsed, counter[0], response.status_code)
+
+        # the test client doesn't drop cookies set on other domains, keep the jar in step with what a browser would send
+        for key, morsel in response.cookies.items():
+            if morsel.value:
+                client.cookies[key] = morsel.value
+            else:
+                client.cookies.pop(key, None)
+
+        return response
+
+    try:
+        sent = len(LocmemTransport.sent)
+        response = request('login', 'post', '/api/auth/login/', {'email': email, 'password': PASSWORD})
+
+        if mfa and response.status_code == 200:
+            otp = _find_otp(email, sent)
+            response = request('mfa_login', 'post', '/api/auth/mfa-login/', {'email': email, 'otp': otp})
+
+        if response.status_code != 200:
+            recorder.fail_session()
+            return
+
+        request('authenticate', 'get', '/api/auth/authenticate/')
+
+        # drop the access token so token_required has to mint a new one from the refresh token
+        client.cookies.pop('access_token', None)
+        request('refresh', 'get', '/api/auth/authenticate/')
+
+        request('logout', 'post', '/api/auth/log-out/')
+
+    finally:
+        connections.close_all()
+
+
+def run_sync(accounts, sessions, concurrency, recorder):
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        # each worker thread keeps to its own users, so a user never has two sessions in flight
+        futures = [
+            executor.submit(lambda worker: [_sync_session(accounts[number % len(accounts)], recorder) for number in range(worker, sessions, concurrency)], worker)
+            for worker in range(concurrency)
+        ]
+
+        for future in futures:
+            future.result()
+
+
+###################################################### async stack ###############################################################
+
+
+async def _async_session(account, recorder):
+    from django.test import AsyncClient
+    from authentication.outbox import LocmemTransport
+
+    email, mfa = account
+    client = AsyncClient()
+
+    async def request(step, method, path, data=None):
+        counter = [0]
+        reset = _query_counter.set(counter)
+        started = time.perf_counter()
+
+        try:
+            if method == 'post':
+                response = await client.post(path, data or {}, content_type='application/json')
+            else:
+                response = await client.get(path)
+
+        finally:
+            elapsed = time.perf_counter() - started
+            _query_counter.reset(reset)
+
+        recorder.record(step, elapsed, counter[0], response.status_code)
+
+        for key, morsel in response.cookies.items():
+            if morsel.value:
+                client.cookies[key] = morsel.value
+            else:
+                client.cookies.pop(key, None)
+
+        return response
+
+    sent = len(LocmemTransport.sent)
+    response = await request('login', 'post', '/api/auth/login/', {'email': email, 'password': PASSWORD})
+
+    if mfa and response.status_code == 200:
+        otp = await asyncio.to_thread(_find_otp, email, sent)
+        response = await request('mfa_login', 'post', '/api/auth/mfa-login/', {'email': email, 'otp': otp})
+
+    if response.status_code != 200:
+        recorder.fail_session()
+        return
+
+    await request('authenticate', 'get', '/api/auth/authenticate/')
+
+    client.cookies.pop('access_token', None)
+    await request('refresh', 'get', '/api/auth/authenticate/')
+
+    # logout only has a sync view, the async client runs it through the sync handler
+    await request('logout', 'post', '/api/auth/log-out/')
+
+
+def run_async(accounts, sessions, concurrency, recorder):
+
+    async def worker(number):
+        for session in range(number, sessions, concurrency):
+            await _async_session(accounts[session % len(accounts)], recorder)
+
+    async def main():
+        await asyncio.gather(*(worker(number) for number in range(concurrency)))
+
+    asyncio.run(main())
+
+
+########################################################### main #################################################################
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='benchmark the authentication endpoints')
+    parser.add_argument('--users', type=int, default=200, help='users to seed')
+    parser.add_argument('--schools', type=int, default=10, help='schools to spread the users across')
+    parser.add_argument('--sessions', type=int, default=1000, help='login to logout sessions to run')
+    parser.add_argument('--concurrency', type=int, default=16, help='sessions in flight at once')
+    parser.add_argument('--mfa-ratio', type=float, default=0.5, help='share of users with multi-factor authentication on')
+    parser.add_argument('--stack', choices=('sync', 'async'), default='sync', help='which authentication views to serve')
+    parser.add_argument('--fast-hashing', action='store_true', help='hash passwords with md5 to leave pbkdf2 out of the numbers')
+    parser.add_argument('--output', help='write the json result to this file')
+    options = parser.parse_args(argv)
+
+    if options.users < options.concurrency:
+        parser.error('--users must be at least --concurrency, a user can only have one session in flight')
+
+    setup(options.stack, options.fast_hashing)
+
+    from django.conf import settings
+    from django.db import connection
+    from auth_tokens.registry import write_behind
+    from authentication.outbox import outbox
+    from seeran_backend import metrics
+
+    accounts = seed(options.users, options.schools, options.mfa_ratio)
+    recorder = Recorder()
+
+    started = time.perf_counter()
+
+    if options.stack == 'async':
+        run_async(accounts, options.sessions, options.concurrency, recorder)
+    else:
+        run_sync(accounts, options.sessions, options.concurrency, recorder)
+
+    elapsed = time.perf_counter() - started
+
+    # let the background workers finish so their metrics are complete
+    outbox.join()
+    write_behind.join()
+
+    result = {
+        'benchmark': 'auth',
+        'config': {
+            'users': options.users,
+            'schools': options.schools,
+            'sessions': options.sessions,
+            'concurrency': options.concurrency,
+            'mfa_ratio': options.mfa_ratio,
+            'stack': options.stack,
+            'fast_hashing': options.fast_hashing,
+            'database': connection.vendor,
+            'redis': 'redis' if settings.BENCHMARK_REDIS_URL else 'fakeredis',
+            'python': platform.python_version(),
+        },
+        'results': recorder.summary(elapsed, options.sessions),
+        'process_metrics': metrics.snapshot(),
+    }
+
+    output = json.dumps(result, indent=2)
+
+    if options.output:
+        with open(options.output, 'w') as file:
+            file.write(output + '\n')
+
+    sys.stdout.write(output + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,197 @@
+"""
+    database pool benchmark
+
+    serves authenticated GET requests ( /api/auth/authenticate/ ) through djangos asgi handler, the way daphne does,
+    once with the pooled backend ( seeran_backend.db ) and once with the plain postgresql backend, which opens and
+    closes a connection for every request. reports throughput and p50/p95/p99 latency of both runs and the pools
+    wait time and saturation metrics.
+
+    each run is a separate process on a freshly flushed database, needs a postgres to connect to:
+
+        BENCHMARK_DATABASE=postgres python -m benchmarks.db_pool --users 50 --requests 2000 --concurrency 16
+        BENCHMARK_DATABASE=postgres DB_ENDPOINT=... DB_PASSWORD=... python -m benchmarks.db_pool --output results.json
+
+    the connection cost ( and so the difference ) grows with the round trip to the database, measure against a
+    database as far away as production is, with tls on ( PGSSLMODE=require ) when production uses it.
+"""
+
+# python
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+# benchmark helpers
+from benchmarks.auth import PASSWORD, _percentile, seed, setup
+
+
+MODES = ('pooled', 'direct')
+
+
+def _login(accounts):
+
+    """
+        logs every account in once, returns the cookie header of each session
+    """
+
+    from django.test import Client
+
+    headers = []
+
+    for email, _ in accounts:
+        client = Client()
+        response = client.post('/api/auth/login/', {'email': email, 'password': PASSWORD}, content_type='application/json')
+
+        if response.status_code != 200:
+            raise RuntimeError(f'benchmark login failed with {response.status_code}')
+
+        headers.append('; '.join(f'{key}={morsel.value}' for key, morsel in response.cookies.items() if morsel.value).encode())
+
+    return headers
+
+
+async def _get(application, path, cookie):
+
+    """
+        one request through the asgi application, returns the status code
+    """
+
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'https',
+        'path': path, 'raw_path': path.encode(), 'query_string': b'', 'root_path': '',
+        'headers': [(b'host', b'localhost'), (b'cookie', cookie)],
+        'client': ('127.0.0.1', 50000), 'server': ('localhost', 443),
+    }
+
+    body = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+    finished = asyncio.Event()
+    status = []
+
+    async def receive():
+        if body:
+            return body.pop()
+
+        # the client stays connected until the response is sent
+        await finished.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            status.append(message['status'])
+
+        elif message['type'] == 'http.response.body' and not message.get('more_body'):
+            finished.set()
+
+    await application(scope, receive, send)
+    return status[0] if status else 500
+
+
+def run(mode, users, requests, concurrency):
+    os.environ['BENCHMARK_DB_POOL'] = 'True' if mode == 'pooled' else 'False'
+    setup('sync', fast_hashing=True)
+
+    from django.core.handlers.asgi import ASGIHandler
+    from django.core.management import call_command
+    from django.db import connection, connections
+    from seeran_backend import metrics
+
+    # postgres isn't thrown away between runs like the sqlite file is
+    if connection.vendor == 'postgresql':
+        call_command('flush', interactive=False, verbosity=0)
+
+    accounts = seed(users, max(1, users // 10), 0)
+    cookies = _login(accounts)
+    connections.close_all()
+
+    application = ASGIHandler()
+    samples, errors = [], [0]
+
+    async def worker(number):
+        for request in range(number, requests, concurrency):
+            started = time.perf_counter()
+            status = await _get(application, '/api/auth/authenticate/', cookies[request % len(cookies)])
+            samples.append(time.perf_counter() - started)
+
+            if status >= 400:
+                errors[0] += 1
+
+    async def main():
+        await asyncio.gather(*(worker(number) for number in range(concurrency)))
+
+    started = time.perf_counter()
+    asyncio.run(main())
+    elapsed = time.perf_counter() - started
+
+    pool_metrics = metrics.snapshot()
+
+    return {
+        'engine': connection.settings_dict['ENGINE'],
+        'database': connection.vendor,
+        'requests': len(samples),
+        'errors': errors[0],
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': round(len(samples) / elapsed, 2),
+        'mean_ms': round(sum(samples) / len(samples) * 1000, 3),
+        'p50_ms': round(_percentile(samples, 50) * 1000, 3),
+        'p95_ms': round(_percentile(samples, 95) * 1000, 3),
+        'p99_ms': round(_percentile(samples, 99) * 1000, 3),
+        'max_ms': round(max(samples) * 1000, 3),
+        'pool': {
+            kind: {name: value for name, value in values.items() if name.startswith('db.pool.')}
+            for kind, values in pool_metrics.items()
+        },
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='compare request latency with and without the database pool')
+    parser.add_argument('--users', type=int, default=50, help='users to seed and log in')
+    parser.add_argument('--requests', type=int, default=2000, help='requests to send in each run')
+    parser.add_argument('--concurrency', type=int, default=16, help='requests in flight at once')
+    parser.add_argument('--mode', choices=MODES, help='run only this mode in this process ( used by the comparison )')
+    parser.add_argument('--output', help='write the json result to this file')
+    options = parser.parse_args(argv)
+
+    if options.mode:
+        sys.stdout.write(json.dumps(run(options.mode, options.users, options.requests, options.concurrency)) + '\n')
+        return
+
+    if os.environ.get('BENCHMARK_DATABASE', 'sqlite') != 'postgres':
+        parser.error('the pool is postgres only, run with BENCHMARK_DATABASE=postgres')
+
+    results = {}
+
+    for mode in MODES:
+        completed = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.db_pool', '--mode', mode, '--users', str(options.users), '--requests', str(options.requests), '--concurrency', str(options.concurrency)],
+            capture_output=True, text=True, check=True,
+        )
+        results[mode] = json.loads(completed.stdout.strip().splitlines()[-1])
+
+    result = {
+        'benchmark': 'db_pool',
+        'config': {
+            'users': options.users,
+            'requests': options.requests,
+            'concurrency': options.concurrency,
+            'python': platform.python_version(),
+        },
+        'results': results,
+        'p50_speedup': round(results['direct']['p50_ms'] / results['pooled']['p50_ms'], 2) if results['pooled']['p50_ms'] else None,
+    }
+
+    output = json.dumps(result, indent=2)
+
+    if options.output:
+        with open(options.output, 'w') as file:
+            file.write(output + '\n')
+
+    sys.stdout.write(output + '\n')
+
+
+if __name__ == '__main__':
+    main()
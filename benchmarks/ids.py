@@ -0,0 +1,112 @@
+"""
+    public id benchmark
+
+    inserts schools three ways and reports database queries and time per insert:
+
+        lookup  - the scheme the models used before seeran_backend.ids, a random id checked with .exists() before save()
+        save    - save() with the id from seeran_backend.ids
+        bulk    - bulk_create with ids pre-allocated by seeran_backend.ids.generate_ids
+
+    usage ( from the repository root ):
+
+        python -m benchmarks.ids --rows 2000 --batch-size 500 --output results.json
+"""
+
+# python
+import argparse
+import json
+import platform
+import sys
+import time
+import uuid
+
+# benchmark helpers
+from benchmarks.auth import _query_counter, setup
+
+
+def _legacy_id(model, field, prefix):
+    while True:
+        candidate = f'{prefix}{uuid.uuid4().hex[:13]}'
+        if not model.objects.filter(**{field: candidate}).exists():
+            return candidate
+
+
+def _measure(name, rows, insert):
+    counter = [0]
+    reset = _query_counter.set(counter)
+    started = time.perf_counter()
+
+    try:
+        insert()
+
+    finally:
+        elapsed = time.perf_counter() - started
+        _query_counter.reset(reset)
+
+    return {
+        'strategy': name,
+        'rows': rows,
+        'queries': counter[0],
+        'queries_per_insert': round(counter[0] / rows, 3),
+        'ms_per_insert': round(elapsed / rows * 1000, 4),
+        'inserts_per_second': round(rows / elapsed, 2),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='benchmark public id generation on insert')
+    parser.add_argument('--rows', type=int, default=2000, help='schools to insert per strategy')
+    parser.add_argument('--batch-size', type=int, default=500, help='bulk_create batch size')
+    parser.add_argument('--output', help='write the json result to this file')
+    options = parser.parse_args(argv)
+
+    setup('sync', fast_hashing=True)
+
+    from django.db import connection
+    from schools.models import School
+    from seeran_backend.ids import generate_ids
+
+    def school(number, school_id=''):
+        return School(name=f'school {number}', email=f'school{number}@benchmark.local', contact_number='0110000000', school_id=school_id)
+
+    def lookup():
+        for number in range(options.rows):
+            instance = school(f'lookup {number}', _legacy_id(School, 'school_id', 'SA'))
+            instance.save()
+
+    def save():
+        for number in range(options.rows):
+            school(f'save {number}').save()
+
+    def bulk():
+        ids = generate_ids('SA', options.rows)
+        School.objects.bulk_create([school(f'bulk {number}', school_id) for number, school_id in enumerate(ids)], batch_size=options.batch_size)
+
+    results = [
+        _measure('lookup', options.rows, lookup),
+        _measure('save', options.rows, save),
+        _measure('bulk', options.rows, bulk),
+    ]
+
+    result = {
+        'benchmark': 'ids',
+        'config': {
+            'rows': options.rows,
+            'batch_size': options.batch_size,
+            'database': connection.vendor,
+            'python': platform.python_version(),
+        },
+        'results': results,
+    }
+
+    output = json.dumps(result, indent=2)
+
+    if options.output:
+        with open(options.output, 'w') as file:
+            file.write(output + '\n')
+
+    sys.stdout.write(output + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,297 @@
+# python
+import os
+import tempfile
+from datetime import timedelta
+from pathlib import Path
+from decouple import config
+
+
+"""
+    benchmark settings
+
+    a standalone settings module for running the benchmarks offline, no google storage, mailgun or managed
+    redis/postgres needed:
+        - the database is a throwaway sqlite file, or a local postgres when BENCHMARK_DATABASE=postgres ( DB_* as usual )
+        - redis is fakeredis, or a local redis when BENCHMARK_REDIS_URL is set
+        - emails are delivered to the in-memory LocmemTransport instead of mailgun
+
+    everything else mirrors seeran_backend.settings, keep the two in step when adding settings the auth path reads.
+"""
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+SECRET_KEY = 'benchmark-secret-key-not-for-production'
+DEBUG = False
+ALLOWED_HOSTS = ['*']
+
+MEDIA_URL = '/media/'
+# uploads ( profile pictures ) go to a local folder instead of the storage bucket
+MEDIA_ROOT = os.path.join(tempfile.gettempdir(), 'seeran_benchmark_media')
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+STATIC_URL = '/static/'
+
+INSTALLED_APPS = [
+
+    # django apps
+    'django.contrib.admin',
+    'django.contrib.auth',
+    'django.contrib.contenttypes',
+    'django.contrib.sessions',
+    'django.contrib.messages',
+
+    # project apps
+    'authentication',
+    'schools',
+    'users',
+    'balances',
+    'bug_reports',
+    'email_bans',
+    'activities',
+    'assessments',
+    'chats',
+    'classes',
+    'grades',
+    'timetables',
+    'auth_tokens',
+    'uploads',
+
+    # third party apps
+    'django_redis',
+    'channels',
+]
+
+MIDDLEWARE = [
+    'django.middleware.security.SecurityMiddleware',
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'django.middleware.csrf.CsrfViewMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'seeran_backend.routers.replica_routing_middleware',
+    'django.contrib.messages.middleware.MessageMiddleware',
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+]
+
+TEMPLATES = [
+    {
+        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'DIRS': [],
+        'APP_DIRS': True,
+        'OPTIONS': {
+            'context_processors': [
+                'django.template.context_processors.request',
+                'django.contrib.auth.context_processors.auth',
+                'django.contrib.messages.context_processors.messages',
+            ],
+        },
+    },
+]
+
+ROOT_URLCONF = 'seeran_backend.urls'
+ASGI_APPLICATION = 'seeran_backend.asgi.application'
+
+AUTH_USER_MODEL = 'users.CustomUser'
+AUTHENTICATION_BACKENDS = [
+    'authentication.auth_backends.EmailOrIdNumberModelBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+
+REST_FRAMEWORK = {
+    'DEFAULT_AUTHENTICATION_CLASSES': (
+        'rest_framework_simplejwt.authentication.JWTAuthentication',
+    ),
+    'DEFAULT_RENDERER_CLASSES': [
+        'rest_framework.renderers.JSONRenderer',
+    ]
+}
+
+JWT_AUTH_COOKIE = 'access_token'
+SIMPLE_JWT = {
+    'ACCESS_TOKEN_LIFETIME': timedelta(minutes=5),
+    'REFRESH_TOKEN_LIFETIME': timedelta(hours=24),
+    'ROTATE_REFRESH_TOKENS': False,
+}
+
+# the project apps have no committed migrations, migrate --run-syncdb builds their tables straight from the models
+PROJECT_APPS = ['authentication', 'schools', 'users', 'balances', 'bug_reports', 'email_bans', 'activities', 'assessments', 'chats', 'classes', 'grades', 'timetables', 'auth_tokens', 'uploads']
+MIGRATION_MODULES = {app: None for app in PROJECT_APPS}
+
+
+# database
+if config('BENCHMARK_DATABASE', default='sqlite') == 'postgres':
+    DATABASES = {
+        'default': {
+            # BENCHMARK_DB_POOL=False connects per request with the plain postgresql backend ( benchmarks/db_pool.py compares the two )
+            'ENGINE': 'seeran_backend.db' if config('BENCHMARK_DB_POOL', default=True, cast=bool) else 'django.db.backends.postgresql',
+            'NAME': config('DB_NAME', default='seeran_benchmark'),
+            'USER': config('DB_USER', default='postgres'),
+            'PASSWORD': config('DB_PASSWORD', default=''),
+            'HOST': config('DB_ENDPOINT', default='localhost'),
+            'PORT': '5432',
+            'CONN_MAX_AGE': 0,
+            'POOL': {
+                'MAX_SIZE': config('DB_POOL_MAX_SIZE', default=10, cast=int),
+                'TIMEOUT': 10,
+                'MAX_LIFETIME': 1800,
+                'CHECK_AFTER': 30,
+            },
+        }
+    }
+
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': config('BENCHMARK_SQLITE_PATH', default=os.path.join(tempfile.gettempdir(), 'seeran_benchmark.sqlite3')),
+            # the benchmark writes from many threads at once, wait for the lock instead of failing
+            'OPTIONS': {'timeout': 30},
+        }
+    }
+
+# a second alias over the same database, only the replica routing tests ( seeran_backend/tests.py ) route reads to it
+DATABASES['replica'] = dict(DATABASES['default'], TEST={'MIRROR': 'default'})
+
+
+# redis
+BENCHMARK_REDIS_URL = config('BENCHMARK_REDIS_URL', default='')
+
+if BENCHMARK_REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': BENCHMARK_REDIS_URL,
+            'OPTIONS': {
+                'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+            }
+        }
+    }
+
+else:
+    # fakeredis ( with lua support ) is only needed for benchmarking, pip install "fakeredis[lua]"
+    import fakeredis
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': 'redis://fakeredis:6379/0',
+            'OPTIONS': {
+                'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+                'CONNECTION_POOL_KWARGS': {'connection_class': fakeredis.FakeConnection, 'server': fakeredis.FakeServer()},
+            }
+        }
+    }
+
+
+# BENCHMARK_FAST_HASHING swaps pbkdf2 for md5 so the numbers show everything but the password hashing cost
+if config('BENCHMARK_FAST_HASHING', default=False, cast=bool):
+    PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+
+# principal snapshot config
+PRINCIPAL_SNAPSHOT_TIMEOUT = 600
+PRINCIPAL_LOCAL_TIMEOUT = 5
+PRINCIPAL_LOCAL_MAX_SIZE = 2048
+
+
+# school status config
+SCHOOL_STATUS_TIMEOUT = 3600
+SCHOOL_STATUS_LOCAL_TIMEOUT = 5
+SCHOOL_STATUS_LOCAL_MAX_SIZE = 1024
+
+
+# email outbox config
+# mailgun is swapped for the in-memory transport, the benchmark reads otps from it
+EMAIL_OUTBOX_TRANSPORT = 'authentication.outbox.LocmemTransport'
+EMAIL_OUTBOX_FILE_PATH = os.path.join(tempfile.gettempdir(), 'seeran_benchmark_outbox.jsonl')
+EMAIL_OUTBOX_WORKERS = 4
+EMAIL_OUTBOX_MAX_QUEUE_SIZE = 10000
+EMAIL_OUTBOX_MAX_RETRIES = 4
+EMAIL_OUTBOX_BACKOFF = 1.0
+EMAIL_OUTBOX_MAX_BACKOFF = 30.0
+EMAIL_OUTBOX_CONNECT_TIMEOUT = 3.05
+EMAIL_OUTBOX_READ_TIMEOUT = 10.0
+
+
+# session registry config
+SESSION_REGISTRY_MAX_DEVICES = 3
+SESSION_REGISTRY_BATCH_SIZE = 100
+SESSION_REGISTRY_MAX_QUEUE_SIZE = 10000
+
+
+# access token refresh config
+# concurrent requests refreshing the same expired access token share the first one minted for this many seconds
+ACCESS_TOKEN_COALESCE_TIMEOUT = 10
+
+
+# async authentication config
+ASYNC_AUTH_VIEWS = config('ASYNC_AUTH_VIEWS', default=False, cast=bool)
+PASSWORD_HASHING_WORKERS = config('PASSWORD_HASHING_WORKERS', default=2, cast=int)
+
+
+# rate limiting config
+# every benchmark session logs in from the same address, the limits are raised out of the way but still checked
+THROTTLE_ENABLED = True
+TRUSTED_PROXY_COUNT = 1
+THROTTLE_RATES = {
+    'login': {'email': (1000000, 900), 'ip': (1000000, 900)},
+    'otp': {'email': (1000000, 3600), 'ip': (1000000, 3600), 'account': (1000000, 3600)},
+}
+
+
+# user import config
+USER_IMPORT_CHUNK_SIZE = 500
+
+
+# billing config
+BILLING_RATE_PER_STUDENT = 20
+
+
+# compliance config
+COMPLIANCE_GRACE_DAYS = 7
+
+
+# pagination config
+PAGINATION_PAGE_SIZE = 50
+PAGINATION_MAX_PAGE_SIZE = 200
+
+
+# visibility index config
+VISIBILITY_INDEX_TIMEOUT = 3600
+
+
+# profile picture config
+PROFILE_PICTURE_MAX_SIZE = 10 * 1024 * 1024
+PROFILE_PICTURE_MAX_PIXELS = 40_000_000
+PROFILE_PICTURE_WORKERS = 2
+PROFILE_PICTURE_TIMEOUT = 30
+
+
+# user search config
+USER_SEARCH_LIMIT = 20
+USER_SEARCH_MAX_LIMIT = 50
+
+
+# user deletion config
+DELETION_BATCH_SIZE = 500
+DELETION_BATCH_PAUSE = 0.05
+DELETION_LEASE = 300
+DELETION_MAX_ATTEMPTS = 5
+
+
+# read replica config
+# no replicas, every read goes to the benchmark database
+REPLICA_DATABASES = []
+DATABASE_ROUTERS = ['seeran_backend.routers.ReplicaRouter']
+READ_YOUR_WRITES_WINDOW = 5
+REPLICA_MAX_LAG = 5
+REPLICA_LAG_CHECK_INTERVAL = 5
+
+
+LANGUAGE_CODE = 'en-us'
+TIME_ZONE = 'UTC'
+USE_I18N = True
+USE_TZ = True
+
+DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
@@ -1,9 +1,8 @@
-# python 
-import uuid
-
 # django
 from django.db import models
-from django.db import IntegrityError
+
+# public ids
+from seeran_backend.ids import generate_id
 
 # models
 from users.models import CustomUser
@@ -34,34 +33,18 @@ class BugReport(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # reports by status newest first ( resolved reports )
+            models.Index(fields=['status', 'created_at'], name='bugreport_status_created_idx'),
+        ]
+
     def __str__(self):
         return f'Bug Report {self.id} by {self.user.username}'
 
     # overwrite save method 
     def save(self, *args, **kwargs):
         if not self.bugreport_id:
-            self.bugreport_id = self.generate_unique_account_id('BR')
-
-        attempts = 0
-        while attempts < 5:
-            try:
-                super().save(*args, **kwargs)
-                break
-            except IntegrityError:
-                # If an IntegrityError is raised, it means the bugreport_id was not unique.
-                # Generate a new bugreport_id and try again.
-                self.bugreport_id = self.generate_unique_account_id('BR')
-                attempts += 1
-        if attempts >= 5:
-            raise ValueError('Could not create bug report with unique report ID after 5 attempts. Please try again later.')
-
-
-    @staticmethod
-    def generate_unique_account_id(prefix=''):
-        while True:
-            unique_part = uuid.uuid4().hex
-            account_id = prefix + unique_part
-            account_id = account_id[:15].ljust(15, '0')
+            self.bugreport_id = generate_id('BR')
 
-            if not BugReport.objects.filter(bugreport_id=account_id).exists():
-                return account_id
\ No newline at end of file
+        super().save(*args, **kwargs)
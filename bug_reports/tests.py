@@ -1,3 +1,14 @@
+# django
 from django.test import TestCase
 
-# Create your tests here.
+# models
+from bug_reports.models import BugReport
+
+# query plans
+from seeran_backend.db.plans import QueryPlanMixin
+
+
+class BugReportQueryPlanTests(QueryPlanMixin, TestCase):
+
+    def test_resolved_bug_reports_use_an_index(self):
+        self.assertUsesIndex(BugReport.objects.filter(status='RESOLVED').order_by('-created_at'), 'bugreport_status_created_idx')
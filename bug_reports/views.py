@@ -19,6 +19,9 @@ from .models import BugReport
 # serializers
 from .serializers import CreateBugReportSerializer, BugReportsSerializer, BugReportSerializer, UpdateBugReportStatusSerializer
 
+# pagination
+from seeran_backend.pagination import paginate
+
 
 # create bug report
 @api_view(['POST'])
@@ -57,10 +60,9 @@ def bug_report(request, bug_report_id):
 @token_required
 @founder_only
 def unresolved_bug_reports(request):
-    reports = BugReport.objects.exclude(status="RESOLVED").order_by('-created_at')
-    serializer = BugReportsSerializer(reports, many=True)
-    
-    return Response({ "reports" : serializer.data },status=200)
+    reports = BugReport.objects.exclude(status="RESOLVED")
+
+    return paginate(request, reports, BugReportsSerializer, 'reports', ordering=['-created_at'])
 
 
 # get resolved bug reports
@@ -69,10 +71,9 @@ def unresolved_bug_reports(request):
 @founder_only
 def resolved_bug_reports(request):
  
-    reports = BugReport.objects.filter(status="RESOLVED").order_by('-created_at')   
-    serializer = BugReportsSerializer(reports, many=True)
-    
-    return Response({ "reports" : serializer.data },status=200)
+    reports = BugReport.objects.filter(status="RESOLVED")
+
+    return paginate(request, reports, BugReportsSerializer, 'reports', ordering=['-created_at'])
 
 
 # change bug report status
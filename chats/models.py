@@ -1,10 +1,9 @@
-# python 
-import uuid
-
 # django 
 from django.db import models
 from django.utils.translation import gettext_lazy as _
-from django.db import IntegrityError
+
+# public ids
+from seeran_backend.ids import generate_id
 
 # models
 from users.models import CustomUser
@@ -27,29 +26,10 @@ class Chat(models.Model):
     # class account id creation handler
     def save(self, *args, **kwargs):
         if not self.chat_id:
-            self.chat_id = self.generate_unique_account_id('CH')
-
-        attempts = 0
-        while attempts < 5:
-            try:
-                super().save(*args, **kwargs)
-                break
-            except IntegrityError:
-                self.chat_id = self.generate_unique_account_id('CH') # Chat
-                attempts += 1
-        if attempts >= 5:
-            raise ValueError('Could not create class with unique account ID after 5 attempts. Please try again later.')
-
-    @staticmethod
-    def generate_unique_account_id(prefix=''):
-        while True:
-            unique_part = uuid.uuid4().hex
-            account_id = prefix + unique_part
-            account_id = account_id[:15].ljust(15, '0')
-
-            if not Chat.objects.filter(chat_id=account_id).exists():
-                return account_id
-            
+            self.chat_id = generate_id('CH')
+
+        super().save(*args, **kwargs)
+
 
 class Message(models.Model):
     
@@ -1,10 +1,9 @@
-# python 
-import uuid
-
 # django 
 from django.db import models
 from django.utils.translation import gettext_lazy as _
-from django.db import IntegrityError
+
+# public ids
+from seeran_backend.ids import generate_id
 
 # models
 from users.models import CustomUser
@@ -42,19 +41,6 @@ class Classroom(models.Model):
     # class account id creation handler
     def save(self, *args, **kwargs):
         if not self.class_id:
-            self.class_id = self.generate_unique_id('CR')
+            self.class_id = generate_id('CR')
 
         super(Classroom, self).save(*args, **kwargs)
-
-    @staticmethod
-    def generate_unique_id(prefix=''):
-        max_attempts = 10
-     
-        for _ in range(max_attempts):
-            unique_part = uuid.uuid4().hex[:13]  # Take only the first 13 characters
-            id = f"{prefix}{unique_part}"
-            if not Classroom.objects.filter(class_id=id).exists():
-                return id
-      
-        raise ValueError('failed to generate a unique classroom ID after 10 attempts, please try again later.')
-
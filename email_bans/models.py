@@ -1,10 +1,9 @@
-# python
-import uuid
-
 # django imports
 from django.db import models
 from django.utils.translation import gettext_lazy as _
-from django.db import IntegrityError
+
+# public ids
+from seeran_backend.ids import generate_id
 
 
 class EmailBan(models.Model):
@@ -19,19 +18,15 @@ class EmailBan(models.Model):
     banned_at = models.DateTimeField(_('the date the email was banned'), auto_now_add=True)
 
     ban_id = models.CharField(_('email ban id'), max_length=15, unique=True)
+
+    class Meta:
+        indexes = [
+            # an emails bans newest first
+            models.Index(fields=['email', 'banned_at'], name='emailban_email_banned_at_idx'),
+        ]
     
     def save(self, *args, **kwargs):
         if not self.ban_id:
-            self.ban_id = self.generate_unique_id('EB')
+            self.ban_id = generate_id('EB')
 
         super(EmailBan, self).save(*args, **kwargs)
-
-    @staticmethod
-    def generate_unique_id(prefix=''):
-        max_attempts = 50
-        for _ in range(max_attempts):
-            unique_part = uuid.uuid4().hex[:13]  # Take only the first 13 characters
-            id = f"{prefix}{unique_part}"
-            if not EmailBan.objects.filter(ban_id=id).exists():
-                return id
-        raise ValueError('failed to generate a unique email ban ID after 10 attempts, please try again later.')            
\ No newline at end of file
@@ -1,3 +1,75 @@
+# python
+from unittest import mock
+
+# django
+from django.core.cache import cache
 from django.test import TestCase
 
-# Create your tests here.
+# in-process caches
+from seeran_backend.caching import clear_local_caches
+
+# models
+from users.models import CustomUser
+from email_bans.models import EmailBan
+
+# utility functions
+from authentication.utils import generate_token
+
+# query plans
+from seeran_backend.db.plans import QueryPlanMixin
+
+
+class RevalidateEmailTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        clear_local_caches()
+
+        self.user = CustomUser.objects.create(email='banned@example.com', name='ann', surname='admin', role='FOUNDER', email_banned=True)
+        self.ban = EmailBan.objects.create(email=self.user.email, reason='bounced')
+
+        self.client.cookies['refresh_token'] = generate_token(self.user)['refresh_token']
+
+    def send_otp(self):
+        # the emailed otp, then the authorization otp
+        with mock.patch('authentication.otp_store.generate_code', side_effect=['111111', '222222']):
+            response = self.client.post(f'/api/ebap/send-otp/{self.ban.ban_id}/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.cookies['authorization_otp'].value, '222222')
+
+    def revalidate(self, otp):
+        return self.client.post(f'/api/ebap/revalidate-email/{self.ban.ban_id}/', {'otp': otp}, content_type='application/json')
+
+    def test_revalidates_with_the_emailed_otp(self):
+        self.send_otp()
+
+        response = self.revalidate('111111')
+        self.assertEqual(response.status_code, 200)
+
+        self.ban.refresh_from_db()
+        self.user.refresh_from_db()
+        self.assertEqual(self.ban.status, 'APPEALED')
+        self.assertFalse(self.user.email_banned)
+
+        # the challenge is consumed
+        self.client.cookies['authorization_otp'] = '222222'
+        self.assertEqual(self.revalidate('111111').json()['error'], 'OTP expired')
+
+    def test_wrong_guesses_lock_the_challenge(self):
+        self.send_otp()
+
+        for remaining in (2, 1, 0):
+            self.assertEqual(self.revalidate('000000').json()['error'], f'incorrect OTP.. {remaining} remaining')
+
+        self.assertEqual(self.revalidate('000000').json()['error'], 'maximum OTP verification attempts exceeded..')
+        self.assertEqual(self.revalidate('111111').json()['error'], 'OTP expired')
+
+        self.ban.refresh_from_db()
+        self.assertEqual(self.ban.status, 'PENDING')
+
+
+class EmailBanQueryPlanTests(QueryPlanMixin, TestCase):
+
+    def test_email_bans_use_an_index(self):
+        self.assertUsesIndex(EmailBan.objects.filter(email='admin@example.com').order_by('-banned_at'), 'emailban_email_banned_at_idx')
@@ -4,7 +4,6 @@ import random
 # django
 from django.views.decorators.cache import cache_control
 from django.core.exceptions import ObjectDoesNotExist
-from django.core.cache import cache
 
 # rest framework
 from rest_framework.decorators import api_view
@@ -17,21 +16,25 @@ from users.models import CustomUser
 
 # custom decorators
 from authentication.decorators import token_required
+from authentication.throttling import throttle
 
 # serializers
 from .serializers import EmailBansSerializer, EmailBanSerializer
 
-# utility finctions 
-from authentication.utils import generate_otp, verify_user_otp
+# pagination
+from seeran_backend.pagination import paginate
+
+# otp challenges
+from authentication import otp_store
+from authentication.outbox import send_otp_email
 
 
 @api_view(['GET'])
 @token_required
 def email_bans(request):
-    email_bans = EmailBan.objects.filter(email=request.user.email).order_by('-banned_at')
-    serializer = EmailBansSerializer(email_bans, many=True)
-    
-    return Response({ "email_bans" : serializer.data, 'strikes' : request.user.email_ban_amount, 'banned' : request.user.email_banned }, status=status.HTTP_200_OK)
+    email_bans = EmailBan.objects.filter(email=request.user.email)
+
+    return paginate(request, email_bans, EmailBansSerializer, 'email_bans', ordering=['-banned_at'], strikes=request.user.email_ban_amount, banned=request.user.email_banned)
 
 
 @api_view(['GET'])
@@ -48,6 +51,7 @@ def email_ban(request, email_ban_id, invalidator):
 
 @api_view(['POST'])
 @token_required
+@throttle('otp')
 def send_otp(request, email_ban_id):
     try:
         email_ban = EmailBan.objects.get(ban_id=email_ban_id)
@@ -64,36 +68,27 @@ def send_otp(request, email_ban_id):
         if email_ban.otp_send >= 3 :
             return Response({ "error" : "reached maximum amount of OTP sends" }, status=status.HTTP_400_BAD_REQUEST)
         
+        # the otp is emailed to the banned address, the authorization otp goes in the cookies, both are stored as one challenge
+        otp = otp_store.generate_code()
+        authorization_otp = otp_store.generate_code()
+
+        otp_store.issue(email_ban.email, otp=otp, authorization=authorization_otp)
+
+        # queue the OTP email, the outbox delivers it in the background
+        if not send_otp_email(request.user, otp, "This OTP was generated in response to your request to revalidate your email address.."):
+            return Response({"error": "failed to send OTP via email"}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
         email_ban.otp_send += 1
         email_ban.status = 'PENDING'
         email_ban.save()
-            
-        # otp, hashed_otp, salt = generate_otp()
-        
-        # Send the OTP via email
-        try:
-                
-            # generate authorization cookies needed to revalidate email
-            # authorization_otp, hashed_authorization_otp, authorization_otp_salt = generate_otp()
-            
-            # save both otps
-            # cache.set(email_ban.email+'authorization_otp', (hashed_authorization_otp, authorization_otp_salt), timeout=300)  # 300 seconds = 5 mins
-            # cache.set(email_ban.email + 'email_revalidation_otp', (hashed_otp, salt), timeout=300)  # 300 seconds = 5 mins
-            
-            # Generate a random 6-digit number
-            # this will invalidate the cache on the frontend
-            response = Response({"message": "OTP created and sent to your email", 'otp_send' : email_ban.otp_send, 'status' : email_ban.status.title()}, status=status.HTTP_200_OK)
-            
-            # store authorization otp in cookies
-            # response.set_cookie('authorization_otp', authorization_otp, domain='.seeran-grades.com', samesite='None', secure=True, httponly=True, max_age=300)  # 300 seconds = 5 mins
-
-            return response
-            
-            # else:
-            #     return Response({"error": "failed to send OTP via email"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-        
-        except Exception as e:
-            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        # this will invalidate the cache on the frontend
+        response = Response({"message": "OTP created and sent to your email", 'otp_send' : email_ban.otp_send, 'status' : email_ban.status.title()}, status=status.HTTP_200_OK)
+
+        # store authorization otp in cookies
+        response.set_cookie('authorization_otp', authorization_otp, domain='.seeran-grades.com', samesite='None', secure=True, httponly=True, max_age=300)  # 300 seconds = 5 mins
+
+        return response
   
     except ObjectDoesNotExist:
         return Response({ "error" : "invalid email ban id" }, status=status.HTTP_400_BAD_REQUEST)
@@ -109,43 +104,46 @@ def revalidate_email(request, email_ban_id):
     if not otp or not authorization_otp:
         return Response({"error": "OTP missing."}, status=status.HTTP_400_BAD_REQUEST)
     
-    # try to get revalidation otp from cache
+    # verify both otps against the challenge, counting the attempt and consuming the challenge in one call
     try:
-        hashed_otp = cache.get(request.user.email + 'email_revalidation_otp')
-        if not hashed_otp:
-            return Response({"error": "OTP expired"}, status=status.HTTP_400_BAD_REQUEST)
-    
+        result, attempts = otp_store.verify(request.user.email, otp=otp, authorization=authorization_otp)
+
     except Exception as e:
         return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-    
-    # try to get authorization otp from cache and verify provided otp
+
+    if result == otp_store.EXPIRED:
+        return Response({"error": "OTP expired"}, status=status.HTTP_400_BAD_REQUEST)
+
+    if result == otp_store.UNAUTHORIZED:
+        # the challenge is discarded
+        response = Response({"error": "incorrect authorization OTP, action forrbiden"}, status=status.HTTP_400_BAD_REQUEST)
+
+        response.delete_cookie('authorization_otp', domain='.seeran-grades.com')
+        return response
+
+    if result == otp_store.LOCKED:
+        return Response({"error": "maximum OTP verification attempts exceeded.."}, status=status.HTTP_400_BAD_REQUEST)
+
+    if result == otp_store.INCORRECT:
+        return Response({"error": f"incorrect OTP.. {attempts} remaining"}, status=status.HTTP_400_BAD_REQUEST)
+
     try:
-        hashed_authorization_otp = cache.get(request.user.email + 'authorization_otp')
-        if not hashed_authorization_otp:
-            return Response({"error": "OTP expired"}, status=status.HTTP_400_BAD_REQUEST)
-    
-    except Exception as e:
-        return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        user = CustomUser.objects.get(pk=request.user.pk)
+        ban = EmailBan.objects.get(ban_id=email_ban_id, email=user.email)
 
-    # check if both otps are valid
-    if verify_user_otp(user_otp=otp, stored_hashed_otp_and_salt=hashed_otp) and verify_user_otp(user_otp=authorization_otp, stored_hashed_otp_and_salt=hashed_authorization_otp):
-        try:
-            user = CustomUser.objects.get(user_id=request.user.user_id)
-            ban = EmailBan.objects.get(ban_id=email_ban_id)
-        
-        except ObjectDoesNotExist:
-            return Response({"error": "provided information is invalid"})
-        
-        ban.status = 'APPEALED'
-        user.email_banned = False
-        user.save()
-        ban.save()
-        
-        # Generate a random 6-digit number
-        # this will invalidate the cache on the frontend
-        profile_section = random.randint(100000, 999999)
+    except ObjectDoesNotExist:
+        return Response({"error": "provided information is invalid"}, status=status.HTTP_400_BAD_REQUEST)
+
+    ban.status = 'APPEALED'
+    user.email_banned = False
+    user.save()
+    ban.save()
+
+    # Generate a random 6-digit number
+    # this will invalidate the cache on the frontend
+    profile_section = random.randint(100000, 999999)
 
-        return Response({"message": "email successfully revalidated", 'profile_section' : profile_section, 'status' : ban.status.title()}, status=status.HTTP_200_OK)
+    response = Response({"message": "email successfully revalidated", 'profile_section' : profile_section, 'status' : ban.status.title()}, status=status.HTTP_200_OK)
+    response.delete_cookie('authorization_otp', domain='.seeran-grades.com')
 
-    else:
-        return Response({"error": "incorrect OTP"}, status=status.HTTP_400_BAD_REQUEST)
+    return response
@@ -1,10 +1,10 @@
-# python 
-import uuid
-
 # django 
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 
+# public ids
+from seeran_backend.ids import generate_id
+
 # models
 from schools.models import School
 
@@ -29,7 +29,7 @@ class Grade(models.Model):
         ('11', 'Grade 11'),
         ('12', 'Grade 12') 
     ]
-    grade = models.CharField(_('school grade'), choices=SCHOOL_GRADES_CHOICES)
+    grade = models.CharField(_('school grade'), max_length=3, choices=SCHOOL_GRADES_CHOICES)
     school = models.ForeignKey(School, on_delete=models.CASCADE, related_name='school_grades')
 
     # grade  id 
@@ -45,20 +45,10 @@ class Grade(models.Model):
     # grade id creation handler
     def save(self, *args, **kwargs):
         if not self.grade_id:
-            self.grade_id = self.generate_unique_id('GR')
+            self.grade_id = generate_id('GR')
 
         super(Grade, self).save(*args, **kwargs)
 
-    @staticmethod
-    def generate_unique_id(prefix=''):
-        max_attempts = 10
-        for _ in range(max_attempts):
-            unique_part = uuid.uuid4().hex[:13]  # Take only the first 13 characters
-            id = f"{prefix}{unique_part}"
-            if not Grade.objects.filter(grade_id=id).exists():
-                return id
-        raise ValueError('failed to generate a unique grade ID after 10 attempts, please try again later.')
-            
 
 class Subject(models.Model):
 
@@ -98,16 +88,6 @@ class Subject(models.Model):
     # class account id creation handler
     def save(self, *args, **kwargs):
         if not self.subject_id:
-            self.subject_id = self.generate_unique_id('SB')
+            self.subject_id = generate_id('SB')
 
         super(Subject, self).save(*args, **kwargs)
-
-    @staticmethod
-    def generate_unique_id(prefix=''):
-        max_attempts = 10
-        for _ in range(max_attempts):
-            unique_part = uuid.uuid4().hex[:13]  # Take only the first 13 characters
-            id = f"{prefix}{unique_part}"
-            if not Subject.objects.filter(subject_id=id).exists():
-                return id
-        raise ValueError('failed to generate a unique subject ID after 10 attempts, please try again later.')
\ No newline at end of file
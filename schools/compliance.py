@@ -0,0 +1,83 @@
+# python
+import datetime
+
+# django
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Exists, Min, OuterRef
+from django.utils import timezone
+
+# models
+from schools.models import School, ComplianceAudit
+from balances.models import Bill
+
+# school status cache
+from schools import status as school_status
+
+
+"""
+    compliance sweep
+
+    a school is none compliant while it's in arrears and one of its principals has had a bill unpaid for more than
+    COMPLIANCE_GRACE_DAYS days. the sweep flags the schools that became none compliant and clears the ones that paid,
+    each with one UPDATE .. WHERE .. RETURNING, so it makes the same few round trips however many schools there are:
+        - flag, and clear, one update each returning the ids of the schools that changed
+        - the oldest unpaid bill of the changed schools, one grouped query
+        - one bulk insert of the audit rows ( schools.models.ComplianceAudit, one per change )
+
+    the ids of the schools that changed are returned, and their cached status refreshed.
+"""
+
+FLAGGED = 'bill unpaid past the grace period'
+CLEARED = 'overdue bills settled'
+
+
+def _update_returning(queryset, **values):
+
+    """
+        UPDATE school SET .. WHERE pk IN ( queryset ) RETURNING pk, returns the pks of the updated schools.
+        django's update() can't say which rows it changed and selecting them first would be another round trip
+    """
+
+    quote = connection.ops.quote_name
+    pk_column = quote(School._meta.pk.column)
+
+    subquery, params = queryset.values('pk').query.sql_with_params()
+    assignments = ', '.join(f'{quote(School._meta.get_field(field).column)} = %s' for field in values)
+
+    sql = f'UPDATE {quote(School._meta.db_table)} SET {assignments} WHERE {pk_column} IN ({subquery}) RETURNING {pk_column}'
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [*values.values(), *params])
+        return [row[0] for row in cursor.fetchall()]
+
+
+def run_compliance_sweep(date=None):
+
+    """
+        flags and clears none compliant schools as of the given date ( today by default ).
+        returns { "flagged": [ school pks ], "cleared": [ school pks ] }
+    """
+
+    date = date or timezone.now().date()
+    cutoff = date - datetime.timedelta(days=settings.COMPLIANCE_GRACE_DAYS)
+
+    overdue = Exists(Bill.objects.filter(user__school=OuterRef('pk'), user__role='PRINCIPAL', is_paid=False, date_billed__lte=cutoff))
+
+    with transaction.atomic():
+        flagged = _update_returning(School.objects.filter(overdue, in_arears=True, none_compliant=False), none_compliant=True)
+        cleared = _update_returning(School.objects.filter(~overdue, none_compliant=True), none_compliant=False)
+
+        oldest = dict(
+            Bill.objects.filter(user__school__in=flagged + cleared, user__role='PRINCIPAL', is_paid=False)
+            .values('user__school').annotate(oldest=Min('date_billed')).values_list('user__school', 'oldest')
+        ) if flagged or cleared else {}
+
+        ComplianceAudit.objects.bulk_create(
+            [ComplianceAudit(school_id=school_id, none_compliant=True, reason=FLAGGED, oldest_unpaid_bill=oldest.get(school_id)) for school_id in flagged]
+            + [ComplianceAudit(school_id=school_id, none_compliant=False, reason=CLEARED, oldest_unpaid_bill=oldest.get(school_id)) for school_id in cleared]
+        )
+
+    school_status.refresh(flagged + cleared)
+
+    return {'flagged': flagged, 'cleared': cleared}
@@ -0,0 +1,131 @@
+# django
+from django.db.models import Q
+
+# models
+from users.models import CustomUser
+from balances.models import Balance
+
+
+"""
+    batched principal and balance loading for serializers
+
+    serializers that need a schools principal, or the principal behind a bill, ask a PrincipalLoader instead of
+    querying per object. the loader is shared through the serializer context and primed with every instance the
+    root serializer was given, so a whole list resolves in one query for the principals ( with their school ) and,
+    only if a serializer asks for one, one for their balances. keys it wasn't primed with are loaded in another batch
+    when they're first asked for.
+"""
+
+
+class PrincipalLoader:
+
+    def __init__(self):
+        self._by_school = {}
+        self._by_user = {}
+        self._balances = {}
+
+        self._pending_schools = set()
+        self._pending_users = set()
+        self._pending_balances = set()
+        self._primed = set()
+
+    def prime(self, school_ids=(), user_ids=()):
+        self._pending_schools.update(school_id for school_id in school_ids if school_id not in self._by_school)
+        self._pending_users.update(user_id for user_id in user_ids if user_id not in self._by_user)
+
+    def _load(self):
+        if not self._pending_schools and not self._pending_users:
+            return
+
+        principals = list(
+            CustomUser.objects.filter(Q(school_id__in=self._pending_schools, role='PRINCIPAL') | Q(pk__in=self._pending_users)).select_related('school')
+        )
+
+        # every key asked for is answered, with None if there's nothing behind it
+        self._by_school.update(dict.fromkeys(self._pending_schools))
+        self._by_user.update(dict.fromkeys(self._pending_users))
+        self._pending_schools, self._pending_users = set(), set()
+
+        for principal in principals:
+            self._by_user[principal.pk] = principal
+            if principal.role == 'PRINCIPAL':
+                self._by_school[principal.school_id] = principal
+
+        # balances are loaded the first time one is asked for, for every principal loaded by then
+        self._pending_balances.update(principal.pk for principal in principals if principal.pk not in self._balances)
+
+    def _load_balances(self):
+        if not self._pending_balances:
+            return
+
+        self._balances.update(dict.fromkeys(self._pending_balances))
+        self._balances.update({balance.user_id: balance for balance in Balance.objects.filter(user_id__in=self._pending_balances)})
+        self._pending_balances = set()
+
+    def principal(self, school_id):
+
+        """
+            the principal of the school, or None
+        """
+
+        if school_id not in self._by_school:
+            self.prime(school_ids=[school_id])
+            self._load()
+
+        return self._by_school[school_id]
+
+    def user(self, user_id):
+
+        """
+            the user ( with their school ), or None
+        """
+
+        if user_id not in self._by_user:
+            self.prime(user_ids=[user_id])
+            self._load()
+
+        return self._by_user[user_id]
+
+    def balance(self, school_id):
+
+        """
+            the balance of the schools principal, or None
+        """
+
+        principal = self.principal(school_id)
+        if principal is None:
+            return None
+
+        if principal.pk not in self._balances:
+            self._pending_balances.add(principal.pk)
+            self._load_balances()
+
+        return self._balances[principal.pk]
+
+
+def get_principal_loader(serializer, school_ids=None, user_ids=None):
+
+    """
+        returns the loader of the serializers tree, primed the first time each root serializer asks with
+        school_ids( instances ) and user_ids( instances ) of the instances it was given
+    """
+
+    loader = serializer.context.get('principal_loader')
+    if loader is None:
+        loader = serializer.context['principal_loader'] = PrincipalLoader()
+
+    root = serializer.root
+
+    if id(root) not in loader._primed:
+        loader._primed.add(id(root))
+
+        instances = root.instance
+        if instances is not None:
+            instances = list(instances) if isinstance(instances, (list, tuple)) or hasattr(instances, 'model') else [instances]
+
+            loader.prime(
+                school_ids=school_ids(instances) if school_ids else (),
+                user_ids=user_ids(instances) if user_ids else (),
+            )
+
+    return loader
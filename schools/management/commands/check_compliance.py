@@ -1,18 +1,22 @@
+# python
+import json
+from datetime import date
+
+# django
 from django.core.management.base import BaseCommand
-from django.utils import timezone
-from schools.models import School
-from balances.models import Bill
+
+# compliance sweep
+from schools.compliance import run_compliance_sweep
+
 
 class Command(BaseCommand):
-    help = 'Check compliance of schools'
+    help = 'Flag schools with bills unpaid past the grace period as none compliant, and clear the ones that paid'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', type=date.fromisoformat, help='check as of this date ( YYYY-MM-DD ), defaults to today')
 
     def handle(self, *args, **options):
-        schools = School.objects.all()
-        for school in schools:
-            # Get the date 7 days ago
-            seven_days_ago = timezone.now().date() - timezone.timedelta(days=7)
-            # Check if the school has been in arrears for 7 days
-            if school.in_arears and school.balance.last_updated.date() <= seven_days_ago:
-                # Set the none_compliant field to True
-                school.none_compliant = True
-                school.save()
+        changes = run_compliance_sweep(date=options['date'])
+
+        # the ids of the schools that changed, for anything downstream that caches school state
+        self.stdout.write(json.dumps(changes))
@@ -0,0 +1,14 @@
+# django
+from django.core.management.base import BaseCommand
+
+# school population counters
+from schools import population
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the school population counters from the users table'
+
+    def handle(self, *args, **options):
+        written = population.rebuild()
+
+        self.stdout.write(f'rebuilt {written} school population counters')
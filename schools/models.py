@@ -1,10 +1,13 @@
-# python 
-import uuid
-
 # django 
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 
+# public ids
+from seeran_backend.ids import generate_id
+
+# school status cache
+from schools import status as school_status
+
 
 class School(models.Model):
     
@@ -94,18 +97,64 @@ class School(models.Model):
     # school account id creation handler
     def save(self, *args, **kwargs):
         if not self.school_id:
-            self.school_id = self.generate_unique_id('SA')
+            self.school_id = generate_id('SA')
 
         super(School, self).save(*args, **kwargs)
 
-    @staticmethod
-    def generate_unique_id(prefix=''):
-      
-        max_attempts = 10
-       
-        for _ in range(max_attempts):
-            unique_part = uuid.uuid4().hex[:13]  # Take only the first 13 characters
-            id = f"{prefix}{unique_part}"
-            if not School.objects.filter(school_id=id).exists():
-                return id
-        raise ValueError('failed to generate a unique account ID after 10 attempts, please try again later.')
+        # the compliance and arrears flags are cached for the auth paths
+        school_status.invalidate(self.pk)
+
+    def delete(self, *args, **kwargs):
+        school_id = self.pk
+        deleted = super(School, self).delete(*args, **kwargs)
+
+        school_status.invalidate(school_id)
+        return deleted
+
+
+class ComplianceAudit(models.Model):
+
+    # append only, a row for every compliance state change the compliance sweep made
+    school = models.ForeignKey(School, on_delete=models.CASCADE, related_name='compliance_audits')
+
+    # the state the school was changed to and why
+    none_compliant = models.BooleanField(_('none compliant after the change'))
+    reason = models.CharField(_('reason'), max_length=64)
+
+    # the oldest unpaid bill at the time of the change, if any
+    oldest_unpaid_bill = models.DateField(blank=True, null=True)
+
+    changed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = _('compliance audit')
+        verbose_name_plural = _('compliance audits')
+
+    def __str__(self):
+        return f'{self.school_id} none compliant: {self.none_compliant} ({self.reason})'
+
+    def save(self, *args, **kwargs):
+        if self.pk:
+            raise ValueError('compliance audits are append only')
+
+        super(ComplianceAudit, self).save(*args, **kwargs)
+
+
+class SchoolPopulation(models.Model):
+
+    # how many users of a role a school has, kept up to date by the users signals ( users.signals ) so the
+    # founder dashboard doesn't count the users table. rebuilt from scratch with the reconcile_population command
+    school = models.ForeignKey(School, on_delete=models.CASCADE, related_name='population')
+    role = models.CharField(_('role'), max_length=20)
+    count = models.IntegerField(_('number of users'), default=0)
+
+    class Meta:
+        verbose_name = _('school population')
+        verbose_name_plural = _('school populations')
+
+        constraints = [
+            models.UniqueConstraint(fields=['school', 'role'], name='unique_school_population_role'),
+        ]
+
+    def __str__(self):
+        return f'{self.school_id} {self.role}: {self.count}'
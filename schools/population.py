@@ -0,0 +1,79 @@
+# python
+from collections import Counter
+
+# django
+from django.db import transaction
+from django.db.models import Count, F
+
+# models
+from schools.models import SchoolPopulation
+
+
+"""
+    school population counters
+
+    SchoolPopulation holds a row per school and role with the number of users it has. users.signals adjusts the
+    counters in the same transaction as every user insert, delete and role or school change, bulk inserts
+    ( the user import ) adjust them themselves.
+
+    rebuild() recounts everything from the users table, to repair drift from writes that skip the signals
+    ( queryset.update() of a role or school, raw sql ).
+"""
+
+
+def adjust(changes):
+
+    """
+        applies { ( school pk, role ): change in users, .. } to the counters, creating missing rows
+    """
+
+    for (school_id, role), delta in changes.items():
+        if not delta or school_id is None:
+            continue
+
+        if SchoolPopulation.objects.filter(school_id=school_id, role=role).update(count=F('count') + delta):
+            continue
+
+        # nothing to take users away from, the school is being deleted ( its counters go first ) or needs reconciling
+        if delta < 0:
+            continue
+
+        # the schools first user of the role, a concurrent first user may create the row too
+        SchoolPopulation.objects.bulk_create([SchoolPopulation(school_id=school_id, role=role)], ignore_conflicts=True)
+        SchoolPopulation.objects.filter(school_id=school_id, role=role).update(count=F('count') + delta)
+
+
+def get_counts(school_id):
+
+    """
+        returns { role: number of users, .. } for the school
+    """
+
+    return dict(SchoolPopulation.objects.filter(school_id=school_id).values_list('role', 'count'))
+
+
+def rebuild():
+
+    """
+        recounts every schools users by role and replaces the counters, returns the number of counters written
+    """
+
+    # imported here, users.models imports the schools models
+    from users.models import CustomUser
+
+    counts = CustomUser.objects.filter(school__isnull=False).values('school_id', 'role').annotate(users=Count('pk')).values_list('school_id', 'role', 'users')
+
+    with transaction.atomic():
+        SchoolPopulation.objects.all().delete()
+        SchoolPopulation.objects.bulk_create([SchoolPopulation(school_id=school_id, role=role, count=users) for school_id, role, users in counts], batch_size=1000)
+
+    return len(counts)
+
+
+def count_changes(users):
+
+    """
+        the counter changes for newly inserted users
+    """
+
+    return Counter((user.school_id, user.role) for user in users)
@@ -5,12 +5,15 @@ from rest_framework import serializers
 
 # django
 from django.core.cache import cache
-from django.db.models import Q
 
 # models
 from .models import School
-from users.models import CustomUser
-from balances.models import Balance
+
+# principal and balance loader
+from .loaders import get_principal_loader
+
+# school population counters
+from . import population
 
 
 
@@ -44,21 +47,20 @@ class SchoolSerializer(serializers.ModelSerializer):
     class Meta:
         model = School
         fields = ['principal', 'balance' ]
+
+    # principals and their balances are loaded for every school being serialized at once
+    def get_loader(self):
+        return get_principal_loader(self, school_ids=lambda schools: [school.pk for school in schools])
                 
     def get_principal(self, obj):
-    
-        try:
-            principal = CustomUser.objects.get(school=obj, role='PRINCIPAL')
-     
-        except CustomUser.DoesNotExist:
-            return None
-      
+        principal = self.get_loader().principal(obj.pk)
+
         if principal:
                     
             return {
                 "name" : principal.name,
                 "surname" : principal.surname,
-                "id" : principal.user_id,
+                "id" : principal.account_id,
                 'image': '/default-user-image.svg',
                 # add any other fields you want to include
             }
@@ -67,15 +69,9 @@ class SchoolSerializer(serializers.ModelSerializer):
             return None
     
     def get_balance(self, obj):
-
-        try:
-            principal = CustomUser.objects.get(school=obj, role='PRINCIPAL')
-  
-        except CustomUser.DoesNotExist:
-            return None
+        balance = self.get_loader().balance(obj.pk)
  
-        if principal:
-            balance = Balance.objects.get(user=principal)
+        if balance:
             return {
                 "amount" : balance.amount,
                 "last_updated" : balance.last_updated,
@@ -85,7 +81,7 @@ class SchoolSerializer(serializers.ModelSerializer):
         else:
             return None
     
-    
+
 class SchoolDetailsSerializer(serializers.ModelSerializer):
         
     name = serializers.SerializerMethodField()
@@ -113,15 +109,23 @@ class SchoolDetailsSerializer(serializers.ModelSerializer):
     def get_province(self, obj):
         return obj.province.title()
 
+    # the schools population counters, read once for all four counts
+    def get_counts(self, obj):
+        if getattr(self, '_counts', None) is None or self._counts[0] != obj.pk:
+            self._counts = (obj.pk, population.get_counts(obj.pk))
+
+        return self._counts[1]
+
     def get_students(self, obj):
-        return CustomUser.objects.filter(role='STUDENT', school=obj).count()
+        return self.get_counts(obj).get('STUDENT', 0)
 
     def get_parents(self, obj):
-        return CustomUser.objects.filter(role='PARENT', school=obj).count()
+        return self.get_counts(obj).get('PARENT', 0)
 
     def get_teachers(self, obj):
-        return CustomUser.objects.filter(role='TEACHER', school=obj).count()
+        return self.get_counts(obj).get('TEACHER', 0)
 
     def get_admins(self, obj):
-        return CustomUser.objects.filter(Q(role='ADMIN') | Q(role='PRINCIPAL'), school=obj).count()
+        counts = self.get_counts(obj)
+        return counts.get('ADMIN', 0) + counts.get('PRINCIPAL', 0)
         
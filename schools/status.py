@@ -0,0 +1,142 @@
+# python
+from collections import namedtuple
+
+# django
+from django.conf import settings
+from django.core.cache import cache
+from asgiref.sync import sync_to_async
+
+# caching
+from seeran_backend.caching import LocalLRU
+
+
+"""
+    school status cache
+
+    the compliance and arrears flags of every school, kept in redis ( school_status:<school pk> ) and fronted by
+    a small in-process lru. the auth entry points and token_required read them from here instead of loading user.school.
+
+    School.save() and delete() invalidate a schools entry, the compliance and billing commands refresh
+    the entries of every school they update in bulk ( they update with queryset.update(), which skips save() ).
+"""
+
+SchoolStatus = namedtuple('SchoolStatus', ['none_compliant', 'in_arears'])
+
+STATUS_TIMEOUT = getattr(settings, 'SCHOOL_STATUS_TIMEOUT', 3600)
+
+_local = LocalLRU(getattr(settings, 'SCHOOL_STATUS_LOCAL_MAX_SIZE', 1024), getattr(settings, 'SCHOOL_STATUS_LOCAL_TIMEOUT', 5))
+
+
+def status_key(school_id):
+    return f'school_status:{school_id}'
+
+
+def _load(school_ids):
+    # imported here, the School model imports this module to invalidate entries
+    from schools.models import School
+
+    return {
+        school_id: SchoolStatus(none_compliant, in_arears)
+        for school_id, none_compliant, in_arears in School.objects.filter(pk__in=school_ids).values_list('pk', 'none_compliant', 'in_arears')
+    }
+
+
+def get_status(school_id):
+
+    """
+        returns the SchoolStatus of the school, or None if no such school exists
+    """
+
+    key = status_key(school_id)
+
+    status = _local.get(key)
+    if status is not None:
+        return status
+
+    status = cache.get(key)
+
+    if status is None:
+        status = _load([school_id]).get(school_id)
+
+        if status is None:
+            return None
+
+        cache.set(key, tuple(status), timeout=STATUS_TIMEOUT)
+
+    status = SchoolStatus(*status)
+    _local.set(key, status)
+
+    return status
+
+
+async def aget_status(school_id):
+
+    """
+        get_status for async views
+    """
+
+    key = status_key(school_id)
+
+    status = _local.get(key)
+    if status is not None:
+        return status
+
+    # the whole lookup runs off the event loop, a miss is one small query
+    return await sync_to_async(get_status)(school_id)
+
+
+def is_none_compliant(school_id):
+
+    """
+        True if the school has been flagged non compliant, users without a school ( founders ) never are
+    """
+
+    if school_id is None:
+        return False
+
+    status = get_status(school_id)
+    return status is not None and status.none_compliant
+
+
+async def ais_none_compliant(school_id):
+
+    """
+        is_none_compliant for async views
+    """
+
+    if school_id is None:
+        return False
+
+    status = await aget_status(school_id)
+    return status is not None and status.none_compliant
+
+
+def refresh(school_ids=None):
+
+    """
+        reloads the status of the given schools ( every school if None ) from the database in one query and one pipelined write
+    """
+
+    if school_ids is None:
+        from schools.models import School
+        school_ids = list(School.objects.values_list('pk', flat=True))
+
+    statuses = _load(school_ids)
+
+    for school_id in school_ids:
+        _local.delete(status_key(school_id))
+
+    if statuses:
+        cache.set_many({status_key(school_id): tuple(status) for school_id, status in statuses.items()}, timeout=STATUS_TIMEOUT)
+
+    # schools that no longer exist
+    missing = [status_key(school_id) for school_id in school_ids if school_id not in statuses]
+    if missing:
+        cache.delete_many(missing)
+
+
+def invalidate(school_id):
+    key = status_key(school_id)
+
+    _local.delete(key)
+    cache.delete(key)
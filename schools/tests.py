@@ -1,3 +1,64 @@
+# django
+from django.core.cache import cache
 from django.test import TestCase
 
-# Create your tests here.
+# in-process caches
+from seeran_backend.caching import clear_local_caches
+
+# models
+from users.models import CustomUser
+from schools.models import School
+from balances.models import Balance
+
+# serializers
+from schools.serializers import SchoolSerializer
+
+# utility functions
+from authentication.utils import generate_token
+
+
+class SchoolQueryTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        clear_local_caches()
+
+        self.schools = [School.objects.create(name=f'school {number}', email=f'school{number}@example.com', contact_number='0110000000') for number in range(5)]
+
+        for school in self.schools:
+            principal = CustomUser.objects.create(email=f'principal{school.pk}@example.com', name='pat', surname='principal', role='PRINCIPAL', school=school)
+            Balance.objects.create(user=principal, amount=100)
+
+        self.founder = CustomUser.objects.create(email='founder@example.com', name='fred', surname='founder', role='FOUNDER')
+        self.client.cookies['refresh_token'] = generate_token(self.founder)['refresh_token']
+
+    def test_school_endpoint(self):
+        school = self.schools[0]
+
+        # warms the founders principal snapshot
+        self.client.get(f'/api/schl/school/{school.school_id}/')
+
+        # the school, its principal and the principals balance
+        with self.assertNumQueries(3):
+            response = self.client.get(f'/api/schl/school/{school.school_id}/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['school']['principal']['id'], CustomUser.objects.get(school=school, role='PRINCIPAL').account_id)
+        self.assertEqual(float(response.json()['school']['balance']['amount']), 100)
+
+    def test_schools_load_principals_and_balances_in_one_batch(self):
+        schools = list(School.objects.all())
+
+        with self.assertNumQueries(2):
+            data = SchoolSerializer(schools, many=True).data
+
+        self.assertTrue(all(school['principal'] and school['balance'] for school in data))
+
+    def test_principals_without_a_balance_are_loaded_once(self):
+        Balance.objects.all().delete()
+        schools = list(School.objects.all())
+
+        with self.assertNumQueries(2):
+            data = SchoolSerializer(schools, many=True).data
+
+        self.assertTrue(all(school['balance'] is None for school in data))
@@ -5,6 +5,7 @@ urlpatterns = [
     
     # school account views
     path('create-school/', views.create_school, name="create school account"),
+    path('delete-school/', views.delete_school, name="delete school account"),
     path('schools/', views.schools, name="get all school accounts"),
     path('school/<str:school_id>/', views.school, name="get school info"),
     path('school-details/<str:school_id>/', views.school_details, name="get school info"),
@@ -3,7 +3,8 @@ import random
 
 # django
 from django.views.decorators.cache import cache_control
-from django.db.models import Count
+from django.db.models import Sum
+from django.db.models.functions import Coalesce
 from django.db import models
 
 # boto
@@ -18,10 +19,16 @@ from .models import School
 # serializers
 from .serializers import SchoolCreationSerializer, SchoolsSerializer, SchoolSerializer, SchoolDetailsSerializer
 
+# pagination
+from seeran_backend.pagination import paginate
+
 # custom decorators
 from authentication.decorators import token_required
 from users.decorators import founder_only
 
+# background deletion
+from users.deletion import request_school_deletion
+
 # utility functions
 
 
@@ -39,20 +46,41 @@ def create_school(request):
     return Response({"error" : serializer.errors})
 
 
+# deactivates the school's users now, the school and everything in it is deleted in the background
+@api_view(['POST'])
+@token_required
+@founder_only
+def delete_school(request):
+
+    try:
+        school = School.objects.get(school_id=request.data.get('school_id'))
+
+    except School.DoesNotExist:
+        return Response({"error" : "school with the provided credentials can not be found"}, status=404)
+
+    try:
+        job = request_school_deletion(school.pk, requested_by=request.user.pk)
+
+        return Response({ "message" : "school account deactivated and queued for deletion", "job_id" : job.job_id }, status=202)
+
+    except Exception as e:
+        return Response({"error" : str(e)}, status=500)
+
+
 @api_view(['GET'])
 @token_required
 @founder_only
 def schools(request):
    
     try:
+        # read from the population counters, a row per school and role, instead of counting the users table
         schools = School.objects.all().annotate(
-            students=Count('users', filter=models.Q(users__role='STUDENT')),
-            parents=Count('users', filter=models.Q(users__role='PARENT')),
-            teachers=Count('users', filter=models.Q(users__role='TEACHER'))
+            students=Coalesce(Sum('population__count', filter=models.Q(population__role='STUDENT')), 0),
+            parents=Coalesce(Sum('population__count', filter=models.Q(population__role='PARENT')), 0),
+            teachers=Coalesce(Sum('population__count', filter=models.Q(population__role='TEACHER')), 0)
         )
  
-        serializer = SchoolsSerializer(schools, many=True)
-        return Response({"schools" : serializer.data}, status=200)
+        return paginate(request, schools, SchoolsSerializer, 'schools', ordering=['name'])
  
     except Exception as e:
         return Response({"error" : str(e)}, status=500)
@@ -0,0 +1,70 @@
+# python
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+
+"""
+    in-process caching helpers shared by the redis backed caches ( principal snapshots, school status )
+"""
+
+# every LocalLRU of the process, for clear_local_caches()
+_caches = weakref.WeakSet()
+
+
+class LocalLRU:
+
+    """
+        a tiny thread safe lru with a per entry ttl, the ttl is kept short because other processes
+        can only invalidate the redis copy, not ours
+    """
+
+    def __init__(self, max_size, timeout):
+        self.max_size = max_size
+        self.timeout = timeout
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        _caches.add(self)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.timeout, value)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def clear_local_caches():
+
+    """
+        empties every LocalLRU of the process. tests call it with cache.clear(), rows created by one test reuse the
+        primary keys of the rows an earlier test rolled back, and the lrus would still answer for the old ones
+    """
+
+    for local in list(_caches):
+        local.clear()
@@ -0,0 +1,58 @@
+# django
+from django.db.backends.postgresql.base import DatabaseWrapper as PostgresDatabaseWrapper
+from django.db.backends.postgresql.psycopg_any import IsolationLevel
+from django.db.backends.base.base import NO_DB_ALIAS
+
+# connection pool
+from seeran_backend.db.pool import PoolTimeout, get_pool
+
+
+"""
+    postgres backend with pooled connections ( ENGINE = 'seeran_backend.db' )
+
+    the postgresql backend, except connecting takes a connection from the process pool ( seeran_backend/db/pool.py )
+    and closing gives it back. pool options come from the databases POOL setting, keep CONN_MAX_AGE at 0 so
+    connections go back to the pool at the end of every request instead of being held by the thread.
+"""
+
+
+class DatabaseWrapper(PostgresDatabaseWrapper):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._connection_pool = None
+
+    def get_new_connection(self, conn_params):
+        # the connection to the 'postgres' database used while creating and dropping databases isn't pooled
+        if self.alias == NO_DB_ALIAS:
+            self._connection_pool = None
+            return super().get_new_connection(conn_params)
+
+        key = (
+            self.alias, conn_params.get('host'), conn_params.get('port'),
+            conn_params.get('database') or conn_params.get('dbname'), conn_params.get('user'),
+        )
+        pool = get_pool(key, self.alias, self.settings_dict.get('POOL', {}))
+
+        try:
+            connection = pool.acquire(lambda: super(DatabaseWrapper, self).get_new_connection(conn_params))
+        except PoolTimeout as e:
+            # surfaces as django.db.OperationalError
+            raise self.Database.OperationalError(str(e)) from e
+
+        # set by the postgresql backend when it opens a connection, pooled connections keep the level they were opened with
+        self.isolation_level = IsolationLevel(self.settings_dict['OPTIONS'].get('isolation_level', IsolationLevel.READ_COMMITTED))
+
+        self._connection_pool = pool
+        return connection
+
+    def _close(self):
+        if self.connection is None:
+            return
+
+        if self._connection_pool is None:
+            return super()._close()
+
+        # connections that errored and failed djangos usability check aren't given back
+        with self.wrap_database_errors:
+            self._connection_pool.release(self.connection, discard=self.errors_occurred)
@@ -0,0 +1,52 @@
+# python
+import re
+
+# django
+from django.db import connections, transaction
+
+
+"""
+    query plans
+
+    helpers for the tests that check the hot querysets are served by the indexes declared for them in Meta.indexes.
+    on postgres sequential scans are disabled while explaining ( enable_seqscan = off ), so the plan shows the index
+    the planner would use whatever the size of the table.
+"""
+
+
+def explain(queryset):
+    connection = connections[queryset.db]
+
+    if connection.vendor != 'postgresql':
+        return queryset.explain()
+
+    with transaction.atomic(using=queryset.db):
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+
+        return queryset.explain()
+
+
+def uses_index(plan, indexes):
+
+    """
+        returns True if the plan reads through one of the named indexes
+    """
+
+    # postgres "Index Scan using name", "Index Only Scan using name", "Bitmap Index Scan on name",
+    # sqlite "SEARCH table USING ( COVERING ) INDEX name"
+    return any(re.search(rf'\b{index}\b', plan) for index in indexes)
+
+
+class QueryPlanMixin:
+
+    def assertUsesIndex(self, queryset, *indexes):
+
+        """
+            fails unless the querysets plan reads through one of the named indexes. naming them matters, any index
+            on the filtered columns ( the foreign key indexes django adds ) would keep a plan off a sequential scan.
+            name every index that can serve the query, without statistics the planner picks any of them
+        """
+
+        plan = explain(queryset)
+        self.assertTrue(uses_index(plan, indexes), f"{queryset.model.__name__} query doesn't use {' or '.join(indexes)}:\n{plan}")
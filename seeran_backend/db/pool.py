@@ -0,0 +1,294 @@
+# python
+import logging
+import os
+import threading
+import time
+
+# metrics
+from seeran_backend import metrics
+
+
+logger = logging.getLogger(__name__)
+
+
+"""
+    database connection pool
+
+    every worker process keeps a bounded pool of open connections per database, so requests don't open ( and tls
+    handshake ) a new connection to cloud sql and tear it down again. the pooled backend ( seeran_backend.db ) takes
+    a connection from the pool when django connects and gives it back when django closes it, which with
+    CONN_MAX_AGE = 0 is at the end of every request.
+
+    the pool is thread safe, under asgi the sync views and the async views orm calls run in executor threads and
+    each of them checks out its own connection.
+
+        - at most MAX_SIZE connections are open per database, checkouts wait up to TIMEOUT seconds for one to be
+          given back before failing
+        - connections are closed once they're older than MAX_LIFETIME seconds
+        - a connection that sat idle for more than CHECK_AFTER seconds is pinged before it's handed out, broken
+          connections are thrown away and replaced
+        - connections are given back with their transaction rolled back, ones in an unknown state are closed
+
+    checkout wait time, pool size, connections in use and saturation ( in use / MAX_SIZE ) are recorded as
+    db.pool.<database alias>.* metrics.
+"""
+
+DEFAULT_OPTIONS = {
+    'MAX_SIZE': 10,
+    'TIMEOUT': 10,
+    'MAX_LIFETIME': 1800,
+    'CHECK_AFTER': 30,
+}
+
+# libpq transaction states, the same numbers in psycopg2 and psycopg 3
+TRANSACTION_IDLE = 0
+TRANSACTION_IN_TRANSACTION = 2
+TRANSACTION_IN_ERROR = 3
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+def _close_quietly(connection):
+    try:
+        connection.close()
+    except Exception:
+        pass
+
+
+class ConnectionPool:
+
+    def __init__(self, name, max_size, timeout, max_lifetime, check_after):
+        self.name = name
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.check_after = check_after
+
+        # ( connection, created at, given back at ), the most recently given back connection is handed out first
+        # so the ones that aren't needed sit idle until they're recycled
+        self._idle = []
+        # id( connection ) -> created at, for the connections checked out
+        self._in_use = {}
+        # open connections, idle, in use and being opened
+        self._size = 0
+
+        self._condition = threading.Condition()
+
+    def _report(self):
+        in_use = len(self._in_use)
+
+        metrics.gauge(f'db.pool.{self.name}.size', self._size)
+        metrics.gauge(f'db.pool.{self.name}.in_use', in_use)
+        metrics.gauge(f'db.pool.{self.name}.idle', len(self._idle))
+        metrics.gauge(f'db.pool.{self.name}.saturation', round(in_use / self.max_size, 3))
+
+    def _take(self):
+
+        """
+            returns an idle ( connection, created at, given back at ), or ( None, None, None ) with a slot reserved
+            for a new connection. waits for a connection to be given back when the pool is full
+        """
+
+        started = time.monotonic()
+        deadline = started + self.timeout
+
+        with self._condition:
+            while True:
+                if self._idle:
+                    entry = self._idle.pop()
+                    break
+
+                if self._size < self.max_size:
+                    self._size += 1
+                    entry = (None, None, None)
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    metrics.incr(f'db.pool.{self.name}.timeouts')
+                    raise PoolTimeout(f'no {self.name} database connection was given back within {self.timeout} seconds ( {self.max_size} in use )')
+
+                self._condition.wait(remaining)
+
+        metrics.observe(f'db.pool.{self.name}.wait', time.monotonic() - started)
+        return entry
+
+    def _forget(self, connection=None):
+        # frees the slot of a connection that was closed, or never opened
+        if connection is not None:
+            _close_quietly(connection)
+
+        with self._condition:
+            self._size -= 1
+            self._condition.notify()
+            self._report()
+
+    def _usable(self, connection, created_at, given_back_at):
+        now = time.monotonic()
+
+        if now - created_at >= self.max_lifetime:
+            metrics.incr(f'db.pool.{self.name}.recycled')
+            return False
+
+        if connection.closed:
+            metrics.incr(f'db.pool.{self.name}.health_check_failed')
+            return False
+
+        if now - given_back_at < self.check_after:
+            return True
+
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+
+            if not connection.autocommit:
+                connection.rollback()
+
+            return True
+
+        except Exception as e:
+            logger.warning('pooled %s database connection failed its health check: %s', self.name, e)
+            metrics.incr(f'db.pool.{self.name}.health_check_failed')
+            return False
+
+    def acquire(self, connect):
+
+        """
+            returns a healthy connection, opening one with connect() when there's no idle connection and the
+            pool isn't full. raises PoolTimeout when the pool stays full for TIMEOUT seconds
+        """
+
+        while True:
+            connection, created_at, given_back_at = self._take()
+
+            if connection is None:
+                try:
+                    with metrics.timed(f'db.pool.{self.name}.connect'):
+                        connection = connect()
+
+                except BaseException:
+                    self._forget()
+                    raise
+
+                created_at = time.monotonic()
+                metrics.incr(f'db.pool.{self.name}.created')
+                break
+
+            if self._usable(connection, created_at, given_back_at):
+                break
+
+            self._forget(connection)
+
+        with self._condition:
+            self._in_use[id(connection)] = created_at
+            self._report()
+
+        return connection
+
+    def _reset(self, connection):
+        # gives the next request a connection outside any transaction
+        try:
+            status = connection.info.transaction_status
+
+            if status in (TRANSACTION_IN_TRANSACTION, TRANSACTION_IN_ERROR):
+                connection.rollback()
+                status = connection.info.transaction_status
+
+            return status == TRANSACTION_IDLE
+
+        except Exception:
+            return False
+
+    def release(self, connection, discard=False):
+
+        """
+            gives a connection back to the pool, it's closed instead if discard is set, it's too old or it can't
+            be reset
+        """
+
+        with self._condition:
+            created_at = self._in_use.pop(id(connection), None)
+
+        if created_at is None:
+            # not one of ours ( checked out before a fork or a pool reset )
+            _close_quietly(connection)
+            return
+
+        reusable = not discard and not connection.closed and time.monotonic() - created_at < self.max_lifetime and self._reset(connection)
+
+        if not reusable:
+            self._forget(connection)
+            return
+
+        with self._condition:
+            self._idle.append((connection, created_at, time.monotonic()))
+            self._condition.notify()
+            self._report()
+
+    def close(self):
+
+        """
+            closes the idle connections, connections in use are closed when they're given back
+        """
+
+        with self._condition:
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._in_use.clear()
+            self._report()
+
+        for connection, _, _ in idle:
+            _close_quietly(connection)
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+# pools inherited from the parent process, kept referenced so their sockets ( shared with the parent ) are never
+# closed from the child
+_inherited = []
+
+
+def get_pool(key, name, options):
+
+    """
+        returns the pool for key ( the database alias and where it connects to ), creating it with options
+        ( the databases POOL settings ) the first time
+    """
+
+    pool = _pools.get(key)
+    if pool is not None:
+        return pool
+
+    with _pools_lock:
+        pool = _pools.get(key)
+
+        if pool is None:
+            options = {**DEFAULT_OPTIONS, **options}
+            pool = _pools[key] = ConnectionPool(
+                name, max_size=options['MAX_SIZE'], timeout=options['TIMEOUT'],
+                max_lifetime=options['MAX_LIFETIME'], check_after=options['CHECK_AFTER'],
+            )
+
+        return pool
+
+
+def close_pools():
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+
+    for pool in pools:
+        pool.close()
+
+
+def _reset():
+    # forked workers open their own connections
+    _inherited.extend(_pools.values())
+    _pools.clear()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset)
@@ -0,0 +1,138 @@
+# python
+import hashlib
+import threading
+import time
+from functools import wraps
+
+# django
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponseNotModified
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags
+
+# metrics
+from seeran_backend import metrics
+
+
+"""
+    conditional GET
+
+    views wrapped in conditional() get a strong ETag made from version counters kept in redis ( etag_version:<key> ),
+    plus who is asking and the full path. a request whose If-None-Match holds the current ETag is answered with a
+    304 before the view runs, so it costs the token check and one redis round trip, no orm queries or serializers.
+
+    the counters are bumped with bump() after the change commits. a view reads the versions before it reads its data,
+    so a response is never tagged with a version newer than the data in it.
+
+    counters never expire, a counter that's missing ( evicted, or never bumped ) starts from the current time in
+    nanoseconds, so it can't come back at a value an old ETag was made from.
+
+    hits and misses are counted per endpoint as etag.<name>.hit / .miss, with etag.<name>.hit_ratio as a gauge.
+"""
+
+_counts = {}
+_counts_lock = threading.Lock()
+
+
+def version_key(key):
+    return f'etag_version:{key}'
+
+
+def _initial():
+    return time.time_ns()
+
+
+def get_versions(keys):
+
+    """
+        returns { key : version } for the keys, in one round trip when they all exist
+    """
+
+    cache_keys = {version_key(key): key for key in keys}
+    versions = {cache_keys[cache_key]: version for cache_key, version in cache.get_many(list(cache_keys)).items()}
+
+    for cache_key, key in cache_keys.items():
+        if key not in versions:
+            # add() loses to a concurrent add or bump, read back whichever won
+            cache.add(cache_key, _initial(), timeout=None)
+            versions[key] = cache.get(cache_key)
+
+    return versions
+
+
+def _bump(keys):
+    for key in keys:
+        try:
+            cache.incr(version_key(key))
+        except ValueError:
+            cache.add(version_key(key), _initial(), timeout=None)
+
+
+def bump(*keys):
+
+    """
+        moves the versions of the keys on once the current transaction commits, invalidating every ETag made from them
+    """
+
+    keys = {key for key in keys if key is not None}
+
+    if keys:
+        transaction.on_commit(lambda: _bump(keys))
+
+
+def _record(name, hit):
+    with _counts_lock:
+        hits, misses = _counts.get(name, (0, 0))
+        hits, misses = (hits + 1, misses) if hit else (hits, misses + 1)
+        _counts[name] = (hits, misses)
+
+    metrics.incr(f'etag.{name}.{"hit" if hit else "miss"}')
+    metrics.gauge(f'etag.{name}.hit_ratio', round(hits / (hits + misses), 3))
+
+
+def make_etag(name, request, versions):
+    user = request.user
+
+    parts = [name, request.get_full_path(), str(user.pk), str(user.role), str(user.school_id)]
+    parts += [f'{key}={versions[key]}' for key in sorted(versions)]
+
+    return '"' + hashlib.sha256('\n'.join(parts).encode()).hexdigest()[:32] + '"'
+
+
+def conditional(name, keys):
+
+    """
+        ETag / If-None-Match for a GET view. keys( request, *args, **kwargs ) returns the version keys the response
+        depends on, goes under token_required ( and the role decorators ) so request.user is the principal
+    """
+
+    def decorator(view_func):
+
+        @wraps(view_func)
+        def _wrapped_view_func(request, *args, **kwargs):
+            etag = make_etag(name, request, get_versions(keys(request, *args, **kwargs)))
+
+            if_none_match = parse_etags(request.headers.get('If-None-Match', ''))
+
+            if etag in if_none_match or '*' in if_none_match:
+                _record(name, True)
+                response = HttpResponseNotModified()
+
+            else:
+                _record(name, False)
+                response = view_func(request, *args, **kwargs)
+
+                if not 200 <= response.status_code < 300:
+                    return response
+
+            response['ETag'] = etag
+            # browsers keep the response but always revalidate it, shared caches don't keep it at all
+            patch_cache_control(response, private=True, no_cache=True)
+            patch_vary_headers(response, ['Cookie'])
+
+            return response
+
+        return _wrapped_view_func
+
+    return decorator
@@ -0,0 +1,98 @@
+# python
+import os
+import secrets
+import threading
+import time
+
+
+"""
+    public id generator
+
+    every model's public id is its 2 letter prefix followed by 13 base36 characters ( 15 in total, the length of
+    the existing id columns ):
+
+        - 8 characters of milliseconds since 2024-01-01, ids sort roughly by creation time ( until 2113 )
+        - 5 characters of sequence, random at the start of every millisecond and incremented for every id after
+          that in the same millisecond
+
+    ids from one process never repeat, ids from two processes only collide if both start the same millisecond on
+    sequences that overlap, which is unlikely enough that no lookup is needed before inserting. the unique constraint
+    on the id columns is still there as the last line.
+
+    generate_ids( prefix, count ) pre-allocates ids for bulk_create, which can't call save().
+"""
+
+ALPHABET = '0123456789abcdefghijklmnopqrstuvwxyz'
+
+EPOCH_MS = 1704067200000  # 2024-01-01 00:00:00 UTC
+
+TIME_LENGTH = 8
+SEQUENCE_LENGTH = 5
+SEQUENCE_SPACE = len(ALPHABET) ** SEQUENCE_LENGTH
+
+_lock = threading.Lock()
+_last_ms = -1
+_sequence = 0
+
+
+def _reset():
+    global _last_ms
+    # forked workers must not continue the parents sequence
+    _last_ms = -1
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset)
+
+
+def _encode(number, length):
+    characters = []
+
+    for _ in range(length):
+        number, remainder = divmod(number, len(ALPHABET))
+        characters.append(ALPHABET[remainder])
+
+    return ''.join(reversed(characters))
+
+
+def _start_sequence():
+    # the lower half only, so the sequence can run for a long while before it wraps into the next millisecond
+    return secrets.randbelow(SEQUENCE_SPACE // 2)
+
+
+def generate_ids(prefix, count):
+
+    """
+        returns count new ids with the given prefix, in the order they were generated
+    """
+
+    global _last_ms, _sequence
+
+    ids = []
+
+    with _lock:
+        for _ in range(count):
+            now = int(time.time() * 1000) - EPOCH_MS
+
+            if now > _last_ms:
+                _last_ms, _sequence = now, _start_sequence()
+
+            else:
+                # same millisecond ( or the clock went back ), carry on from the last id
+                _sequence += 1
+
+                if _sequence >= SEQUENCE_SPACE:
+                    _last_ms, _sequence = _last_ms + 1, _start_sequence()
+
+            ids.append(f'{prefix}{_encode(_last_ms, TIME_LENGTH)}{_encode(_sequence, SEQUENCE_LENGTH)}')
+
+    return ids
+
+
+def generate_id(prefix):
+
+    """
+        returns a new id with the given prefix
+    """
+
+    return generate_ids(prefix, 1)[0]
@@ -0,0 +1,90 @@
+# python
+import threading
+import time
+from contextlib import contextmanager
+
+
+"""
+    in-process metrics
+
+    counters, gauges and timers kept in memory per worker process.
+    they are cheap enough to record on hot paths ( no network round trip ) and are exposed through the
+    founders metrics endpoint, each worker reports its own numbers.
+"""
+
+
+_lock = threading.Lock()
+
+_counters = {}
+_gauges = {}
+_timers = {}
+
+
+def incr(name, amount=1):
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + amount
+
+
+def gauge(name, value):
+    with _lock:
+        _gauges[name] = value
+
+
+def observe(name, seconds):
+
+    """
+        records a duration in seconds, timers keep the count, total, max and the last 512 samples for percentiles
+    """
+
+    with _lock:
+        timer = _timers.get(name)
+        if timer is None:
+            timer = _timers[name] = {'count': 0, 'total': 0.0, 'max': 0.0, 'samples': []}
+
+        timer['count'] += 1
+        timer['total'] += seconds
+        timer['max'] = max(timer['max'], seconds)
+
+        timer['samples'].append(seconds)
+        if len(timer['samples']) > 512:
+            del timer['samples'][0]
+
+
+@contextmanager
+def timed(name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - started)
+
+
+def _percentile(samples, percentile):
+    if not samples:
+        return 0.0
+
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(percentile / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def snapshot():
+
+    """
+        returns a json serializable copy of every metric recorded by this process, timers are reported in milliseconds
+    """
+
+    with _lock:
+        timers = {
+            name: {
+                'count': timer['count'],
+                'avg_ms': round(timer['total'] / timer['count'] * 1000, 3) if timer['count'] else 0.0,
+                'max_ms': round(timer['max'] * 1000, 3),
+                'p50_ms': round(_percentile(timer['samples'], 50) * 1000, 3),
+                'p95_ms': round(_percentile(timer['samples'], 95) * 1000, 3),
+                'p99_ms': round(_percentile(timer['samples'], 99) * 1000, 3),
+            }
+            for name, timer in _timers.items()
+        }
+
+        return {'counters': dict(_counters), 'gauges': dict(_gauges), 'timers': timers}
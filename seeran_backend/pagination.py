@@ -0,0 +1,132 @@
+# python
+import datetime
+import decimal
+
+# django
+from django.conf import settings
+from django.core import signing
+from django.db.models import Q
+
+# rest framework
+from rest_framework.exceptions import NotFound
+from rest_framework.response import Response
+
+
+"""
+    keyset pagination for the list views
+
+    pages are read with WHERE ( ordering columns ) after ( the last row of the previous page ) instead of an offset,
+    so every page costs the same however deep into the list it is, and rows added or removed between requests
+    don't shift pages. the primary key is always the last ordering column, which makes the keyset unique.
+
+    the cursor is the ordering values of the last row on the page, signed so clients can't craft one.
+    every list view responds with
+
+        { <the views list key> : [ .. ], "next" : cursor of the next page or null }
+
+    and takes ?cursor= for the next page and ?page_size= ( capped at PAGINATION_MAX_PAGE_SIZE ).
+"""
+
+SALT = 'seeran_backend.pagination'
+
+
+def _encode_value(value):
+    # json can't carry these, the strings read back the same through the orm lookups
+    if isinstance(value, (datetime.date, datetime.datetime, datetime.time)):
+        return value.isoformat()
+
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+
+    return value
+
+
+class KeysetPagination:
+
+    def __init__(self, ordering, page_size=None, max_page_size=None):
+        ordering = list(ordering)
+
+        if ordering[-1].lstrip('-') not in ('pk', 'id'):
+            ordering.append('-pk' if ordering[-1].startswith('-') else 'pk')
+
+        self.ordering = ordering
+        self.fields = [field.lstrip('-') for field in ordering]
+
+        self.page_size = page_size or settings.PAGINATION_PAGE_SIZE
+        self.max_page_size = max_page_size or settings.PAGINATION_MAX_PAGE_SIZE
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params.get('page_size', self.page_size))
+        except ValueError:
+            page_size = self.page_size
+
+        return max(1, min(page_size, self.max_page_size))
+
+    def decode_cursor(self, cursor):
+        try:
+            values = signing.loads(cursor, salt=SALT)
+        except signing.BadSignature:
+            raise NotFound('invalid cursor')
+
+        if not isinstance(values, list) or len(values) != len(self.fields):
+            raise NotFound('invalid cursor')
+
+        return values
+
+    def encode_cursor(self, row):
+        return signing.dumps([_encode_value(getattr(row, field)) for field in self.fields], salt=SALT, compress=True)
+
+    def after(self, values):
+
+        """
+            the filter for the rows after the given ordering values:
+            ( a > x ) or ( a = x and b > y ) or .. with < for descending columns
+        """
+
+        condition = Q()
+
+        for position, (field, value) in enumerate(zip(self.ordering, values)):
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            equal = {self.fields[index]: values[index] for index in range(position)}
+
+            condition |= Q(**equal, **{f'{self.fields[position]}__{lookup}': value})
+
+        return condition
+
+    def paginate_queryset(self, queryset, request):
+
+        """
+            returns ( rows of the page, cursor of the next page or None )
+        """
+
+        page_size = self.get_page_size(request)
+        queryset = queryset.order_by(*self.ordering)
+
+        cursor = request.query_params.get('cursor')
+        if cursor:
+            queryset = queryset.filter(self.after(self.decode_cursor(cursor)))
+
+        # one extra row says if there's a next page
+        rows = list(queryset[:page_size + 1])
+
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            return rows, self.encode_cursor(rows[-1])
+
+        return rows, None
+
+    def get_paginated_response(self, key, data, next_cursor, status=200, **extra):
+        return Response({key: data, 'next': next_cursor, **extra}, status=status)
+
+
+def paginate(request, queryset, serializer_class, key, ordering, status=200, **extra):
+
+    """
+        serializes one page of the queryset and returns the response, the shortcut every list view uses
+    """
+
+    paginator = KeysetPagination(ordering)
+    rows, next_cursor = paginator.paginate_queryset(queryset, request)
+
+    return paginator.get_paginated_response(key, serializer_class(rows, many=True).data, next_cursor, status=status, **extra)
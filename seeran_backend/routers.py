@@ -0,0 +1,191 @@
+# python
+import contextvars
+import logging
+import random
+import threading
+import time
+
+# django
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.utils.decorators import sync_and_async_middleware
+from asgiref.sync import iscoroutinefunction
+
+
+logger = logging.getLogger(__name__)
+
+
+"""
+    read replica routing
+
+    reads of GET ( HEAD, OPTIONS ) requests go to a replica in settings.REPLICA_DATABASES, everything else goes to the
+    primary ( default ) database:
+        - writes, and every read of a request that isn't safe
+        - reads after the request wrote something, and reads inside a transaction on the primary
+        - reads outside of requests ( management commands, background workers )
+        - reads of a client that wrote in the last READ_YOUR_WRITES_WINDOW seconds, so users see their own changes.
+          a response to a request that wrote sets the PRIMARY_COOKIE cookie, requests carrying it stick to the primary
+
+    every replica's lag is checked at most every REPLICA_LAG_CHECK_INTERVAL seconds per process, replicas that are
+    more than REPLICA_MAX_LAG seconds behind ( or unreachable ) are skipped until they catch up. with no healthy
+    replica reads fall back to the primary.
+"""
+
+PRIMARY_COOKIE = 'read_primary_until'
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class _RoutingState:
+
+    def __init__(self, use_replica):
+        self.use_replica = use_replica
+        self.wrote = False
+        self.replica = None
+
+
+# the routing state of the request being handled, None outside requests
+_state = contextvars.ContextVar('replica_routing_state', default=None)
+
+
+class _ReplicaHealth:
+
+    """
+        caches whether each replica is within REPLICA_MAX_LAG of the primary
+    """
+
+    def __init__(self):
+        self._checked = {}
+        self._lock = threading.Lock()
+
+    def is_healthy(self, alias):
+        now = time.monotonic()
+        checked = self._checked.get(alias)
+
+        if checked is not None and now - checked[0] < settings.REPLICA_LAG_CHECK_INTERVAL:
+            return checked[1]
+
+        with self._lock:
+            # another thread may have checked while we waited
+            checked = self._checked.get(alias)
+            if checked is not None and now - checked[0] < settings.REPLICA_LAG_CHECK_INTERVAL:
+                return checked[1]
+
+            lag = replica_lag(alias)
+            healthy = lag is not None and lag <= settings.REPLICA_MAX_LAG
+
+            if not healthy:
+                logger.warning('replica %s skipped, lag %s', alias, 'unknown' if lag is None else f'{lag:.1f}s')
+
+            self._checked[alias] = (now, healthy)
+            return healthy
+
+
+_health = _ReplicaHealth()
+
+
+def replica_lag(alias):
+
+    """
+        seconds the replica is behind the primary, 0 for databases that don't replicate ( sqlite in tests ),
+        None if the replica can't be reached
+    """
+
+    connection = connections[alias]
+
+    if connection.vendor != 'postgresql':
+        return 0.0
+
+    try:
+        with connection.cursor() as cursor:
+            # a replica that has replayed everything it received is caught up, however old the last transaction is
+            cursor.execute(
+                'SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 '
+                'ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END'
+            )
+            return float(cursor.fetchone()[0])
+
+    except DatabaseError as e:
+        logger.warning('replica %s lag check failed: %s', alias, e)
+        return None
+
+
+def healthy_replicas():
+    return [alias for alias in settings.REPLICA_DATABASES if _health.is_healthy(alias)]
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+
+        if state is None or not state.use_replica or state.wrote or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+
+        # a request reads from one replica throughout
+        if state.replica is None:
+            replicas = healthy_replicas()
+            state.replica = random.choice(replicas) if replicas else DEFAULT_DB_ALIAS
+
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # replicas get their schema from the primary through replication
+        return db not in settings.REPLICA_DATABASES
+
+
+def _begin(request):
+    try:
+        primary_until = float(request.COOKIES.get(PRIMARY_COOKIE, 0))
+    except ValueError:
+        primary_until = 0
+
+    state = _RoutingState(use_replica=request.method in SAFE_METHODS and primary_until < time.time() and bool(settings.REPLICA_DATABASES))
+    return state, _state.set(state)
+
+
+def _finish(state, response):
+    if state.wrote and settings.REPLICA_DATABASES:
+        window = settings.READ_YOUR_WRITES_WINDOW
+        response.set_cookie(PRIMARY_COOKIE, str(time.time() + window), domain='.seeran-grades.cloud', samesite='None', secure=True, httponly=True, max_age=window)
+
+    return response
+
+
+# routing middleware
+# goes after the authentication middleware, decides where each requests reads go
+@sync_and_async_middleware
+def replica_routing_middleware(get_response):
+
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            state, token = _begin(request)
+            try:
+                response = await get_response(request)
+            finally:
+                _state.reset(token)
+
+            return _finish(state, response)
+
+    else:
+        def middleware(request):
+            state, token = _begin(request)
+            try:
+                response = get_response(request)
+            finally:
+                _state.reset(token)
+
+            return _finish(state, response)
+
+    return middleware
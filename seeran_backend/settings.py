@@ -1,7 +1,7 @@
 # python
 from pathlib import Path
 from datetime import timedelta
-from decouple import config
+from decouple import config, Csv
 
 from google.auth import default
 from google.cloud.storage import Client
@@ -84,7 +84,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     
     # project middleware
-    # none
+    # sends the reads of safe requests to the read replicas
+    'seeran_backend.routers.replica_routing_middleware',
     
     # django middleware
     'django.contrib.messages.middleware.MessageMiddleware',
@@ -149,6 +150,119 @@ SIMPLE_JWT = {
 }
 
 
+# principal snapshot config
+# token_required resolves request.user from a cached snapshot instead of querying the users table
+# snapshots live in redis for PRINCIPAL_SNAPSHOT_TIMEOUT seconds, and in-process for PRINCIPAL_LOCAL_TIMEOUT seconds
+PRINCIPAL_SNAPSHOT_TIMEOUT = config('PRINCIPAL_SNAPSHOT_TIMEOUT', default=600, cast=int)
+PRINCIPAL_LOCAL_TIMEOUT = config('PRINCIPAL_LOCAL_TIMEOUT', default=5, cast=int)
+PRINCIPAL_LOCAL_MAX_SIZE = config('PRINCIPAL_LOCAL_MAX_SIZE', default=2048, cast=int)
+
+
+# school status config
+# the compliance and arrears flags read by the auth paths, cached in redis and in-process like principal snapshots
+SCHOOL_STATUS_TIMEOUT = config('SCHOOL_STATUS_TIMEOUT', default=3600, cast=int)
+SCHOOL_STATUS_LOCAL_TIMEOUT = config('SCHOOL_STATUS_LOCAL_TIMEOUT', default=5, cast=int)
+SCHOOL_STATUS_LOCAL_MAX_SIZE = config('SCHOOL_STATUS_LOCAL_MAX_SIZE', default=1024, cast=int)
+
+
+# email outbox config
+# otp emails are queued and delivered by background workers, the transport decides where they go
+# authentication.outbox.MailgunTransport in production, LocmemTransport/FileTransport for tests and local development
+EMAIL_OUTBOX_TRANSPORT = config('EMAIL_OUTBOX_TRANSPORT', default='authentication.outbox.MailgunTransport')
+EMAIL_OUTBOX_FILE_PATH = config('EMAIL_OUTBOX_FILE_PATH', default=str(BASE_DIR / 'logs' / 'outbox.jsonl'))
+EMAIL_OUTBOX_WORKERS = config('EMAIL_OUTBOX_WORKERS', default=4, cast=int)
+EMAIL_OUTBOX_MAX_QUEUE_SIZE = config('EMAIL_OUTBOX_MAX_QUEUE_SIZE', default=1000, cast=int)
+EMAIL_OUTBOX_MAX_RETRIES = config('EMAIL_OUTBOX_MAX_RETRIES', default=4, cast=int)
+EMAIL_OUTBOX_BACKOFF = config('EMAIL_OUTBOX_BACKOFF', default=1.0, cast=float)  # seconds, doubled on every retry
+EMAIL_OUTBOX_MAX_BACKOFF = config('EMAIL_OUTBOX_MAX_BACKOFF', default=30.0, cast=float)
+EMAIL_OUTBOX_CONNECT_TIMEOUT = config('EMAIL_OUTBOX_CONNECT_TIMEOUT', default=3.05, cast=float)
+EMAIL_OUTBOX_READ_TIMEOUT = config('EMAIL_OUTBOX_READ_TIMEOUT', default=10.0, cast=float)
+
+
+# session registry config
+# active device sessions live in redis, the RefreshToken table is written behind in batches
+SESSION_REGISTRY_MAX_DEVICES = config('SESSION_REGISTRY_MAX_DEVICES', default=3, cast=int)
+SESSION_REGISTRY_BATCH_SIZE = config('SESSION_REGISTRY_BATCH_SIZE', default=100, cast=int)
+SESSION_REGISTRY_MAX_QUEUE_SIZE = config('SESSION_REGISTRY_MAX_QUEUE_SIZE', default=10000, cast=int)
+
+
+# access token refresh config
+# concurrent requests refreshing the same expired access token share the first one minted for this many seconds
+ACCESS_TOKEN_COALESCE_TIMEOUT = config('ACCESS_TOKEN_COALESCE_TIMEOUT', default=10, cast=int)
+
+
+# async authentication config
+# ASYNC_AUTH_VIEWS serves login, mfa login and authentication from the async views ( authentication/async_views.py )
+# password checks in the async views run on a separate pool of PASSWORD_HASHING_WORKERS threads
+ASYNC_AUTH_VIEWS = config('ASYNC_AUTH_VIEWS', default=False, cast=bool)
+PASSWORD_HASHING_WORKERS = config('PASSWORD_HASHING_WORKERS', default=2, cast=int)
+
+
+# rate limiting config
+# sliding window limits per scope and dimension, ( requests, window in seconds )
+# the otp scope is shared by every view that emails an otp
+THROTTLE_ENABLED = config('THROTTLE_ENABLED', default=True, cast=bool)
+THROTTLE_RATES = {
+    'login': {'email': (10, 900), 'ip': (100, 900)},
+    'otp': {'email': (5, 3600), 'ip': (30, 3600), 'account': (5, 3600)},
+}
+
+# client ips are read from X-Forwarded-For, TRUSTED_PROXY_COUNT entries from the right ( the address the outermost
+# of our proxies appended ), 0 ignores the header
+TRUSTED_PROXY_COUNT = config('TRUSTED_PROXY_COUNT', default=1, cast=int)
+
+
+# user import config
+# bulk user imports are validated and inserted this many rows at a time
+USER_IMPORT_CHUNK_SIZE = config('USER_IMPORT_CHUNK_SIZE', default=500, cast=int)
+
+
+# billing config
+# principals are billed this much per student in their school every month
+BILLING_RATE_PER_STUDENT = config('BILLING_RATE_PER_STUDENT', default=20, cast=int)
+
+
+# compliance config
+# a school in arrears turns none compliant once a bill has been unpaid for this many days
+COMPLIANCE_GRACE_DAYS = config('COMPLIANCE_GRACE_DAYS', default=7, cast=int)
+
+
+# pagination config
+# list views return PAGINATION_PAGE_SIZE rows a page by default, clients can ask for up to PAGINATION_MAX_PAGE_SIZE
+PAGINATION_PAGE_SIZE = config('PAGINATION_PAGE_SIZE', default=50, cast=int)
+PAGINATION_MAX_PAGE_SIZE = config('PAGINATION_MAX_PAGE_SIZE', default=200, cast=int)
+
+
+# visibility index config
+# seconds a users cached profile visibility index ( users/visibility.py ) lives, changes invalidate it sooner
+VISIBILITY_INDEX_TIMEOUT = config('VISIBILITY_INDEX_TIMEOUT', default=3600, cast=int)
+
+
+# profile picture config
+# pictures are processed by PROFILE_PICTURE_WORKERS processes per worker ( users/pictures.py ), uploads over
+# PROFILE_PICTURE_MAX_SIZE bytes or PROFILE_PICTURE_MAX_PIXELS pixels are refused
+PROFILE_PICTURE_MAX_SIZE = config('PROFILE_PICTURE_MAX_SIZE', default=10 * 1024 * 1024, cast=int)
+PROFILE_PICTURE_MAX_PIXELS = config('PROFILE_PICTURE_MAX_PIXELS', default=40_000_000, cast=int)
+PROFILE_PICTURE_WORKERS = config('PROFILE_PICTURE_WORKERS', default=2, cast=int)
+PROFILE_PICTURE_TIMEOUT = config('PROFILE_PICTURE_TIMEOUT', default=30, cast=int)
+
+
+# user search config
+# searches return USER_SEARCH_LIMIT users unless the request asks for more, at most USER_SEARCH_MAX_LIMIT
+USER_SEARCH_LIMIT = config('USER_SEARCH_LIMIT', default=20, cast=int)
+USER_SEARCH_MAX_LIMIT = config('USER_SEARCH_MAX_LIMIT', default=50, cast=int)
+
+
+# user deletion config
+# deletions run in the background ( users/deletion.py, the run_deletion_jobs command ), DELETION_BATCH_SIZE rows per
+# transaction with DELETION_BATCH_PAUSE seconds between batches. a worker holds a job for DELETION_LEASE seconds
+# after its last batch, failed jobs are retried with a backoff until DELETION_MAX_ATTEMPTS
+DELETION_BATCH_SIZE = config('DELETION_BATCH_SIZE', default=500, cast=int)
+DELETION_BATCH_PAUSE = config('DELETION_BATCH_PAUSE', default=0.05, cast=float)
+DELETION_LEASE = config('DELETION_LEASE', default=300, cast=int)
+DELETION_MAX_ATTEMPTS = config('DELETION_MAX_ATTEMPTS', default=5, cast=int)
+
+
 
 """
     If your Redis server is using a self-signed certificate or a certificate from an internal CA, 
@@ -169,18 +283,57 @@ CACHES = {
 }
 
 
+# database pool config
+# each worker process keeps up to DB_POOL_MAX_SIZE connections per database open and hands them to requests
+# ( seeran_backend/db/pool.py ), requests wait up to DB_POOL_TIMEOUT seconds for one when they're all in use.
+# connections are recycled after DB_POOL_MAX_LIFETIME seconds and pinged before reuse when idle for DB_POOL_CHECK_AFTER seconds.
+# DB_POOL=False connects with the plain postgresql backend, a new connection per request
+DB_POOL = config('DB_POOL', default=True, cast=bool)
+DB_POOL_MAX_SIZE = config('DB_POOL_MAX_SIZE', default=10, cast=int)
+DB_POOL_TIMEOUT = config('DB_POOL_TIMEOUT', default=10, cast=float)
+DB_POOL_MAX_LIFETIME = config('DB_POOL_MAX_LIFETIME', default=1800, cast=float)
+DB_POOL_CHECK_AFTER = config('DB_POOL_CHECK_AFTER', default=30, cast=float)
+
+
 # postfres database
 # application database
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': 'seeran_backend.db' if DB_POOL else 'django.db.backends.postgresql',
         'NAME': config('DB_NAME'),
         'USER': config('DB_USER'),
         'PASSWORD': config('DB_PASSWORD'),
         'HOST': config('DB_ENDPOINT'),
         'PORT': '5432',
+        # connections go back to the pool at the end of every request
+        'CONN_MAX_AGE': 0,
+        'POOL': {
+            'MAX_SIZE': DB_POOL_MAX_SIZE,
+            'TIMEOUT': DB_POOL_TIMEOUT,
+            'MAX_LIFETIME': DB_POOL_MAX_LIFETIME,
+            'CHECK_AFTER': DB_POOL_CHECK_AFTER,
+        },
     }
 }
+
+# read replicas
+# DB_REPLICA_ENDPOINTS is a comma separated list of hosts streaming from the default database,
+# reads of safe requests are spread across them ( seeran_backend/routers.py )
+DB_REPLICA_ENDPOINTS = config('DB_REPLICA_ENDPOINTS', default='', cast=Csv())
+
+for number, endpoint in enumerate(DB_REPLICA_ENDPOINTS, start=1):
+    DATABASES[f'replica_{number}'] = {**DATABASES['default'], 'HOST': endpoint, 'TEST': {'MIRROR': 'default'}}
+
+REPLICA_DATABASES = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['seeran_backend.routers.ReplicaRouter']
+
+# clients read from the primary for this many seconds after they write, so they see their own changes
+READ_YOUR_WRITES_WINDOW = config('READ_YOUR_WRITES_WINDOW', default=5, cast=int)
+
+# replicas further behind than REPLICA_MAX_LAG seconds are skipped, lag is checked every REPLICA_LAG_CHECK_INTERVAL seconds
+REPLICA_MAX_LAG = config('REPLICA_MAX_LAG', default=5, cast=float)
+REPLICA_LAG_CHECK_INTERVAL = config('REPLICA_LAG_CHECK_INTERVAL', default=5, cast=float)
+
 # DATABASES = {
 #     'default': {
 #         'ENGINE': 'django.db.backends.sqlite3',
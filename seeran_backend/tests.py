@@ -0,0 +1,96 @@
+# python
+import time
+
+# django
+from django.db import router, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+# models
+from users.models import CustomUser
+
+# read replica routing
+from seeran_backend.routers import PRIMARY_COOKIE, replica_routing_middleware
+
+
+@override_settings(REPLICA_DATABASES=['replica'], READ_YOUR_WRITES_WINDOW=5)
+class ReplicaRoutingTests(SimpleTestCase):
+
+    databases = {'default'}
+
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def handle(self, request, view=None):
+
+        """
+            runs the request through the routing middleware, returns the response and where the views reads went
+        """
+
+        reads = []
+
+        def get_response(request):
+            if view is not None:
+                view()
+
+            reads.append(router.db_for_read(CustomUser))
+            return HttpResponse()
+
+        response = replica_routing_middleware(get_response)(request)
+        return response, reads[0]
+
+    def test_reads_go_to_the_replica(self):
+        response, read = self.handle(self.factory.get('/'))
+
+        self.assertEqual(read, 'replica')
+        self.assertNotIn(PRIMARY_COOKIE, response.cookies)
+
+    def test_reads_outside_requests_go_to_the_primary(self):
+        self.assertEqual(router.db_for_read(CustomUser), 'default')
+
+    def test_unsafe_requests_go_to_the_primary(self):
+        _, read = self.handle(self.factory.post('/'))
+        self.assertEqual(read, 'default')
+
+    def test_reads_after_a_write_go_to_the_primary(self):
+        response, read = self.handle(self.factory.get('/'), view=lambda: self.assertEqual(router.db_for_write(CustomUser), 'default'))
+
+        self.assertEqual(read, 'default')
+
+        # the client reads its own writes from the primary for a while
+        self.assertIn(PRIMARY_COOKIE, response.cookies)
+        self.assertAlmostEqual(float(response.cookies[PRIMARY_COOKIE].value), time.time() + 5, delta=1)
+
+    def test_reads_inside_a_transaction_go_to_the_primary(self):
+        def get_response(request):
+            with transaction.atomic():
+                reads.append(router.db_for_read(CustomUser))
+
+            reads.append(router.db_for_read(CustomUser))
+            return HttpResponse()
+
+        reads = []
+        replica_routing_middleware(get_response)(self.factory.get('/'))
+
+        self.assertEqual(reads, ['default', 'replica'])
+
+    def test_cookie_pins_reads_to_the_primary(self):
+        request = self.factory.get('/')
+        request.COOKIES[PRIMARY_COOKIE] = str(time.time() + 5)
+        _, read = self.handle(request)
+
+        self.assertEqual(read, 'default')
+
+        # once the window is over reads go back to the replica
+        request = self.factory.get('/')
+        request.COOKIES[PRIMARY_COOKIE] = str(time.time() - 1)
+        _, read = self.handle(request)
+
+        self.assertEqual(read, 'replica')
+
+    @override_settings(REPLICA_DATABASES=[])
+    def test_without_replicas_reads_go_to_the_primary(self):
+        response, read = self.handle(self.factory.get('/'), view=lambda: router.db_for_write(CustomUser))
+
+        self.assertEqual(read, 'default')
+        self.assertNotIn(PRIMARY_COOKIE, response.cookies)
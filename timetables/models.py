@@ -1,10 +1,10 @@
-# python 
-import uuid
-
 # django 
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 
+# public ids
+from seeran_backend.ids import generate_id
+
 # models
 from users.models import CustomUser
 from grades.models import Grade
@@ -47,22 +47,10 @@ class Schedule(models.Model):
     # schedule id creation handler
     def save(self, *args, **kwargs):
         if not self.schedule_id:
-            self.schedule_id = self.generate_unique_id('SC')
+            self.schedule_id = generate_id('SC')
 
         super(Schedule, self).save(*args, **kwargs)
 
-    @staticmethod
-    def generate_unique_id(prefix=''):
-     
-        max_attempts = 10
-      
-        for _ in range(max_attempts):
-            unique_part = uuid.uuid4().hex[:13]  # Take only the first 13 characters
-            id = f"{prefix}{unique_part}"
-            if not Schedule.objects.filter(schedule_id=id).exists():
-                return id
-        raise ValueError('failed to generate a unique schedule ID after 10 attempts, please try again later.')
-    
 
 class TeacherSchedule(models.Model):
     
@@ -82,7 +70,7 @@ class TeacherSchedule(models.Model):
     # schedule id creation handler
     def save(self, *args, **kwargs):
         if not self.teacher_schedule_id:
-            self.teacher_schedule_id = self.generate_unique_id('TS')
+            self.teacher_schedule_id = generate_id('TS')
 
         super(TeacherSchedule, self).save(*args, **kwargs)
 
@@ -99,18 +87,6 @@ class TeacherSchedule(models.Model):
         # Finally, delete the TeacherSchedule instance
         super(TeacherSchedule, self).delete(*args, **kwargs)
 
-    @staticmethod
-    def generate_unique_id(prefix=''):
-      
-        max_attempts = 10
-    
-        for _ in range(max_attempts):
-            unique_part = uuid.uuid4().hex[:13]  # Take only the first 13 characters
-            id = f"{prefix}{unique_part}"
-            if not TeacherSchedule.objects.filter(teacher_schedule_id=id).exists():
-                return id
-        raise ValueError('failed to generate a unique teacher schedule ID after 10 attempts, please try again later.')
-
 
 class GroupSchedule(models.Model):
     
@@ -133,7 +109,7 @@ class GroupSchedule(models.Model):
     # group schedule id creation handler
     def save(self, *args, **kwargs):
         if not self.group_schedule_id:
-            self.group_schedule_id = self.generate_unique_id('GS')
+            self.group_schedule_id = generate_id('GS')
 
         super(GroupSchedule, self).save(*args, **kwargs)
 
@@ -149,16 +125,3 @@ class GroupSchedule(models.Model):
         
         # Finally, delete the TeacherSchedule instance
         super(TeacherSchedule, self).delete(*args, **kwargs)
-
-    @staticmethod
-    def generate_unique_id(prefix=''):
-       
-        max_attempts = 10
-    
-        for _ in range(max_attempts):
-            unique_part = uuid.uuid4().hex[:13]  # Take only the first 13 characters
-            id = f"{prefix}{unique_part}"
-            if not GroupSchedule.objects.filter(group_schedule_id=id).exists():
-                return id
-        raise ValueError('failed to generate a unique group schedule ID after 10 attempts, please try again later.')
-
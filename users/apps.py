@@ -11,5 +11,10 @@ class UsersConfig(AppConfig):
         so it`s a good place to import your signal receivers
     """
 
-    # def ready(self):
-    #         import users.signals  # noqa
\ No newline at end of file
+    def ready(self):
+        import users.signals  # noqa
+
+        # the user search indexes, postgres only ( users/search.py )
+        from django.db.models.signals import post_migrate
+        from users.search import create_search_indexes
+        post_migrate.connect(create_search_indexes, sender=self)
\ No newline at end of file
@@ -0,0 +1,297 @@
+# python
+import logging
+import time
+from collections import namedtuple
+from datetime import timedelta
+
+# django
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+# models
+from users.models import CustomUser, DeletionJob
+from schools.models import School, SchoolPopulation, ComplianceAudit
+from grades.models import Grade, Subject
+from classes.models import Classroom
+from assessments.models import Assessment, Transcript
+from activities.models import Activity
+from bug_reports.models import BugReport
+from balances.models import Balance, Bill
+from chats.models import Chat, Message
+from timetables.models import GroupSchedule, TeacherSchedule
+from auth_tokens.models import RefreshToken
+
+# caches
+from authentication import principals
+from auth_tokens import revocation
+from schools import status as school_status
+
+# etag versions
+from users.versions import school_users_key, user_key
+from users import visibility
+from seeran_backend import etags
+
+# metrics
+from seeran_backend import metrics
+
+
+logger = logging.getLogger(__name__)
+
+
+"""
+    background deletion
+
+    deleting a user or a school with .delete() makes the collector load every related row into memory and holds the
+    locks of all of them for the whole request. instead:
+
+        1. request_user_deletion() / request_school_deletion() deactivate the target ( is_active, the principal
+           snapshot turns their sessions away ) and create a DeletionJob, in one short transaction
+        2. the run_deletion_jobs command claims jobs and works through STEPS in order, deleting at most
+           DELETION_BATCH_SIZE rows of a table per transaction, dependents first and the target itself last
+
+    the job records the step it's on and the rows deleted after every batch, in the batches transaction. a step only
+    ever deletes what's left of the target, so a job that was interrupted ( the worker died, a batch failed ) carries
+    on from its step. workers hold a lease on the job they run, a job whose lease ran out is picked up again.
+
+    classes taught and assessments set or moderated belong to the school, a user who still has any can't be deleted
+    ( the foreign keys don't cascade ), they have to be reassigned first. deleting the school deletes them.
+"""
+
+BATCH_SIZE = getattr(settings, 'DELETION_BATCH_SIZE', 500)
+BATCH_PAUSE = getattr(settings, 'DELETION_BATCH_PAUSE', 0.05)
+LEASE = getattr(settings, 'DELETION_LEASE', 300)
+MAX_ATTEMPTS = getattr(settings, 'DELETION_MAX_ATTEMPTS', 5)
+
+
+class DeletionError(Exception):
+    pass
+
+
+# user( pk ) and school( pk ) return the rows of the model the step deletes for a user or school job,
+# steps without one don't apply to that kind of job. after( pks ) runs once a batch is deleted
+Step = namedtuple('Step', ['name', 'model', 'user', 'school', 'after'], defaults=[None])
+
+
+# queryset deletes skip CustomUser.delete() and School.delete(), their caches are dropped here
+def _users_deleted(pks):
+    principals.invalidate_many(pks)
+
+
+def _school_deleted(pks):
+    for pk in pks:
+        school_status.invalidate(pk)
+
+
+STEPS = [
+    Step('sessions', RefreshToken, lambda pk: Q(user=pk), lambda pk: Q(user__school=pk)),
+    Step('activities', Activity, lambda pk: Q(recipient=pk) | Q(logger=pk), lambda pk: Q(school=pk) | Q(recipient__school=pk) | Q(logger__school=pk)),
+    Step('bug reports', BugReport, lambda pk: Q(user=pk), lambda pk: Q(user__school=pk)),
+    Step('transcripts', Transcript, lambda pk: Q(student=pk), lambda pk: Q(assessment__school=pk) | Q(student__school=pk)),
+    Step('assessed students', Assessment.students_assessed.through, lambda pk: Q(customuser=pk), lambda pk: Q(assessment__school=pk) | Q(customuser__school=pk)),
+    Step('assessments', Assessment, None, lambda pk: Q(school=pk) | Q(set_by__school=pk) | Q(moderator__school=pk)),
+    Step('class students', Classroom.students.through, lambda pk: Q(customuser=pk), lambda pk: Q(classroom__school=pk) | Q(customuser__school=pk)),
+    Step('class parents', Classroom.parents.through, lambda pk: Q(customuser=pk), lambda pk: Q(classroom__school=pk) | Q(customuser__school=pk)),
+    Step('classes', Classroom, None, lambda pk: Q(school=pk) | Q(teacher__school=pk)),
+    Step('messages', Message, lambda pk: Q(sent_by=pk), lambda pk: Q(sent_by__school=pk)),
+    Step('chats', Chat.participants.through, lambda pk: Q(customuser=pk), lambda pk: Q(customuser__school=pk)),
+    Step('group students', GroupSchedule.students.through, lambda pk: Q(customuser=pk), lambda pk: Q(customuser__school=pk)),
+    Step('group schedules', GroupSchedule, None, lambda pk: Q(grade__school=pk)),
+    Step('teacher schedules', TeacherSchedule, lambda pk: Q(teacher=pk), lambda pk: Q(teacher__school=pk)),
+    Step('children', CustomUser.children.through, lambda pk: Q(from_customuser=pk) | Q(to_customuser=pk), lambda pk: Q(from_customuser__school=pk) | Q(to_customuser__school=pk)),
+    Step('groups', CustomUser.groups.through, lambda pk: Q(customuser=pk), lambda pk: Q(customuser__school=pk)),
+    Step('permissions', CustomUser.user_permissions.through, lambda pk: Q(customuser=pk), lambda pk: Q(customuser__school=pk)),
+    Step('bills', Bill, lambda pk: Q(user=pk), lambda pk: Q(user__school=pk)),
+    Step('balances', Balance, lambda pk: Q(user=pk), lambda pk: Q(user__school=pk)),
+    Step('users', CustomUser, lambda pk: Q(pk=pk), lambda pk: Q(school=pk), _users_deleted),
+    Step('subjects', Subject, None, lambda pk: Q(grade__school=pk)),
+    Step('grades', Grade, None, lambda pk: Q(school=pk)),
+    Step('population', SchoolPopulation, None, lambda pk: Q(school=pk)),
+    Step('compliance audits', ComplianceAudit, None, lambda pk: Q(school=pk)),
+    Step('school', School, None, lambda pk: Q(pk=pk), _school_deleted),
+]
+
+
+def get_steps(target):
+    return [step for step in STEPS if (step.user if target == 'USER' else step.school) is not None]
+
+
+def _unfinished(target, target_id):
+    return DeletionJob.objects.filter(target=target, target_id=target_id, status__in=['PENDING', 'RUNNING']).first()
+
+
+def request_user_deletion(user_id, requested_by=None):
+
+    """
+        deactivates the user and queues their deletion, returns the DeletionJob ( the unfinished one if their
+        deletion was already requested ). raises DeletionError for users who still teach classes or own assessments
+    """
+
+    with transaction.atomic():
+        user = CustomUser.objects.select_for_update().get(pk=user_id)
+
+        job = _unfinished('USER', user.pk)
+        if job is not None:
+            return job
+
+        if user.taught_classes.exists() or Assessment.objects.filter(Q(set_by=user) | Q(moderator=user)).exists():
+            raise DeletionError('the user still has classes or assessments assigned to them, reassign them first')
+
+        # the save drops the principal snapshot and bumps the users etag versions
+        user.is_active = False
+        user.save(update_fields=['is_active'])
+
+        job = DeletionJob.objects.create(target='USER', target_id=user.pk, label=user.account_id, requested_by_id=requested_by)
+
+        transaction.on_commit(lambda: revocation.revoke_user(user.pk))
+
+    metrics.incr('deletion.requested.user')
+    return job
+
+
+def request_school_deletion(school_id, requested_by=None):
+
+    """
+        deactivates every user of the school and queues its deletion, returns the DeletionJob
+        ( the unfinished one if its deletion was already requested )
+    """
+
+    with transaction.atomic():
+        school = School.objects.select_for_update().get(pk=school_id)
+
+        job = _unfinished('SCHOOL', school.pk)
+        if job is not None:
+            return job
+
+        users = CustomUser.objects.filter(school=school, is_active=True)
+        accounts = list(users.values_list('pk', 'account_id'))
+        user_ids = [pk for pk, _ in accounts]
+
+        # users linked to the schools users ( parents ) see them through their visibility index
+        related = visibility.related_user_ids(user_ids=user_ids)
+
+        # one update for the whole school skips the signals, the snapshots, etag versions and visibility indexes
+        # are dropped by hand once it commits
+        users.update(is_active=False)
+
+        job = DeletionJob.objects.create(target='SCHOOL', target_id=school.pk, label=school.school_id, requested_by_id=requested_by)
+
+        transaction.on_commit(lambda: principals.invalidate_many(user_ids))
+        etags.bump(school_users_key(school.pk), *(user_key(account_id) for _, account_id in accounts))
+        visibility.invalidate(related)
+
+    metrics.incr('deletion.requested.school')
+    return job
+
+
+def claim_job():
+
+    """
+        leases the oldest job that's due to this worker, returns it or None if there isn't one
+    """
+
+    now = timezone.now()
+
+    with transaction.atomic():
+        job = (
+            DeletionJob.objects.select_for_update(skip_locked=True)
+            .filter(Q(leased_until__isnull=True) | Q(leased_until__lte=now), status__in=['PENDING', 'RUNNING'])
+            .order_by('created_at')
+            .first()
+        )
+
+        if job is None:
+            return None
+
+        job.status = 'RUNNING'
+        job.leased_until = now + timedelta(seconds=LEASE)
+        job.save(update_fields=['status', 'leased_until', 'updated_at'])
+
+    return job
+
+
+def _run_step(job, step, batch_size):
+    # deletes the steps rows a batch at a time until there are none left
+    query = (step.user if job.target == 'USER' else step.school)(job.target_id)
+
+    while True:
+        with transaction.atomic():
+            pks = list(step.model.objects.filter(query).values_list('pk', flat=True)[:batch_size])
+
+            # bounded, the collector only sees this batch ( and whatever cascades from it )
+            deleted = step.model.objects.filter(pk__in=pks).delete()[0] if pks else 0
+
+            job.step = step.name
+            job.deleted += deleted
+            job.leased_until = timezone.now() + timedelta(seconds=LEASE)
+            job.save(update_fields=['step', 'deleted', 'leased_until', 'updated_at'])
+
+        if pks and step.after is not None:
+            step.after(pks)
+
+        if deleted:
+            metrics.incr('deletion.rows', deleted)
+
+        if len(pks) < batch_size:
+            return
+
+        # leaves room for the requests waiting on the table
+        time.sleep(BATCH_PAUSE)
+
+
+def run_job(job, batch_size=BATCH_SIZE):
+
+    """
+        works through the jobs steps from the one it's on, returns True once the target is gone. a failed batch is
+        rolled back, the job is retried from its step after a backoff, until it has failed MAX_ATTEMPTS times. any
+        error fails the job this way ( a cache invalidation after a batch included ), not the worker
+    """
+
+    steps = get_steps(job.target)
+    names = [step.name for step in steps]
+    start = names.index(job.step) if job.step in names else 0
+
+    try:
+        with metrics.timed('deletion.job'):
+            for step in steps[start:]:
+                _run_step(job, step, batch_size)
+
+    except Exception as e:
+        logger.exception('deletion job %s failed on %s', job.job_id, job.step)
+
+        job.attempts += 1
+        job.error = str(e)[:1000]
+        job.status = 'FAILED' if job.attempts >= MAX_ATTEMPTS else 'PENDING'
+        job.leased_until = timezone.now() + timedelta(seconds=60 * 2 ** job.attempts)
+        job.save(update_fields=['attempts', 'error', 'status', 'leased_until', 'updated_at'])
+
+        metrics.incr('deletion.failed')
+        return False
+
+    job.status = 'DONE'
+    job.leased_until = None
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'leased_until', 'finished_at', 'updated_at'])
+
+    metrics.incr(f'deletion.done.{job.target.lower()}')
+    return True
+
+
+def run_pending(batch_size=BATCH_SIZE, limit=None):
+
+    """
+        runs due jobs until there are none left ( or limit have run ), returns the number that ran
+    """
+
+    ran = 0
+
+    while limit is None or ran < limit:
+        job = claim_job()
+        if job is None:
+            break
+
+        run_job(job, batch_size)
+        ran += 1
+
+    return ran
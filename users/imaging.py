@@ -0,0 +1,63 @@
+# python
+import os
+
+# pillow
+from PIL import Image, ImageOps
+
+
+"""
+    profile picture decoding and resizing
+
+    runs in the profile picture process pool ( users.pictures ), so it only imports pillow, not django.
+    every picture is decoded once, turned upright from its exif orientation and written as square webp and jpeg
+    variants. the variants are written from the pixels alone, so no exif ( camera, gps location ) is kept.
+"""
+
+FORMATS = (('webp', 'WEBP'), ('jpg', 'JPEG'))
+
+
+class InvalidImage(Exception):
+    pass
+
+
+def make_variants(path, output_dir, sizes, max_pixels):
+
+    """
+        decodes the image at path and writes <size>.webp and <size>.jpg to output_dir for every size,
+        returns [( size, extension, file path ), ...]. raises InvalidImage for files pillow can't read or
+        images over max_pixels
+    """
+
+    Image.MAX_IMAGE_PIXELS = max_pixels
+
+    try:
+        with Image.open(path) as image:
+            # decompression bombs are refused before the pixels are read
+            if image.width * image.height > max_pixels:
+                raise InvalidImage('the image is too large')
+
+            image = ImageOps.exif_transpose(image)
+            image = image.convert('RGB')
+
+    except InvalidImage:
+        raise
+
+    # pillow refuses images over twice MAX_IMAGE_PIXELS itself, when opening them
+    except Image.DecompressionBombError as e:
+        raise InvalidImage('the image is too large') from e
+
+    except (OSError, ValueError) as e:
+        raise InvalidImage('the uploaded file is not a valid image') from e
+
+    variants = []
+
+    for size in sorted(sizes, reverse=True):
+        # a square crop from the centre, the largest variant is resized from the original and every other from the one above it
+        image = ImageOps.fit(image, (size, size), Image.LANCZOS)
+
+        for extension, format in FORMATS:
+            variant_path = os.path.join(output_dir, f'{size}.{extension}')
+            image.save(variant_path, format=format, quality=85, optimize=format == 'JPEG')
+            variants.append((size, extension, variant_path))
+
+    return variants
@@ -0,0 +1,264 @@
+# python
+import codecs
+import csv
+import json
+from itertools import islice
+
+# django
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+
+# public ids
+from seeran_backend.ids import generate_ids
+
+# models
+from users.models import CustomUser
+from grades.models import Grade
+from balances.models import Balance
+
+# school population counters
+from schools import population
+
+# etag versions
+from users import versions
+
+
+"""
+    bulk user import
+
+    onboards a schools users from a csv or json upload in chunks of USER_IMPORT_CHUNK_SIZE rows. every chunk costs
+    a fixed number of queries whatever its size:
+        - one IN query for the emails and id numbers of the chunk that are already taken
+        - one bulk insert for the users and one for the balances of the students among them
+        - an update of the schools population counter for every role in the chunk
+
+    rows are validated like create_user validates them. a row whose email or id number already belongs to a user
+    of the same role in the school is skipped rather than reported, so re-uploading the same file is safe.
+
+    returns a report, { "created": n, "skipped": n, "errors": [ { "row": row number, "error": message }, .. ] }
+    row numbers count data rows from 1, the csv header isn't a row.
+"""
+
+ROLES = ['ADMIN', 'TEACHER', 'STUDENT', 'PARENT']
+
+FIELDS = ['name', 'surname', 'email', 'id_number', 'role', 'grade']
+
+
+def read_rows(file, format):
+
+    """
+        yields the rows of a binary file object as dicts, without reading the whole file into memory
+        ( csv and json lines ). a json document has to be a list of rows and is read at once
+    """
+
+    if format == 'csv':
+        # utf-8-sig drops the byte order mark spreadsheet programs put at the start of csv exports
+        try:
+            yield from csv.DictReader(codecs.iterdecode(file, 'utf-8-sig'))
+        except csv.Error as e:
+            raise ValueError(str(e))
+
+    elif format == 'jsonl':
+        for line in codecs.iterdecode(file, 'utf-8'):
+            if line.strip():
+                yield json.loads(line)
+
+    elif format == 'json':
+        rows = json.load(file)
+
+        if not isinstance(rows, list):
+            raise ValueError('a json upload must be a list of users')
+
+        yield from rows
+
+    else:
+        raise ValueError(f'unsupported file format {format}, expected csv, json or jsonl')
+
+
+def _clean(row):
+
+    """
+        returns the row with its values stripped and normalized, raises ValueError with the message for the report
+    """
+
+    if not isinstance(row, dict):
+        raise ValueError('row must be an object')
+
+    values = {field: str(row.get(field) or '').strip() for field in FIELDS}
+
+    values['role'] = values['role'].upper()
+    values['email'] = CustomUser.objects.normalize_email(values['email']) or None
+    values['id_number'] = values['id_number'] or None
+
+    if not values['role']:
+        raise ValueError('missing information')
+
+    if values['role'] not in ROLES:
+        raise ValueError('permission denied')
+
+    if not values['name'] or not values['surname']:
+        raise ValueError('missing information')
+
+    if len(values['name']) > 32 or len(values['surname']) > 32:
+        raise ValueError('name and surname can be at most 32 characters long')
+
+    if values['role'] == 'STUDENT':
+        if not values['id_number']:
+            raise ValueError('ID number is required for a student account')
+
+        if not values['grade']:
+            raise ValueError('student needs to be in an allocated grade')
+
+    elif not values['email']:
+        raise ValueError('missing information')
+
+    if values['email']:
+        try:
+            validate_email(values['email'])
+        except ValidationError:
+            raise ValueError('invalid email address')
+
+    if values['id_number'] and len(values['id_number']) > 13:
+        raise ValueError('ID number can be at most 13 characters long')
+
+    return values
+
+
+class UserImport:
+
+    """
+        imports rows into a school, call run() with an iterable of rows
+    """
+
+    def __init__(self, school, chunk_size=None):
+        self.school = school
+        self.chunk_size = chunk_size or settings.USER_IMPORT_CHUNK_SIZE
+
+        # the schools grades by their label ( '8', 'R', .. ), resolved once for the whole import
+        self.grades = {grade.grade: grade for grade in Grade.objects.filter(school=school)}
+
+        # emails and id numbers seen earlier in the upload, a file can't create the same user twice
+        self.seen_emails = set()
+        self.seen_id_numbers = set()
+
+        self.report = {'created': 0, 'skipped': 0, 'errors': []}
+
+    def run(self, rows):
+        rows = enumerate(rows, start=1)
+
+        while True:
+            chunk = list(islice(rows, self.chunk_size))
+            if not chunk:
+                self.report['errors'].sort(key=lambda error: error['row'])
+                return self.report
+
+            self._import_chunk(chunk)
+
+    def _error(self, number, message):
+        self.report['errors'].append({'row': number, 'error': message})
+
+    def _import_chunk(self, chunk):
+        cleaned = []
+
+        for number, row in chunk:
+            try:
+                values = _clean(row)
+
+            except ValueError as e:
+                self._error(number, str(e))
+                continue
+
+            if values['role'] == 'STUDENT' and values['grade'] not in self.grades:
+                self._error(number, f"grade {values['grade']} does not exist in the school")
+                continue
+
+            if values['email'] in self.seen_emails or values['id_number'] in self.seen_id_numbers:
+                self._error(number, 'duplicate of an earlier row in the upload')
+                continue
+
+            if values['email']:
+                self.seen_emails.add(values['email'])
+            if values['id_number']:
+                self.seen_id_numbers.add(values['id_number'])
+
+            cleaned.append((number, values))
+
+        if not cleaned:
+            return
+
+        try:
+            self._create(cleaned)
+
+        except IntegrityError:
+            # a concurrent upload or create_user took some of the rows after they were checked,
+            # checking again reports ( or skips ) those and creates the rest
+            self._create(cleaned)
+
+    def _existing(self, cleaned):
+        emails = [values['email'] for number, values in cleaned if values['email']]
+        id_numbers = [values['id_number'] for number, values in cleaned if values['id_number']]
+
+        taken = CustomUser.objects.filter(Q(email__in=emails) | Q(id_number__in=id_numbers)).values_list('email', 'id_number', 'school_id', 'role')
+
+        by_email, by_id_number = {}, {}
+        for email, id_number, school_id, role in taken:
+            if email:
+                by_email[email] = (school_id, role)
+            if id_number:
+                by_id_number[id_number] = (school_id, role)
+
+        return by_email, by_id_number
+
+    def _create(self, cleaned):
+        by_email, by_id_number = self._existing(cleaned)
+
+        users, skipped, errors = [], 0, []
+
+        for number, values in cleaned:
+            owners = {by_email.get(values['email']), by_id_number.get(values['id_number'])} - {None}
+
+            if owners == {(self.school.pk, values['role'])}:
+                # imported before
+                skipped += 1
+                continue
+
+            if owners:
+                errors.append((number, 'a user with the provided email or ID number already exists'))
+                continue
+
+            users.append(CustomUser(
+                name=values['name'], surname=values['surname'], email=values['email'], id_number=values['id_number'], role=values['role'],
+                school=self.school, grade=self.grades[values['grade']] if values['role'] == 'STUDENT' else None,
+            ))
+
+        for user, account_id in zip(users, generate_ids('UA', len(users))):
+            user.account_id = account_id
+
+        with transaction.atomic():
+            CustomUser.objects.bulk_create(users)
+
+            students = [user for user in users if user.role == 'STUDENT']
+            Balance.objects.bulk_create([Balance(user=user, balance_id=balance_id) for user, balance_id in zip(students, generate_ids('BL', len(students)))])
+
+            # bulk_create skips the signals that keep the population counters and the roster etag versions
+            population.adjust(population.count_changes(users))
+            versions.users_created({user.school_id for user in users})
+
+        # counted only once the chunk is in, a retried chunk is counted by the retry
+        self.report['created'] += len(users)
+        self.report['skipped'] += skipped
+
+        for number, message in errors:
+            self._error(number, message)
+
+
+def import_users(school, rows, chunk_size=None):
+
+    """
+        imports the rows into the school, returns the report
+    """
+
+    return UserImport(school, chunk_size).run(rows)
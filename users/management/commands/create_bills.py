@@ -1,25 +1,22 @@
+# python
+import json
+from datetime import date
+
+# django
 from django.core.management.base import BaseCommand
-from django.utils import timezone
-from users.models import CustomUser
-from balances.models import Bill
-from django.db import transaction
+
+# billing engine
+from balances.billing import run_billing
 
 
 class Command(BaseCommand):
-    help = 'Check for unpaid bills and create bills'
+    help = 'Bill principals whose billing date has come and flag schools with unpaid bills as in arrears'
 
-    def handle(self, *args, **options):
-        principals = CustomUser.objects.filter(role='PRINCIPAL').select_related('school')
-        for principal in principals:
-            unpaid_bills = Bill.objects.filter(user=principal, is_paid=False)
-            if unpaid_bills:
-                principal.school.in_arears = True
-            else:
-                principal.school.in_arears = False
-                if principal.balance.billing_date == timezone.now().date():
-                    num_students = CustomUser.objects.filter(role='STUDENT', school=principal.school).count()
-                    with transaction.atomic():
-                        Bill.objects.create(user=principal, amount=num_students * 20, date_billed=timezone.now().date())
-        principal.school.save()
+    def add_arguments(self, parser):
+        parser.add_argument('--date', type=date.fromisoformat, help='bill as of this date ( YYYY-MM-DD ), defaults to today')
+        parser.add_argument('--dry-run', action='store_true', help='report what would be billed without writing anything')
 
+    def handle(self, *args, **options):
+        report = run_billing(date=options['date'], dry_run=options['dry_run'])
 
+        self.stdout.write(json.dumps(report, indent=2))
@@ -0,0 +1,38 @@
+# python
+import json
+
+# django
+from django.core.management.base import BaseCommand, CommandError
+
+# models
+from schools.models import School
+
+# bulk user import
+from users.imports import import_users, read_rows
+
+
+class Command(BaseCommand):
+    help = 'Bulk import user accounts into a school from a csv, json or json lines file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('school_id', help='the public id of the school ( SA... )')
+        parser.add_argument('path', help='the file to import')
+        parser.add_argument('--format', choices=['csv', 'json', 'jsonl'], help='defaults to the files extension')
+        parser.add_argument('--chunk-size', type=int, help='rows validated and inserted at a time, defaults to USER_IMPORT_CHUNK_SIZE')
+
+    def handle(self, *args, **options):
+        try:
+            school = School.objects.get(school_id=options['school_id'])
+        except School.DoesNotExist:
+            raise CommandError(f"school {options['school_id']} does not exist")
+
+        format = options['format'] or options['path'].rsplit('.', 1)[-1].lower()
+
+        try:
+            with open(options['path'], 'rb') as file:
+                report = import_users(school, read_rows(file, format), chunk_size=options['chunk_size'])
+
+        except (OSError, ValueError, UnicodeDecodeError) as e:
+            raise CommandError(f'could not read {options["path"]}, {e}')
+
+        self.stdout.write(json.dumps(report, indent=2))
@@ -0,0 +1,30 @@
+# python
+import time
+
+# django
+from django.core.management.base import BaseCommand
+
+# background deletion
+from users.deletion import BATCH_SIZE, run_pending
+
+
+class Command(BaseCommand):
+    help = 'Delete the users and schools whose deletion was requested, in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='rows deleted per transaction')
+        parser.add_argument('--limit', type=int, help='run at most this many jobs')
+        parser.add_argument('--forever', action='store_true', help='keep polling for new jobs instead of exiting once none are due')
+        parser.add_argument('--interval', type=float, default=10, help='seconds between polls with --forever')
+
+    def handle(self, *args, **options):
+        while True:
+            ran = run_pending(batch_size=options['batch_size'], limit=options['limit'])
+
+            if ran or not options['forever']:
+                self.stdout.write(f'ran {ran} deletion jobs')
+
+            if not options['forever']:
+                return
+
+            time.sleep(options['interval'])
@@ -1,12 +1,12 @@
 # django imports
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
-from django.db import models
+from django.db import models, transaction
 from django.utils.translation import gettext_lazy as _
 from django.contrib.auth.password_validation import validate_password
 from django.core.exceptions import ValidationError
 
-# python 
-import uuid
+# public ids
+from seeran_backend.ids import generate_id
 
 # models
 from schools.models import School
@@ -14,6 +14,7 @@ from grades.models import Grade
 
 # utility functions
 from authentication.utils import get_upload_path, is_phone_number_valid
+from authentication import principals
 
 
 class CustomUserManager(BaseUserManager):
@@ -147,23 +148,112 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
         verbose_name = _('user')
         verbose_name_plural = _('users')
 
+        indexes = [
+            # a schools users by role, and students by grade ( users, students, the user import )
+            models.Index(fields=['school', 'role', 'grade'], name='user_school_role_grade_idx'),
+
+            # students per school and grade, and the student counts billing groups by school
+            models.Index(fields=['school', 'grade'], condition=models.Q(role='STUDENT'), name='user_student_school_grade_idx'),
+
+            # a schools principal ( billing, compliance, create_principal )
+            models.Index(fields=['school'], condition=models.Q(role='PRINCIPAL'), name='user_principal_school_idx'),
+        ]
+
     def __str__(self):
         return self.email if self.email else self.id_number
 
+    # remember the values the principal snapshot is built from so save() can tell if they changed
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+
+        # skip deferred loads ( .only()/.defer() ), reading a deferred field here would cost a query per row
+        if set(principals.SNAPSHOT_FIELDS).issubset(field_names):
+            instance._snapshot_values = instance.get_snapshot_values()
+
+        return instance
+
+    def get_snapshot_values(self):
+        return tuple(getattr(self, field) for field in principals.SNAPSHOT_FIELDS)
+
     # overwirte save method for account id generation
     def save(self, *args, **kwargs):
         if not self.account_id:
-            self.account_id = self.generate_unique_id('UA')
-
-        super(CustomUser, self).save(*args, **kwargs)
-
-    @staticmethod
-    def generate_unique_id(prefix=''):
-        max_attempts = 10
-        for _ in range(max_attempts):
-            unique_part = uuid.uuid4().hex[:13]  # Take only the first 13 characters
-            id = f"{prefix}{unique_part}"
-            if not CustomUser.objects.filter(account_id=id).exists():
-                return id
-        raise ValueError('failed to generate a unique account ID after 10 attempts, please try again later.')
-            
\ No newline at end of file
+            self.account_id = generate_id('UA')
+
+        # the school population counters are adjusted in post_save ( users.signals ), in the same transaction
+        with transaction.atomic():
+            super(CustomUser, self).save(*args, **kwargs)
+
+        # drop the cached principal snapshot if any of the fields it holds changed
+        # ( instances that weren't loaded with all of those fields are treated as changed ). dropped once the
+        # outermost transaction commits, a request reading the snapshot before then would cache the old one again
+        snapshot_values = self.get_snapshot_values()
+        if getattr(self, '_snapshot_values', None) != snapshot_values:
+            user_id = self.pk
+            transaction.on_commit(lambda: principals.invalidate(user_id))
+        self._snapshot_values = snapshot_values
+
+    def delete(self, *args, **kwargs):
+        user_id = self.pk
+        deleted = super(CustomUser, self).delete(*args, **kwargs)
+
+        transaction.on_commit(lambda: principals.invalidate(user_id))
+        return deleted
+
+
+class DeletionJob(models.Model):
+
+    # a user or school being deleted in the background ( users.deletion ). the target is deactivated when the job is
+    # created, the run_deletion_jobs command then deletes its rows in batches and records how far it got
+    job_id = models.CharField(max_length=15, unique=True)
+
+    TARGET_CHOICES = [ ('USER', 'User'), ('SCHOOL', 'School'), ]
+    target = models.CharField(_('target'), max_length=10, choices=TARGET_CHOICES)
+
+    # the targets pk, not a foreign key, the job outlives its target. label is its public id
+    target_id = models.BigIntegerField(_('target pk'))
+    label = models.CharField(_('target public id'), max_length=15)
+
+    requested_by = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, related_name='requested_deletions', null=True, blank=True)
+
+    STATUS_CHOICES = [ ('PENDING', 'Pending'), ('RUNNING', 'Running'), ('DONE', 'Done'), ('FAILED', 'Failed'), ]
+    status = models.CharField(_('status'), max_length=10, choices=STATUS_CHOICES, default='PENDING')
+
+    # progress, the step being worked through and the rows deleted so far
+    step = models.CharField(_('current step'), max_length=32, blank=True, default='')
+    deleted = models.BigIntegerField(_('rows deleted'), default=0)
+
+    # failed runs are retried after a backoff until DELETION_MAX_ATTEMPTS
+    attempts = models.IntegerField(_('failed attempts'), default=0)
+    error = models.TextField(_('last error'), blank=True, default='')
+
+    # a running job belongs to its worker until then, a pending job isn't picked up before then
+    leased_until = models.DateTimeField(_('leased until'), null=True, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = _('deletion job')
+        verbose_name_plural = _('deletion jobs')
+
+        indexes = [
+            # unfinished jobs for the workers
+            models.Index(fields=['leased_until'], condition=models.Q(status__in=['PENDING', 'RUNNING']), name='deletionjob_unfinished_idx'),
+        ]
+
+        constraints = [
+            # one unfinished job per target
+            models.UniqueConstraint(fields=['target', 'target_id'], condition=models.Q(status__in=['PENDING', 'RUNNING']), name='unique_unfinished_deletion_job'),
+        ]
+
+    def __str__(self):
+        return f'{self.target} {self.label} {self.status}'
+
+    def save(self, *args, **kwargs):
+        if not self.job_id:
+            self.job_id = generate_id('DJ')
+
+        super(DeletionJob, self).save(*args, **kwargs)
@@ -0,0 +1,278 @@
+# python
+import logging
+import multiprocessing
+import os
+import re
+import shutil
+import tempfile
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+# django
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+# models
+from users.models import CustomUser
+
+# picture processing, runs in the process pool
+from users.imaging import InvalidImage, make_variants
+
+# upload paths
+from authentication.utils import get_upload_path
+
+# metrics
+from seeran_backend import metrics
+
+
+logger = logging.getLogger(__name__)
+
+
+"""
+    profile picture pipeline
+
+        1. the upload is spooled to a file on disk ( uploads over FILE_UPLOAD_MAX_MEMORY_SIZE already are )
+        2. a process pool decodes it, strips the exif and writes square webp and jpeg variants of every size
+           in VARIANT_SIZES, off the request thread and the gil
+        3. the variants are streamed to storage from their files, under a new folder
+           ( <role folder>/<uuid>/<size>.<webp|jpg> )
+        4. a short transaction swaps the users profile_picture to the new folders largest jpeg, the previous
+           pictures files are deleted after it commits
+
+    no transaction is open while the image is processed or storage is written to. files written for a swap that
+    fails are deleted again.
+
+    a pool whose worker died ( killed for memory while decoding ) is broken for good, it's dropped and the next
+    picture starts a new one. the pictures that were on it fail with PictureUnavailable and can be uploaded again.
+    a running decode can't be cancelled, so a picture that takes longer than TIMEOUT has its pools workers stopped
+    and the pool dropped the same way, instead of leaving a worker busy for every later upload to queue behind.
+"""
+
+VARIANT_SIZES = (64, 256, 512)
+
+# the sizes the serializers serve, lists get the small one
+SMALL = 64
+MEDIUM = 256
+
+DEFAULT_IMAGE = '/default-user-image.svg'
+
+# names written by the pipeline, anything else is a picture from before it and has no variants
+PICTURE_NAME = re.compile(r'^(?P<folder>.+/[0-9a-f]{32})/(?P<size>\d+)\.jpg$')
+
+MAX_SIZE = getattr(settings, 'PROFILE_PICTURE_MAX_SIZE', 10 * 1024 * 1024)
+MAX_PIXELS = getattr(settings, 'PROFILE_PICTURE_MAX_PIXELS', 40_000_000)
+WORKERS = getattr(settings, 'PROFILE_PICTURE_WORKERS', 2)
+TIMEOUT = getattr(settings, 'PROFILE_PICTURE_TIMEOUT', 30)
+
+
+class PictureError(Exception):
+    pass
+
+
+class PictureUnavailable(PictureError):
+    # the pool failed while the picture was on it, not the picture, the upload can be retried
+    pass
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                # spawned, not forked, the web workers are multi threaded. workers are replaced every 100
+                # pictures so pillows memory doesn't pile up
+                _executor = ProcessPoolExecutor(max_workers=WORKERS, mp_context=multiprocessing.get_context('spawn'), max_tasks_per_child=100)
+
+    return _executor
+
+
+def _discard(executor, stop_workers=False):
+    global _executor
+
+    # only the pool that failed, another thread may already have replaced it
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+
+    if stop_workers:
+        # the executor has no api to stop a running task, its processes are terminated instead
+        for process in list((getattr(executor, '_processes', None) or {}).values()):
+            process.terminate()
+
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _reset():
+    global _executor
+    # forked workers start their own pool
+    _executor = None
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset)
+
+
+def variant_name(name, size, extension='webp'):
+
+    """
+        the storage name of a variant of the picture stored as name, or None for pictures from before the pipeline
+    """
+
+    match = PICTURE_NAME.match(name or '')
+    if match is None:
+        return None
+
+    return f"{match.group('folder')}/{size}.{extension}"
+
+
+def picture_url(user, size=MEDIUM, extension='webp'):
+
+    """
+        the url of the users picture at size, the default image if they don't have one
+    """
+
+    name = user.profile_picture.name if user.profile_picture else None
+    if not name:
+        return DEFAULT_IMAGE
+
+    return default_storage.url(variant_name(name, size, extension) or name)
+
+
+def _spool(upload, directory):
+    # uploads kept in memory are written out, the pool reads the picture from a file
+    if hasattr(upload, 'temporary_file_path'):
+        return upload.temporary_file_path()
+
+    path = os.path.join(directory, 'upload')
+    with open(path, 'wb') as file:
+        for chunk in upload.chunks():
+            file.write(chunk)
+
+    return path
+
+
+def _picture_names(name):
+    # every file of a stored picture
+    if not name:
+        return []
+
+    match = PICTURE_NAME.match(name)
+    if match is None:
+        return [name]
+
+    return [f"{match.group('folder')}/{size}.{extension}" for size in VARIANT_SIZES for extension in ('webp', 'jpg')]
+
+
+def _delete(names):
+    for name in names:
+        try:
+            default_storage.delete(name)
+        except Exception:
+            logger.exception('could not delete the profile picture file %s', name)
+
+
+def _swap(user_id, name):
+
+    """
+        points the user at the new picture in one short transaction, the old pictures files go once it commits
+    """
+
+    with transaction.atomic():
+        user = CustomUser.objects.select_for_update().get(pk=user_id)
+        old_names = _picture_names(user.profile_picture.name)
+
+        user.profile_picture.name = name
+        user.save(update_fields=['profile_picture'])
+
+        transaction.on_commit(lambda: _delete(old_names))
+
+    return user
+
+
+def update_picture(user_id, upload):
+
+    """
+        runs an uploaded picture through the pipeline and makes it the users profile picture,
+        returns the updated user. raises PictureError for uploads that aren't a usable image
+    """
+
+    if upload.size > MAX_SIZE:
+        raise PictureError(f'the picture can be at most {MAX_SIZE // (1024 * 1024)} MB')
+
+    user = CustomUser.objects.only('pk', 'role').get(pk=user_id)
+    folder = os.path.dirname(get_upload_path(user, 'picture'))
+    folder = f'{folder}/{uuid.uuid4().hex}'
+
+    directory = tempfile.mkdtemp(prefix='profile-picture-', dir=getattr(settings, 'FILE_UPLOAD_TEMP_DIR', None))
+    stored = []
+
+    try:
+        path = _spool(upload, directory)
+
+        with metrics.timed('pictures.process'):
+            executor = _get_executor()
+
+            try:
+                future = executor.submit(make_variants, path, directory, VARIANT_SIZES, MAX_PIXELS)
+                variants = future.result(timeout=TIMEOUT)
+            except InvalidImage as e:
+                raise PictureError(str(e))
+            except BrokenProcessPool:
+                logger.exception('the profile picture pool broke, starting a new one')
+                metrics.incr('pictures.pool_broken')
+                _discard(executor)
+                raise PictureUnavailable('the picture could not be processed right now, please try again')
+            except FutureTimeout:
+                logger.warning('a profile picture took over %ss to process, starting a new pool', TIMEOUT)
+                metrics.incr('pictures.timed_out')
+                _discard(executor, stop_workers=True)
+                raise PictureError('the picture took too long to process')
+
+        # streamed from the files in chunks, the variants are never read into memory whole
+        with metrics.timed('pictures.store'):
+            for size, extension, variant_path in variants:
+                with open(variant_path, 'rb') as file:
+                    stored.append(default_storage.save(f'{folder}/{size}.{extension}', File(file)))
+
+        user = _swap(user_id, f'{folder}/{max(VARIANT_SIZES)}.jpg')
+        stored = []
+
+        metrics.incr('pictures.updated')
+        return user
+
+    finally:
+        # files of a picture that never became the users are removed again
+        _delete(stored)
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def remove_picture(user_id):
+
+    """
+        clears the users profile picture, returns the updated user or None if they didn't have one
+    """
+
+    with transaction.atomic():
+        user = CustomUser.objects.select_for_update().get(pk=user_id)
+
+        if not user.profile_picture:
+            return None
+
+        old_names = _picture_names(user.profile_picture.name)
+
+        user.profile_picture = None
+        user.save(update_fields=['profile_picture'])
+
+        transaction.on_commit(lambda: _delete(old_names))
+
+    return user
@@ -0,0 +1,163 @@
+# python
+import logging
+
+# django
+from django.conf import settings
+from django.db import DatabaseError, connections
+from django.db.models import BooleanField, Case, FloatField, Func, IntegerField, Q, Value, When
+from django.db.models.functions import Greatest, Lower
+
+# models
+from users.models import CustomUser
+
+
+logger = logging.getLogger(__name__)
+
+
+"""
+    user search
+
+    finds a schools users by name, surname, account id or id number for the admin dashboards typeahead:
+        - every word of the query is a prefix of the users name or surname ( "jo sm" finds John Smith )
+        - the query is the users account id or id number, or the start of one
+        - on postgres, names within pg_trgm similarity of the query ( typos, "jonh" finds John )
+    results are ranked exact id match, name prefix, id prefix, then similar names ( most similar first ), and capped
+    at a limit, so a keystroke costs one small query.
+
+    on postgres create_search_indexes() adds ( after every migrate ) trigram gin indexes over lower( name ) and
+    lower( surname ), and btree prefix indexes over ( school, role, lower( name | surname ) ). on sqlite, for local
+    testing, similar names fall back to names containing the words of the query.
+"""
+
+LIMIT = getattr(settings, 'USER_SEARCH_LIMIT', 20)
+MAX_LIMIT = getattr(settings, 'USER_SEARCH_MAX_LIMIT', 50)
+
+# queries shorter than this only match prefixes, trigrams of one or two letters match almost everything
+FUZZY_MIN_LENGTH = 3
+
+SEARCH_INDEXES = [
+    'CREATE INDEX IF NOT EXISTS user_name_trgm_idx ON users_customuser USING gin (lower(name) gin_trgm_ops)',
+    'CREATE INDEX IF NOT EXISTS user_surname_trgm_idx ON users_customuser USING gin (lower(surname) gin_trgm_ops)',
+    'CREATE INDEX IF NOT EXISTS user_school_role_name_prefix_idx ON users_customuser (school_id, role, lower(name) text_pattern_ops)',
+    'CREATE INDEX IF NOT EXISTS user_school_role_surname_prefix_idx ON users_customuser (school_id, role, lower(surname) text_pattern_ops)',
+]
+
+# database alias -> pg_trgm is installed
+_trigrams = {}
+
+
+class TrigramMatch(Func):
+    # lhs % rhs, true when the two are more similar than pg_trgm.similarity_threshold, served by the trigram indexes
+    arg_joiner = ' %% '
+    template = '(%(expressions)s)'
+    output_field = BooleanField()
+
+
+class Similarity(Func):
+    function = 'SIMILARITY'
+    output_field = FloatField()
+
+
+def has_trigrams(using='default'):
+    if using not in _trigrams:
+        connection = connections[using]
+
+        if connection.vendor != 'postgresql':
+            _trigrams[using] = False
+
+        else:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT EXISTS ( SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm' )")
+                _trigrams[using] = cursor.fetchone()[0]
+
+    return _trigrams[using]
+
+
+def create_search_indexes(using='default', verbosity=1, **kwargs):
+
+    """
+        installs pg_trgm and creates the search indexes on postgres, nothing on other databases.
+        connected to post_migrate, the project has no committed migrations to create them in
+    """
+
+    connection = connections[using]
+
+    if connection.vendor != 'postgresql':
+        return
+
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+
+            for statement in SEARCH_INDEXES:
+                cursor.execute(statement)
+
+    except DatabaseError as e:
+        # without the extension searches only match prefixes
+        logger.warning('user search indexes could not be created: %s', e)
+
+    _trigrams.pop(using, None)
+
+
+def _normalize_id(query):
+    # account ids are an upper case prefix and lower case base36
+    return query[:2].upper() + query[2:].lower()
+
+
+def search_users(school_id, query, roles=None, limit=None):
+
+    """
+        returns up to limit of the schools users ( of roles ) matching query, best matches first
+    """
+
+    limit = max(1, min(limit or LIMIT, MAX_LIMIT))
+    query = ' '.join(query.split())[:100]
+
+    if not query:
+        return []
+
+    lowered = query.lower()
+    words = lowered.split(' ')[:4]
+    account_id = _normalize_id(query)
+
+    users = CustomUser.objects.filter(school_id=school_id, is_active=True).exclude(role='FOUNDER')
+    if roles:
+        users = users.filter(role__in=roles)
+
+    users = users.annotate(name_lower=Lower('name'), surname_lower=Lower('surname'))
+
+    name_prefix = Q()
+    for word in words:
+        name_prefix &= Q(name_lower__startswith=word) | Q(surname_lower__startswith=word)
+
+    exact_id = Q(account_id=account_id) | Q(id_number=query)
+    id_prefix = Q(account_id__startswith=account_id) | Q(id_number__startswith=query)
+
+    matches = name_prefix | id_prefix
+    similarity = Value(0.0)
+
+    if len(lowered) >= FUZZY_MIN_LENGTH:
+        if has_trigrams(users.db):
+            matches |= Q(TrigramMatch(Lower('name'), Value(lowered))) | Q(TrigramMatch(Lower('surname'), Value(lowered)))
+            similarity = Greatest(Similarity(Lower('name'), Value(lowered)), Similarity(Lower('surname'), Value(lowered)))
+
+        else:
+            contains = Q()
+            for word in words:
+                contains &= Q(name_lower__contains=word) | Q(surname_lower__contains=word)
+            matches |= contains
+
+    return list(
+        users.filter(matches)
+        .annotate(
+            rank=Case(
+                When(exact_id, then=Value(3)),
+                When(name_prefix, then=Value(2)),
+                When(id_prefix, then=Value(1)),
+                default=Value(0),
+                output_field=IntegerField(),
+            ),
+            similarity=similarity,
+        )
+        .order_by('-rank', '-similarity', 'surname', 'name', 'pk')[:limit]
+    )
@@ -8,7 +8,10 @@ from django.core.cache import cache
 from rest_framework import serializers
 
 # models
-from .models import CustomUser
+from .models import CustomUser, DeletionJob
+
+# profile picture variants
+from users import pictures
 
 
 
@@ -49,8 +52,7 @@ class ProfileSerializer(serializers.ModelSerializer):
         return obj.role.title()
             
     def get_image(self, obj):
-      
-        return '/default-user-image.svg'
+        return pictures.picture_url(obj, pictures.MEDIUM)
     
 
 # user profile
@@ -63,8 +65,7 @@ class ProfilePictureSerializer(serializers.ModelSerializer):
         fields = [ 'image' ]
             
     def get_image(self, obj):
-      
-        return '/default-user-image.svg'
+        return pictures.picture_url(obj, pictures.MEDIUM)
 
 
 ###################################################################################################
@@ -115,6 +116,12 @@ class UsersSerializer(serializers.ModelSerializer):
         return obj.account_id
             
     def get_image(self, obj):
-      
-        return '/default-user-image.svg'
+        return pictures.picture_url(obj, pictures.SMALL)
+
 
+# deletion job progress
+class DeletionJobSerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = DeletionJob
+        fields = [ 'job_id', 'target', 'label', 'status', 'step', 'deleted', 'attempts', 'created_at', 'finished_at' ]
@@ -0,0 +1,126 @@
+# django
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, m2m_changed
+from django.dispatch import receiver
+
+# models
+from users.models import CustomUser
+from classes.models import Classroom
+
+# school population counters
+from schools import population
+
+# profile visibility index
+from users import visibility
+
+# etag versions
+from users import versions
+
+
+"""
+    keeps the school population counters ( schools.population ) in step with the users table.
+    CustomUser.save() runs in a transaction, so a counter change commits or rolls back with the user it counts.
+
+    also drops the cached visibility indexes ( users.visibility ) that class, enrolment and parent child link
+    changes affect, and bumps the etag versions ( users.versions ) of changed users and their schools.
+"""
+
+
+@receiver(pre_save, sender=CustomUser)
+def remember_population(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+
+    if instance._state.adding:
+        instance._population_before = None
+
+    # role and school as loaded, from the values from_db kept for the principal snapshot when they're there
+    elif hasattr(instance, '_snapshot_values'):
+        role, school_id = instance._snapshot_values[:2]
+        instance._population_before = (school_id, role)
+
+    else:
+        instance._population_before = CustomUser.objects.filter(pk=instance.pk).values_list('school_id', 'role').first()
+
+
+@receiver(post_save, sender=CustomUser)
+def count_saved_user(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+
+    before = getattr(instance, '_population_before', None)
+    after = (instance.school_id, instance.role)
+
+    # any change to the user can change their profile and their schools rosters
+    versions.user_changed(instance.account_id, instance.school_id, before[0] if before else None)
+
+    if before == after:
+        return
+
+    changes = {after: 1}
+    if before is not None:
+        changes[before] = -1
+
+    population.adjust(changes)
+
+    # the indexes of linked users depend on this users role ( and for parents, their childrens schools )
+    if before is not None:
+        visibility.invalidate(visibility.related_user_ids(user_ids=[instance.pk]))
+
+
+@receiver(post_delete, sender=CustomUser)
+def count_deleted_user(sender, instance, **kwargs):
+    population.adjust({(instance.school_id, instance.role): -1})
+    versions.user_changed(instance.account_id, instance.school_id)
+
+
+@receiver(m2m_changed, sender=CustomUser.children.through)
+def children_changed(sender, instance, action, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+
+    # the link is symmetrical, both sides are affected
+    if action == 'pre_clear':
+        visibility.invalidate(visibility.related_user_ids(user_ids=[instance.pk]))
+    else:
+        visibility.invalidate([instance.pk, *pk_set])
+
+
+@receiver(m2m_changed, sender=Classroom.students.through)
+@receiver(m2m_changed, sender=Classroom.parents.through)
+def enrolments_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+
+    # reverse changes come from the users side ( user.enrolled_classes.add(..) ), pk_set holds classrooms
+    if reverse:
+        classroom_ids = pk_set if pk_set is not None else sender.objects.filter(customuser=instance.pk).values_list('classroom_id', flat=True)
+        user_ids = [instance.pk]
+    else:
+        classroom_ids = [instance.pk]
+        user_ids = pk_set or []
+
+    # removed users aren't members any more, so they're passed in along with the classes
+    visibility.invalidate(visibility.related_user_ids(classroom_ids, user_ids))
+
+
+@receiver(pre_save, sender=Classroom)
+def classroom_changing(sender, instance, raw=False, **kwargs):
+    # covers the teacher the class is taken from, the new one is dropped after the save
+    if raw or instance._state.adding:
+        return
+
+    visibility.invalidate(visibility.related_user_ids([instance.pk]))
+
+
+@receiver(post_save, sender=Classroom)
+def classroom_changed(sender, instance, created, raw=False, **kwargs):
+    if raw or created:
+        return
+
+    visibility.invalidate([instance.teacher_id])
+
+
+@receiver(pre_delete, sender=Classroom)
+def classroom_deleting(sender, instance, **kwargs):
+    # the enrolments are deleted without m2m_changed signals
+    visibility.invalidate(visibility.related_user_ids([instance.pk]))
@@ -1,3 +1,499 @@
-from django.test import TestCase
+# python
+import io
+import os
+import shutil
+import signal
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+# pillow
+from PIL import Image
+
+# django
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DatabaseError
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db.models import Count, Q
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+# in-process caches
+from seeran_backend.caching import clear_local_caches
+
+# models
+from users.models import CustomUser, DeletionJob
+from schools.models import School, SchoolPopulation
+from grades.models import Grade
+from classes.models import Classroom
+from assessments.models import Assessment, Transcript
+from activities.models import Activity
+from balances.models import Balance
+
+# user search
+from users.search import search_users
+
+# background deletion
+from users import deletion, visibility
+from users.versions import user_key
+
+# etags
+from seeran_backend import etags
+
+# profile pictures
+from users import pictures
+from users.imaging import InvalidImage, make_variants
+
+# utility functions
+from authentication.utils import generate_token
+
+# query plans
+from seeran_backend.db.plans import QueryPlanMixin
+
+
+class UserQueryPlanTests(QueryPlanMixin, TestCase):
+
+    def setUp(self):
+        cache.clear()
+        clear_local_caches()
+
+        self.school = School.objects.create(name='school', email='school@example.com', contact_number='0110000000')
+        self.grade = Grade.objects.create(grade='8', school=self.school)
+        self.admin = CustomUser.objects.create(email='admin@example.com', name='ann', surname='admin', role='ADMIN', school=self.school)
+
+    def test_rosters_use_an_index(self):
+        self.assertUsesIndex(CustomUser.objects.filter(Q(role='ADMIN') | Q(role='PRINCIPAL'), school=self.school).exclude(account_id=self.admin.account_id), 'user_school_role_grade_idx')
+        self.assertUsesIndex(CustomUser.objects.filter(role='TEACHER', school=self.school), 'user_school_role_grade_idx')
+        self.assertUsesIndex(CustomUser.objects.filter(role='STUDENT', school=self.school, grade=self.grade), 'user_student_school_grade_idx', 'user_school_role_grade_idx')
+
+    def test_school_principal_uses_an_index(self):
+        self.assertUsesIndex(CustomUser.objects.filter(school=self.school, role='PRINCIPAL'), 'user_principal_school_idx', 'user_school_role_grade_idx')
+
+    def test_billing_student_counts_use_an_index(self):
+        self.assertUsesIndex(CustomUser.objects.filter(role='STUDENT', school__isnull=False).values('school_id').annotate(students=Count('pk')), 'user_student_school_grade_idx', 'user_school_role_grade_idx')
+
+
+class RosterQueryTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        clear_local_caches()
+
+        self.school = School.objects.create(name='school', email='school@example.com', contact_number='0110000000')
+        self.grade = Grade.objects.create(grade='8', school=self.school)
+        self.admin = CustomUser.objects.create(email='admin@example.com', name='ann', surname='admin', role='ADMIN', school=self.school)
+
+        for number in range(10):
+            CustomUser.objects.create(email=f'teacher{number}@example.com', name='tom', surname=f'teacher {number}', role='TEACHER', school=self.school)
+            CustomUser.objects.create(id_number=f'0000000000{number:03d}', name='sam', surname=f'student {number}', role='STUDENT', school=self.school, grade=self.grade)
+
+        self.client.cookies['refresh_token'] = generate_token(self.admin)['refresh_token']
+
+    def assertRosterQueries(self, path, count):
+        # warms the admins principal snapshot and the rosters etag version
+        self.client.get(path)
+
+        with self.assertNumQueries(count):
+            response = self.client.get(path)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.json()['users']), 10)
+
+    def test_teachers_roster(self):
+        # a page of teachers
+        self.assertRosterQueries('/api/usrs/users/TEACHER/', 1)
+
+    def test_students_roster(self):
+        # a page of students
+        self.assertRosterQueries(f'/api/usrs/students/{self.grade.pk}/', 1)
+
+
+def image_bytes(size=(800, 600), format='PNG'):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, (200, 40, 40)).save(buffer, format=format)
+    return buffer.getvalue()
+
+
+class MakeVariantsTests(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def write(self, data):
+        path = os.path.join(self.directory, 'upload')
+        with open(path, 'wb') as file:
+            file.write(data)
+
+        return path
+
+    def test_writes_square_webp_and_jpeg_variants(self):
+        variants = make_variants(self.write(image_bytes()), self.directory, (64, 256, 512), 40_000_000)
+
+        self.assertEqual(sorted((size, extension) for size, extension, _ in variants), [(size, extension) for size in (64, 256, 512) for extension in ('jpg', 'webp')])
+
+        for size, extension, path in variants:
+            with Image.open(path) as image:
+                self.assertEqual(image.size, (size, size))
+                self.assertEqual(image.format, 'WEBP' if extension == 'webp' else 'JPEG')
+
+    def test_rejects_files_that_are_not_images(self):
+        with self.assertRaisesMessage(InvalidImage, 'not a valid image'):
+            make_variants(self.write(b'not an image at all'), self.directory, (64,), 40_000_000)
+
+    def test_rejects_images_over_the_pixel_limit(self):
+        # refused by our check, and by pillow itself past twice the limit
+        for max_pixels in (400_000, 100_000):
+            with self.assertRaisesMessage(InvalidImage, 'too large'):
+                make_variants(self.write(image_bytes((800, 600))), self.directory, (64,), max_pixels)
+
+
+class UpdatePictureTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        clear_local_caches()
+
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+
+        storage = override_settings(MEDIA_ROOT=media_root, STORAGES={'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'}, 'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'}})
+        storage.enable()
+        self.addCleanup(storage.disable)
+
+        self.user = CustomUser.objects.create(email='teacher@example.com', name='tom', surname='teacher', role='TEACHER')
+
+    def upload(self, data=None):
+        return SimpleUploadedFile('picture.png', data if data is not None else image_bytes(), content_type='image/png')
+
+    def stored(self, folder):
+        return sorted(default_storage.listdir(folder)[1]) if default_storage.exists(folder) else []
+
+    def test_stores_every_variant_and_points_the_user_at_the_largest_jpeg(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            user = pictures.update_picture(self.user.pk, self.upload())
+
+        folder, name = user.profile_picture.name.rsplit('/', 1)
+
+        self.assertTrue(folder.startswith('teachers_profile_pictures/'))
+        self.assertEqual(name, '512.jpg')
+        self.assertEqual(self.stored(folder), sorted(f'{size}.{extension}' for size in (64, 256, 512) for extension in ('jpg', 'webp')))
+        self.assertEqual(pictures.picture_url(user, pictures.SMALL), default_storage.url(f'{folder}/64.webp'))
+
+    def test_swap_removes_the_old_variants(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            old_folder = pictures.update_picture(self.user.pk, self.upload()).profile_picture.name.rsplit('/', 1)[0]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            new_folder = pictures.update_picture(self.user.pk, self.upload(image_bytes((300, 900)))).profile_picture.name.rsplit('/', 1)[0]
+
+        self.assertNotEqual(old_folder, new_folder)
+        self.assertEqual(self.stored(old_folder), [])
+        self.assertEqual(len(self.stored(new_folder)), 6)
+
+    def test_remove_picture_deletes_the_variants(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            folder = pictures.update_picture(self.user.pk, self.upload()).profile_picture.name.rsplit('/', 1)[0]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            user = pictures.remove_picture(self.user.pk)
+
+        self.assertFalse(user.profile_picture)
+        self.assertEqual(self.stored(folder), [])
+        self.assertEqual(pictures.picture_url(user), pictures.DEFAULT_IMAGE)
+
+    def test_rejects_files_that_are_not_images(self):
+        with self.assertRaisesMessage(pictures.PictureError, 'not a valid image'):
+            pictures.update_picture(self.user.pk, self.upload(b'not an image at all'))
+
+        self.assertFalse(CustomUser.objects.get(pk=self.user.pk).profile_picture)
+        self.assertEqual(self.stored('teachers_profile_pictures'), [])
+
+    def test_rejects_images_over_the_pixel_limit(self):
+        with mock.patch.object(pictures, 'MAX_PIXELS', 100_000), self.assertRaisesMessage(pictures.PictureError, 'too large'):
+            pictures.update_picture(self.user.pk, self.upload())
+
+    def test_rejects_uploads_over_the_size_limit(self):
+        with mock.patch.object(pictures, 'MAX_SIZE', 1024), self.assertRaises(pictures.PictureError):
+            pictures.update_picture(self.user.pk, self.upload())
+
+    def test_a_timed_out_picture_frees_its_worker(self):
+        executor = pictures._get_executor()
+        executor.submit(os.getpid).result(timeout=30)
+        workers = list(executor._processes.values())
+
+        with mock.patch.object(pictures, 'TIMEOUT', 0.001), self.assertRaisesMessage(pictures.PictureError, 'too long'), self.assertLogs('users.pictures', 'WARNING'):
+            pictures.update_picture(self.user.pk, self.upload(image_bytes((4000, 3000))))
+
+        for worker in workers:
+            worker.join(timeout=10)
+            self.assertFalse(worker.is_alive())
+
+        self.assertIsNot(pictures._get_executor(), executor)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            user = pictures.update_picture(self.user.pk, self.upload())
+
+        self.assertEqual(user.profile_picture.name.rsplit('/', 1)[1], '512.jpg')
+
+    def test_a_broken_pool_is_replaced(self):
+        executor = pictures._get_executor()
+        executor.submit(os.getpid).result(timeout=30)
+
+        # the workers die ( killed for memory ), which breaks the pool
+        for process in list(executor._processes.values()):
+            os.kill(process.pid, signal.SIGKILL)
+
+        with self.assertRaises(pictures.PictureUnavailable), self.assertLogs('users.pictures', 'ERROR'):
+            pictures.update_picture(self.user.pk, self.upload())
+
+        self.assertIsNot(pictures._get_executor(), executor)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            user = pictures.update_picture(self.user.pk, self.upload())
+
+        self.assertEqual(user.profile_picture.name.rsplit('/', 1)[1], '512.jpg')
+
+
+class SearchUsersTests(TestCase):
+
+    def setUp(self):
+        self.school = School.objects.create(name='school', email='school@example.com', contact_number='0110000000')
+        self.other_school = School.objects.create(name='other school', email='other@example.com', contact_number='0110000000')
+        self.grade = Grade.objects.create(grade='8', school=self.school)
+
+        self.john = self.create('STUDENT', 'John', 'Smith', account_id='UAjsmith00001', id_number='0101015800087')
+        self.jane = self.create('STUDENT', 'Jane', 'Doe', account_id='UAjdoe000002', id_number='0101025800088')
+        self.joan = self.create('TEACHER', 'Joan', 'Smithers', account_id='UAjsmithers03')
+        self.sam = self.create('ADMIN', 'Sam', 'Jones', account_id='UAsjones00004')
+        self.tom = self.create('TEACHER', 'Tom', 'Blacksmith', account_id='UAtblack00005')
+
+    def create(self, role, name, surname, school=None, **kwargs):
+        return CustomUser.objects.create(
+            email=None if role == 'STUDENT' else f'{name.lower()}.{surname.lower()}@example.com', name=name, surname=surname, role=role,
+            school=school or self.school, grade=self.grade if role == 'STUDENT' else None, **kwargs
+        )
+
+    def search(self, query, **kwargs):
+        return [user.account_id for user in search_users(self.school.pk, query, **kwargs)]
+
+    def test_every_word_is_a_name_or_surname_prefix(self):
+        self.assertEqual(self.search('jo sm'), [self.john.account_id, self.joan.account_id])
+        self.assertEqual(self.search('  SMITH   john '), [self.john.account_id])
+
+    def test_short_queries_only_match_prefixes(self):
+        self.assertEqual(self.search('jo'), [self.sam.account_id, self.john.account_id, self.joan.account_id])
+        self.assertEqual(self.search('sm'), [self.john.account_id, self.joan.account_id])
+
+    def test_exact_and_prefix_account_ids(self):
+        # the prefix is upper case and the rest lower case however the query is typed
+        self.assertEqual(self.search('uaJSMITH00001'), [self.john.account_id])
+        self.assertEqual(self.search('uaJsmith'), [self.john.account_id, self.joan.account_id])
+        self.assertEqual(self.search('UASJONES'), [self.sam.account_id])
+
+    def test_exact_and_prefix_id_numbers(self):
+        self.assertEqual(self.search('0101015800087'), [self.john.account_id])
+        self.assertEqual(self.search('010102'), [self.jane.account_id])
+        self.assertEqual(self.search('01010'), [self.jane.account_id, self.john.account_id])
+
+    def test_names_containing_the_query_come_after_prefixes(self):
+        self.assertEqual(self.search('smith'), [self.john.account_id, self.joan.account_id, self.tom.account_id])
+        self.assertEqual(self.search('acksm'), [self.tom.account_id])
+
+    def test_exact_ids_come_before_id_prefixes(self):
+        aaron = self.create('TEACHER', 'Aaron', 'Aaronson', account_id='UAjsmith000010')
+
+        self.assertEqual(self.search('UAjsmith00001'), [self.john.account_id, aaron.account_id])
+
+    def test_scoped_to_the_school_and_roles(self):
+        self.create('TEACHER', 'John', 'Smithson', school=self.other_school, account_id='UAjsmithson07')
+
+        self.assertEqual(self.search('john'), [self.john.account_id])
+        self.assertEqual(self.search('smith', roles=['TEACHER']), [self.joan.account_id, self.tom.account_id])
+        self.assertEqual(self.search('smith', roles=['ADMIN', 'PRINCIPAL']), [])
+
+    def test_inactive_users_and_founders_are_left_out(self):
+        self.john.is_active = False
+        self.john.save()
+        self.create('FOUNDER', 'Johnny', 'Founder', account_id='UAjfounder008')
+
+        self.assertEqual(self.search('jo'), [self.sam.account_id, self.joan.account_id])
+
+    def test_limit_and_empty_queries(self):
+        self.assertEqual(len(self.search('j')), 4)
+        self.assertEqual(len(self.search('j', limit=2)), 2)
+        self.assertEqual(self.search('   '), [])
+
+
+class DeletionTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        clear_local_caches()
+
+        patcher = mock.patch.object(deletion, 'BATCH_PAUSE', 0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.school = self.create_school('school')
+            self.other_school = self.create_school('other school')
+
+    def create_school(self, name):
+        school = School.objects.create(name=name, email=f"{name.replace(' ', '.')}@example.com", contact_number='0110000000')
+        grade = Grade.objects.create(grade='8', school=school)
+
+        teacher = self.create_user('TEACHER', school)
+        self.create_user('ADMIN', school)
+        students = [self.create_user('STUDENT', school, grade=grade) for _ in range(7)]
+
+        parent = self.create_user('PARENT', school)
+        parent.children.add(students[0])
+
+        for student in students:
+            Balance.objects.create(user=student)
+
+        classroom = Classroom.objects.create(room_number='1', teacher=teacher, grade=grade, school=school, group='a')
+        classroom.students.add(*students)
+
+        now = timezone.now()
+        assessment = Assessment.objects.create(
+            set_by=teacher, moderator=teacher, due_date=now, total=10, percentage_towards_term_mark=10, term=1, date_released=now,
+            unique_identifier=f'{name} test', classroom=classroom, grade=grade, school=school,
+        )
+        assessment.students_assessed.add(*students)
+
+        for student in students:
+            Transcript.objects.create(student=student, score=5, assessment=assessment)
+            Activity.objects.create(logger=teacher, recipient=student, offence='late', message='late again', school=school, classroom=classroom)
+
+        return school
+
+    def create_user(self, role, school, **kwargs):
+        number = CustomUser.objects.count()
+
+        return CustomUser.objects.create(
+            email=None if role == 'STUDENT' else f'{role.lower()}{number}@example.com', id_number=f'{number:013d}' if role == 'STUDENT' else None,
+            name='name', surname=f'surname {number}', role=role, school=school, **kwargs
+        )
+
+    def test_school_deletion_drops_the_users_versions_and_visibility(self):
+        users = list(CustomUser.objects.filter(school=self.school))
+        parent = next(user for user in users if user.role == 'PARENT')
+
+        before = etags.get_versions([user_key(user.account_id) for user in users])
+        visibility.get_index(parent.pk, parent.role)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            deletion.request_school_deletion(self.school.pk)
+
+        after = etags.get_versions([user_key(user.account_id) for user in users])
+
+        self.assertTrue(all(after[key] != version for key, version in before.items()))
+        self.assertIsNone(cache.get(visibility.index_key(parent.pk)))
+        self.assertFalse(CustomUser.objects.filter(school=self.school, is_active=True).exists())
+
+    def test_cache_errors_fail_the_job_not_the_worker(self):
+        student = CustomUser.objects.filter(school=self.school, role='STUDENT').first()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            job = deletion.request_user_deletion(student.pk)
+
+        with mock.patch('users.deletion.principals.invalidate_many', side_effect=ConnectionError('redis is down')), self.assertLogs('users.deletion', 'ERROR'):
+            self.assertEqual(deletion.run_pending(), 1)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.step, job.attempts), ('PENDING', 'users', 1))
+        self.assertIn('redis is down', job.error)
+
+    def counts(self, school):
+        return {
+            'users': CustomUser.objects.filter(school=school).count(),
+            'balances': Balance.objects.filter(user__school=school).count(),
+            'transcripts': Transcript.objects.filter(student__school=school).count(),
+            'activities': Activity.objects.filter(school=school).count(),
+            'class students': Classroom.students.through.objects.filter(classroom__school=school).count(),
+            'assessed students': Assessment.students_assessed.through.objects.filter(assessment__school=school).count(),
+            'children': CustomUser.children.through.objects.filter(from_customuser__school=school).count(),
+        }
+
+    def population(self, school):
+        return dict(SchoolPopulation.objects.filter(school=school).values_list('role', 'count'))
+
+    def test_user_job(self):
+        student = CustomUser.objects.filter(school=self.school, role='STUDENT').first()
+        other = self.counts(self.other_school)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            job = deletion.request_user_deletion(student.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('run_deletion_jobs', batch_size=2, stdout=io.StringIO())
+
+        job.refresh_from_db()
+
+        self.assertEqual((job.status, job.step), ('DONE', 'users'))
+        self.assertFalse(CustomUser.objects.filter(pk=student.pk).exists())
+        self.assertEqual(self.counts(self.school), {
+            'users': 9, 'balances': 6, 'transcripts': 6, 'activities': 6, 'class students': 6, 'assessed students': 6, 'children': 0,
+        })
+        self.assertEqual(self.population(self.school), {'TEACHER': 1, 'ADMIN': 1, 'STUDENT': 6, 'PARENT': 1})
+        self.assertEqual(self.counts(self.other_school), other)
+
+    def test_users_with_classes_are_not_deleted(self):
+        teacher = CustomUser.objects.get(school=self.school, role='TEACHER')
+
+        with self.assertRaises(deletion.DeletionError):
+            deletion.request_user_deletion(teacher.pk)
+
+        self.assertTrue(CustomUser.objects.get(pk=teacher.pk).is_active)
+        self.assertFalse(DeletionJob.objects.exists())
+
+    def test_school_job_resumes_from_its_step(self):
+        other, other_population = self.counts(self.other_school), self.population(self.other_school)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            job = deletion.request_school_deletion(self.school.pk)
+
+        run_step = deletion._run_step
+
+        def failing(job, step, batch_size):
+            if step.name == 'classes':
+                raise DatabaseError('the batch failed')
+
+            return run_step(job, step, batch_size)
+
+        with mock.patch.object(deletion, '_run_step', failing), self.assertLogs('users.deletion', 'ERROR'):
+            self.assertEqual(deletion.run_pending(batch_size=3), 1)
+
+        job.refresh_from_db()
+
+        # the last step that finished a batch
+        self.assertEqual((job.status, job.step, job.attempts), ('PENDING', 'class parents', 1))
+        self.assertEqual(self.counts(self.school)['transcripts'], 0)
+        self.assertEqual(self.counts(self.school)['users'], 10)
+
+        # backing off
+        self.assertEqual(deletion.run_pending(batch_size=3), 0)
+
+        DeletionJob.objects.filter(pk=job.pk).update(leased_until=None)
+
+        with mock.patch.object(deletion, '_run_step', wraps=run_step) as run:
+            with self.captureOnCommitCallbacks(execute=True):
+                call_command('run_deletion_jobs', batch_size=3, stdout=io.StringIO())
+
+        # carried on from its step, the steps before it weren't run again
+        self.assertEqual([call.args[1].name for call in run.call_args_list][:2], ['class parents', 'classes'])
+
+        job.refresh_from_db()
+
+        self.assertEqual((job.status, job.step), ('DONE', 'school'))
+        self.assertFalse(School.objects.filter(pk=self.school.pk).exists())
+        self.assertFalse(Grade.objects.filter(school=self.school.pk).exists())
+        self.assertFalse(Classroom.objects.filter(school=self.school.pk).exists())
+        self.assertEqual(self.population(self.school), {})
+
+        self.assertEqual(self.counts(self.other_school), other)
+        self.assertEqual(self.population(self.other_school), other_population)
+        self.assertFalse(CustomUser.objects.filter(school=self.other_school, is_active=False).exists())
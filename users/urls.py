@@ -16,6 +16,7 @@ urlpatterns = [
 
     # general urls
     path('profile/<str:account_id>/', views.user_profile, name="get users profile information"),
+    path('deletion-job/<str:job_id>/', views.deletion_job, name="get deletion job progress"),
 
     # urls for founderdashboard, 'FOUNDER' role required
     path('create-principal/<str:school_id>/', views.create_principal, name="create principal account"),
@@ -23,8 +24,10 @@ urlpatterns = [
         
     # urls  for admindashboard, 'ADMIN' role required 
     path('create-user/', views.create_user, name="create user account"),
+    path('import-users/', views.import_users, name="bulk import user accounts"),
     path('delete-user/', views.delete_user, name="delete user account"),
     path('users/<str:role>/', views.users, name="get school admin or teacher accounts"),
     path('students/<str:grade>/', views.students, name="get student accounts in provided grade"),
+    path('search/', views.search, name="search user accounts"),
 
 ]
@@ -0,0 +1,41 @@
+# etags
+from seeran_backend import etags
+
+
+"""
+    the version counters behind the users ETags ( seeran_backend.etags ):
+        - user:<account id>, a users profile and security info, bumped when the user is saved or deleted
+        - school_users:<school pk>, a schools rosters ( users and students views ), bumped when a user joins,
+          leaves or changes in the school
+        - relations:<user pk>, who the user may see, bumped with their visibility index ( users.visibility )
+"""
+
+
+def user_key(account_id):
+    return f'user:{account_id}'
+
+
+def school_users_key(school_id):
+    return f'school_users:{school_id}' if school_id is not None else None
+
+
+def relations_key(user_id):
+    return f'relations:{user_id}'
+
+
+def user_changed(account_id, *school_ids):
+
+    """
+        bumps the users versions and the rosters of the schools they were and are in
+    """
+
+    etags.bump(user_key(account_id), *(school_users_key(school_id) for school_id in school_ids))
+
+
+def users_created(school_ids):
+
+    """
+        bumps the rosters of the schools users were bulk created in ( bulk_create skips the signals )
+    """
+
+    etags.bump(*(school_users_key(school_id) for school_id in school_ids))
@@ -1,17 +1,11 @@
-# python 
-import uuid
-import urllib.parse
-
 # rest framework
 from rest_framework.decorators import api_view, parser_classes
-from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 from rest_framework.response import Response
 from rest_framework import status
 
 # django
 from django.db.models import Q
-from django.core.cache import cache
-from django.db import transaction
 
 # custom decorators
 from authentication.decorators import token_required
@@ -22,10 +16,33 @@ from users.models import CustomUser
 from schools.models import School
 from balances.models import Balance
 
+# bulk user import
+from .imports import import_users as run_user_import, read_rows
+
+# pagination
+from seeran_backend.pagination import paginate
+
+# profile visibility
+from users import visibility
+
+# profile picture pipeline
+from users import pictures
+
+# user search
+from users.search import search_users
+
+# background deletion
+from users.deletion import DeletionError, request_user_deletion
+from users.models import DeletionJob
+
+# conditional GET
+from seeran_backend.etags import conditional
+from users.versions import user_key, school_users_key, relations_key
+
 # serilializers
 from .serializers import (SecurityInfoSerializer,
     PrincipalCreationSerializer, ProfileSerializer, UsersSerializer,
-    UserCreationSerializer, ProfilePictureSerializer
+    UserCreationSerializer, ProfilePictureSerializer, DeletionJobSerializer
 )
 
 # custom decorators
@@ -42,6 +59,7 @@ logger = logging.getLogger(__name__)
 # get users security info
 @api_view(["GET"])
 @token_required
+@conditional('my_security_info', lambda request: [user_key(request.user.account_id)])
 def my_security_info(request):
 
     serializer = SecurityInfoSerializer(instance=request.user)
@@ -50,6 +68,7 @@ def my_security_info(request):
 
 @api_view(["GET"])
 @token_required
+@conditional('my_profile', lambda request: [user_key(request.user.account_id)])
 def my_profile(request):
    
     # if the user is authenticated, return their profile information 
@@ -64,91 +83,38 @@ def my_profile(request):
 # get user profile information
 @api_view(['GET'])
 @token_required
+@conditional('user_profile', lambda request, account_id: [user_key(account_id), relations_key(request.user.pk)])
 def user_profile(request, account_id):
 
     # try to get the user instance
     try:
-        user = CustomUser.objects.get(account_id=account_id)
+        user = CustomUser.objects.get(account_id=account_id, is_active=True)
  
     except CustomUser.DoesNotExist:
         return Response({"error" : "user with the provided credentials does not exist"}, status=status.HTTP_404_NOT_FOUND)
          
-    if request.user.role == 'FOUNDER' and user.role != 'PRINCIPAL':
+    # permission check, one lookup in the viewers cached visibility index at most
+    if not visibility.can_view(request.user, user):
         return Response({ "error" : 'permission denied' }, status=status.HTTP_400_BAD_REQUEST)
 
-    # permission check
-    if request.user.role != 'FOUNDER':
-
-        if user.role == 'FOUNDER' or (request.user.role != 'PARENT' and user.school != request.user.school):
-            return Response({ "error" : 'permission denied' }, status=status.HTTP_400_BAD_REQUEST)
-        
-        # students 
-        if request.user.role == 'STUDENT':
-
-            if user.role == 'PRINCIPAL' or user.role == 'STUDENT':
-                return Response({ "error" : 'permission denied' }, status=status.HTTP_400_BAD_REQUEST)
-            
-            if user.role == 'PARENT' and request.user not in user.children:
-                return Response({ "error" : 'permission denied' }, status=status.HTTP_400_BAD_REQUEST)
-
-            if user.role == 'TEACHER':
-
-                teachers = []
+    # return the users profile
+    serializer = ProfileSerializer(instance=user)
+    return Response({ "user" : serializer.data }, status=201)
 
-                for clas in request.user.classes:
-                    teachers.append(clas.teacher)
 
-                if user not in teachers:
-                    return Response({ "error" : 'permission denied' }, status=status.HTTP_400_BAD_REQUEST)
+# progress of a user or school deletion, only for whoever requested it
+@api_view(['GET'])
+@token_required
+def deletion_job(request, job_id):
 
-        # parents
-        if request.user.role == 'PARENT':
+    try:
+        job = DeletionJob.objects.get(job_id=job_id, requested_by_id=request.user.pk)
 
-            if user.role == 'PRINCIPAL' or ( user.role == 'STUDENT' and user not in request.user.children ):
-                return Response({ "error" : 'permission denied' }, status=status.HTTP_400_BAD_REQUEST)
-            
-            if user.role == 'STUDENT':
-                pass
-            
-            else:
-                schools = []
-                teachers = []
-
-                for child in request.user.children:
-                    schools.append(child.school)
-                    for clas in child.classes:
-                        teachers.append(clas.teacher)
-
-                if user.role == 'ADMIN'  and user.school not in schools:
-                    return Response({ "error" : 'permission denied' }, status=status.HTTP_400_BAD_REQUEST)
-                
-                if user.role == 'TEACHER' and user not in teachers:
-                    return Response({ "error" : 'permission denied' }, status=status.HTTP_400_BAD_REQUEST)
-                
-        # teacher
-        if request.user.role == 'TEACHER':
-
-            if user.role == 'PARENT' or user.role == 'STUDENT':
-                in_class = False
-
-                if user.role == 'STUDENT':
-                    for clas in request.user.classes:
-                        if user in clas.students:
-                            in_class = True
-                            break
-                
-                if user.role == 'PARENT':
-                    for clas in request.user.classes:
-                        if user in clas.parents:
-                            in_class = True
-                            break
-
-                if not in_class:
-                    return Response({ "error" : 'permission denied' }, status=status.HTTP_400_BAD_REQUEST)
+    except DeletionJob.DoesNotExist:
+        return Response({"error" : "deletion job with the provided id does not exist"}, status=status.HTTP_404_NOT_FOUND)
 
-    # return the users profile
-    serializer = ProfileSerializer(instance=user)
-    return Response({ "user" : serializer.data }, status=201)
+    serializer = DeletionJobSerializer(instance=job)
+    return Response({ "job" : serializer.data }, status=status.HTTP_200_OK)
 
 
 ################################################################################################
@@ -215,11 +181,14 @@ def delete_principal(request):
     except CustomUser.DoesNotExist:
         return Response({"error" : "user with the provided credentials can not be found"}, status=status.HTTP_404_NOT_FOUND)
  
+    # deactivate the account now, its rows are deleted in the background
     try:
-        # Add the school instance to the request data
-        user.delete()
+        job = request_user_deletion(user.pk, requested_by=request.user.pk)
       
-        return Response({"message" : "user account successfully deleted",}, status=status.HTTP_200_OK)
+        return Response({"message" : "user account deactivated and queued for deletion", "job_id" : job.job_id}, status=status.HTTP_202_ACCEPTED)
+
+    except DeletionError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
  
     except Exception as e:
        
@@ -312,6 +281,43 @@ def create_user(request):
     return Response({"error" : serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
 
 
+# bulk import ['ADMIN', 'TEACHER', 'STUDENT', 'PARENT'] user accounts
+# a csv, json or json lines file upload ( 'file' ), or a json body with the rows in 'users'
+@api_view(['POST'])
+@parser_classes([MultiPartParser, FormParser, JSONParser])
+@token_required
+@admins_only
+def import_users(request):
+
+    try:
+        school = School.objects.get(pk=request.user.school_id)
+  
+    except School.DoesNotExist:
+        return Response({"error" : "school with the provided credentials can not be found"}, status=status.HTTP_404_NOT_FOUND)
+
+    upload = request.FILES.get('file')
+
+    if upload:
+        # the format comes from the form or the files extension
+        format = (request.data.get('format') or upload.name.rsplit('.', 1)[-1]).lower()
+        rows = read_rows(upload, format)
+
+    elif isinstance(request.data.get('users'), list):
+        rows = request.data['users']
+
+    else:
+        return Response({"error": "missing information"}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        report = run_user_import(school, rows)
+
+    except (ValueError, UnicodeDecodeError) as e:
+        # the file itself couldn't be read, rows imported before the bad part stay imported
+        return Response({"error": f"could not read the uploaded file, {e}"}, status=status.HTTP_400_BAD_REQUEST)
+
+    return Response(report, status=status.HTTP_200_OK)
+
+
 # delete user account
 @api_view(['POST'])
 @token_required
@@ -333,11 +339,14 @@ def delete_user(request):
     if user.role == 'PRINCIPAL' or (user.role == 'ADMIN' and request.user.role != 'PRINCIPAL') or request.user.school != user.school:
         return Response({ "error" : 'permission denied' }, status=status.HTTP_400_BAD_REQUEST)
 
-    # try to delete the user instance
+    # deactivate the account now, its rows are deleted in the background
     try:
-        
-        user.delete()
-        return Response({"message" : "user account successfully removed from system",}, status=status.HTTP_200_OK)
+        job = request_user_deletion(user.pk, requested_by=request.user.pk)
+
+        return Response({"message" : "user account deactivated and queued for removal from the system", "job_id" : job.job_id}, status=status.HTTP_202_ACCEPTED)
+
+    except DeletionError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
  
     except Exception as e:
        
@@ -349,6 +358,7 @@ def delete_user(request):
 @api_view(['GET'])
 @token_required
 @admins_only
+@conditional('users', lambda request, role: [school_users_key(request.user.school_id)])
 def users(request, role):
 
     if role not in ['ADMIN', 'TEACHER']:
@@ -356,27 +366,50 @@ def users(request, role):
 
     # Get the school admin users
     if role == 'ADMIN':
-        accounts = CustomUser.objects.filter( Q(role='ADMIN') | Q(role='PRINCIPAL'), school=request.user.school).exclude(account_id=request.user.account_id)
+        accounts = CustomUser.objects.filter( Q(role='ADMIN') | Q(role='PRINCIPAL'), school_id=request.user.school_id, is_active=True).exclude(account_id=request.user.account_id)
   
     if role == 'TEACHER':
-        accounts = CustomUser.objects.filter(role=role, school=request.user.school)
+        accounts = CustomUser.objects.filter(role=role, school_id=request.user.school_id, is_active=True)
 
-    # serialize query set
-    serializer = UsersSerializer(accounts, many=True)
-    return Response({ "users" : serializer.data }, status=201)
+    # serialize a page of the query set
+    return paginate(request, accounts, UsersSerializer, 'users', ordering=['surname', 'name'], status=201)
 
 
 # get all ['ADMIN', 'TEACHER', 'PRINCIPAL'] accounts in the school
 @api_view(['GET'])
 @token_required
 @admins_only
+@conditional('students', lambda request, grade: [school_users_key(request.user.school_id)])
 def students(request, grade):
 
-    accounts = CustomUser.objects.filter( role='STUDENT', school=request.user.school, grade=grade)
+    accounts = CustomUser.objects.filter( role='STUDENT', school_id=request.user.school_id, grade=grade, is_active=True)
+
+    # serialize a page of the query set
+    return paginate(request, accounts, UsersSerializer, 'users', ordering=['surname', 'name'], status=201)
+
+
+# search the schools students, teachers, parents and admins by name, surname, account id or id number
+# ?q=<query>&role=<role>&limit=<limit>, best matches first
+@api_view(['GET'])
+@token_required
+@admins_only
+def search(request):
+
+    query = request.query_params.get('q', '')
+    role = request.query_params.get('role')
+
+    if role and role not in ['ADMIN', 'PRINCIPAL', 'TEACHER', 'STUDENT', 'PARENT']:
+        return Response({ "error" : 'invalid role request' }, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        limit = int(request.query_params.get('limit', 0))
+    except ValueError:
+        return Response({ "error" : 'invalid limit' }, status=status.HTTP_400_BAD_REQUEST)
+
+    accounts = search_users(request.user.school_id, query, roles=[role] if role else None, limit=limit)
 
-    # serialize query set
     serializer = UsersSerializer(accounts, many=True)
-    return Response({ "users" : serializer.data }, status=201)
+    return Response({ "users" : serializer.data }, status=status.HTTP_200_OK)
 
 
 #############################################################################################
@@ -397,39 +430,27 @@ def update_profile_picture(request):
     if not profile_picture:
         return Response({"error" : "No file was uploaded."}, status=status.HTTP_400_BAD_REQUEST)
 
+    # decoded and resized in the picture process pool, stored, then swapped in with a short transaction
     try:
-        user = CustomUser.objects.get(account_id=request.user.account_id)  # get the current user
+        user = pictures.update_picture(request.user.pk, profile_picture)
 
-        with transaction.atomic():
-            user.profile_picture.delete()  # delete the old profile picture if it exists
-
-            # Generate a new filename
-            ext = profile_picture.name.split('.')[-1]  # Get the file extension
-            filename = f'{uuid.uuid4()}.{ext}'  # Create a new filename using a UUID
-
-            # URL-encode the filename
-            filename = urllib.parse.quote(filename)
-
-            user.profile_picture.save(filename, profile_picture)  # save the new profile picture
-            user.save()
-
-        if cache.get(user.account_id + 'profile_picture'):
-            cache.delete(user.account_id + 'profile_picture')
-        
-        else:
-            user.refresh_from_db()  # Refresh the user instance from the database
-
-            serializer = ProfilePictureSerializer(instance=user)
-            return Response({"profile_picture" : serializer.data}, status=status.HTTP_200_OK)
-        
     except CustomUser.DoesNotExist:
         return Response({"error" : "user with the provided credentials does not exist"}, status=status.HTTP_404_NOT_FOUND)
 
+    except pictures.PictureUnavailable as e:
+        return Response({"error" : str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+    except pictures.PictureError as e:
+        return Response({"error" : str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
     except Exception as e:
         logger.exception("An error occurred when updating the profile picture")
         # if any exceptions rise during return the response return it as the response
         return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    serializer = ProfilePictureSerializer(instance=user)
+    return Response({"profile_picture" : serializer.data}, status=status.HTTP_200_OK)
+
 
 # remove users picture
 @api_view(['POST'])
@@ -437,29 +458,23 @@ def update_profile_picture(request):
 def remove_profile_picture(request):
      
     try:
-        user = CustomUser.objects.get(account_id=request.user.account_id)  # get the current user
+        # the pictures files are deleted once the user no longer points at them
+        user = pictures.remove_picture(request.user.pk)
+
+        if user is None:
+            return Response({"error" : 'you already dont have a custom profile picture to remove'}, status=status.HTTP_200_OK)
 
     except CustomUser.DoesNotExist:
         return Response({"error" : "user with the provided credentials does not exist"}, status=status.HTTP_404_NOT_FOUND)
-    
-    try:
-        
-        if user.profile_picture:
-            user.profile_picture.delete()  # delete the old profile picture if it exists
 
-        else:
-            return Response({"error" : 'you already dont have a custom profile picture to remove'}, status=status.HTTP_200_OK)
-        
-        user.refresh_from_db()  # Refresh the user instance from the database
-
-        serializer = ProfilePictureSerializer(instance=user)
-        return Response({"profile_picture" : serializer.data}, status=status.HTTP_200_OK)
-    
     except Exception as e:
 
         # if any exceptions rise during return the response return it as the response
         return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    serializer = ProfilePictureSerializer(instance=user)
+    return Response({"profile_picture" : serializer.data}, status=status.HTTP_200_OK)
+
     
 
 ##########################################################################################
\ No newline at end of file
@@ -0,0 +1,180 @@
+# python
+from collections import namedtuple
+
+# django
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+# models
+from users.models import CustomUser
+
+# etag versions
+from users.versions import relations_key
+from seeran_backend import etags
+
+
+"""
+    visibility index
+
+    which profiles a user may view, beyond the role and school rules, depends on their relationships:
+        - students see the parents linked to them and the teachers of their classes
+        - parents see their children, their childrens teachers and the admins of their childrens schools
+        - teachers see the students and parents of their classes
+
+    the index is the set of account ids ( and for parents, school ids ) those relationships reach, built with
+    set based queries over Classroom.students, Classroom.parents, Classroom.teacher and CustomUser.children and
+    cached per user ( visibility:<user pk> ). the users signals invalidate the entries a change to a class, an
+    enrolment, a parent child link or a users role or school affects.
+"""
+
+VisibilityIndex = namedtuple('VisibilityIndex', ['account_ids', 'school_ids'])
+
+INDEX_TIMEOUT = getattr(settings, 'VISIBILITY_INDEX_TIMEOUT', 3600)
+
+# ( viewer role, profile role ) pairs that are never visible
+DENIED = {
+    ('STUDENT', 'PRINCIPAL'), ('STUDENT', 'STUDENT'),
+    ('PARENT', 'PRINCIPAL'),
+}
+
+# pairs visible only to viewers whose index holds the profiles account id
+BY_ACCOUNT = {
+    ('STUDENT', 'PARENT'), ('STUDENT', 'TEACHER'),
+    ('PARENT', 'STUDENT'), ('PARENT', 'TEACHER'),
+    ('TEACHER', 'STUDENT'), ('TEACHER', 'PARENT'),
+}
+
+# pairs visible only to viewers whose index holds the profiles school
+BY_SCHOOL = {
+    ('PARENT', 'ADMIN'),
+}
+
+
+def index_key(user_id):
+    return f'visibility:{user_id}'
+
+
+def _account_ids(*querysets):
+    # one round trip for every relationship
+    first, *rest = [queryset.values_list('account_id', flat=True) for queryset in querysets]
+    return frozenset(first.union(*rest) if rest else first)
+
+
+def build_index(user_id, role):
+
+    """
+        computes the VisibilityIndex of the user from the database
+    """
+
+    users = CustomUser.objects
+
+    if role == 'STUDENT':
+        return VisibilityIndex(_account_ids(users.filter(role='PARENT', children=user_id), users.filter(taught_classes__students=user_id)), frozenset())
+
+    if role == 'PARENT':
+        children = users.filter(role='STUDENT', children=user_id)
+
+        return VisibilityIndex(
+            _account_ids(children, users.filter(taught_classes__students__in=children)),
+            frozenset(children.exclude(school=None).values_list('school_id', flat=True).distinct()),
+        )
+
+    if role == 'TEACHER':
+        return VisibilityIndex(_account_ids(users.filter(enrolled_classes__teacher=user_id), users.filter(children_classes__teacher=user_id)), frozenset())
+
+    return VisibilityIndex(frozenset(), frozenset())
+
+
+def get_index(user_id, role):
+
+    """
+        returns the cached VisibilityIndex of the user, building it on a miss
+    """
+
+    key = index_key(user_id)
+    cached = cache.get(key)
+
+    # entries remember the role they were built for, a user whose role changed gets a new one
+    if cached is not None and cached[0] == role:
+        return VisibilityIndex(frozenset(cached[1]), frozenset(cached[2]))
+
+    index = build_index(user_id, role)
+    cache.set(key, (role, tuple(index.account_ids), tuple(index.school_ids)), timeout=INDEX_TIMEOUT)
+
+    return index
+
+
+def can_view(viewer, user):
+
+    """
+        True if viewer ( request.user ) may view the profile of user
+    """
+
+    if viewer.role == 'FOUNDER':
+        return user.role == 'PRINCIPAL'
+
+    if user.role == 'FOUNDER':
+        return False
+
+    # parents see across the schools of their children
+    if viewer.role != 'PARENT' and user.school_id != viewer.school_id:
+        return False
+
+    pair = (viewer.role, user.role)
+
+    if pair in DENIED:
+        return False
+
+    if pair in BY_ACCOUNT:
+        return user.account_id in get_index(viewer.pk, viewer.role).account_ids
+
+    if pair in BY_SCHOOL:
+        return user.school_id in get_index(viewer.pk, viewer.role).school_ids
+
+    return True
+
+
+def invalidate(user_ids):
+
+    """
+        drops the cached indexes of the users once the current transaction commits, and their relations etag versions
+    """
+
+    user_ids = {user_id for user_id in user_ids if user_id is not None}
+    keys = [index_key(user_id) for user_id in user_ids]
+
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+        # profiles these users could or couldn't see before are tagged with their relations version
+        etags.bump(*(relations_key(user_id) for user_id in user_ids))
+
+
+def related_user_ids(classroom_ids=(), user_ids=()):
+
+    """
+        pks of every user whose index can change with the given classes or users: the classes teachers, students
+        and parents, the users linked to their students, and the users linked to user_ids ( and user_ids themselves )
+    """
+
+    classroom_ids, user_ids = list(classroom_ids), list(user_ids)
+    users = CustomUser.objects
+    querysets = []
+
+    if classroom_ids:
+        querysets += [
+            users.filter(taught_classes__in=classroom_ids),
+            users.filter(enrolled_classes__in=classroom_ids),
+            users.filter(children_classes__in=classroom_ids),
+            users.filter(children__enrolled_classes__in=classroom_ids),
+        ]
+
+    if user_ids:
+        querysets.append(users.filter(children__in=user_ids))
+
+    if not querysets:
+        return set(user_ids)
+
+    first, *rest = [queryset.values_list('pk', flat=True) for queryset in querysets]
+    return set(first.union(*rest) if rest else first) | set(user_ids)